@@ -0,0 +1,229 @@
+'''
+Asynchronous, streaming LLM generation for the RAG query pipelines.
+AsyncOpenAIGenerator and AsyncHuggingFaceAPIGenerator talk to the same HTTP APIs as OpenAIGenerator and
+HuggingFaceAPIGenerator, but through one pooled aiohttp session with a concurrency limit.
+Tokens are streamed to the caller as they arrive, and failed requests are retried with exponential backoff
+while the other requests keep running. api_base_url can point at any compatible server, including a local stand-in.
+
+run_prompt_batch runs the local part of a pipeline (embedding, retrieval, prompt building) for every input and
+sends all prompts to the generator concurrently, so a batch of questions takes about as long as the slowest one.
+'''
+
+import asyncio
+import inspect
+import json
+import random
+
+import aiohttp
+from haystack.utils import Secret
+
+from http_retries import RETRYABLE_STATUSES, retry_after
+
+
+class GenerationError(Exception):
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+async def _sse_events(response):
+    data_lines = []
+    async for raw_line in response.content:
+        line = raw_line.decode("utf-8").rstrip("\r\n")
+        if line.startswith("data:"):
+            data_lines.append(line[5:].lstrip())
+        elif not line and data_lines:
+            yield "\n".join(data_lines)
+            data_lines = []
+    if data_lines:
+        yield "\n".join(data_lines)
+
+
+async def _call(callback, *args):
+    result = callback(*args)
+    if inspect.isawaitable(result):
+        await result
+
+
+class AsyncGenerator:
+    def __init__(
+        self,
+        model,
+        api_base_url,
+        api_key=None,
+        generation_kwargs=None,
+        max_concurrency=8,
+        max_retries=4,
+        initial_backoff=0.5,
+        max_backoff=8.0,
+        timeout=120.0,
+    ):
+        self.model = model
+        self.api_base_url = api_base_url.rstrip("/")
+        self.api_key = api_key
+        self.generation_kwargs = generation_kwargs or {}
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self._session = None
+        self._semaphore = None
+        self._loop = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _get_session(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # An aiohttp session and semaphore belong to the event loop they were created in, a new loop gets new ones.
+            # The old session can't be closed from this loop, it is dropped with its loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._session = None
+            self._loop = loop
+        # Created lazily. A session closed in between is recreated, but the semaphore is kept, so requests still in
+        # flight keep counting against the limit
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _headers(self):
+        api_key = self.api_key.resolve_value() if self.api_key else None
+        return {"Authorization": f"Bearer {api_key}"} if api_key else {}
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return retry_after
+        # Full jitter keeps retrying clients from hitting the server in lockstep
+        return random.uniform(0, min(self.max_backoff, self.initial_backoff * 2**attempt))
+
+    def _request(self, prompt, generation_kwargs):
+        raise NotImplementedError
+
+    def _parse_event(self, data):
+        raise NotImplementedError
+
+    async def stream(self, prompt, generation_kwargs=None):
+        url, payload = self._request(prompt, {**self.generation_kwargs, **(generation_kwargs or {})})
+        session = self._get_session()
+        attempt = 0
+        while True:
+            emitted = False
+            try:
+                async with self._semaphore:
+                    async with session.post(url, json=payload, headers=self._headers()) as response:
+                        if response.status >= 400:
+                            body = await response.text()
+                            raise GenerationError(
+                                f"Request to {url} failed with status {response.status}: {body[:200]}",
+                                status=response.status,
+                                retry_after=retry_after(response),
+                            )
+                        async for data in _sse_events(response):
+                            token, done = self._parse_event(data)
+                            if token:
+                                emitted = True
+                                yield token
+                            if done:
+                                break
+                return
+            except (GenerationError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                retryable = not isinstance(e, GenerationError) or e.status in RETRYABLE_STATUSES
+                # Tokens that already reached the caller cannot be taken back, so a broken stream is not retried
+                if emitted or not retryable or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt, getattr(e, "retry_after", None))
+                attempt += 1
+            # Sleeping outside the semaphore leaves the slot to other in-flight requests
+            await asyncio.sleep(delay)
+
+    async def generate(self, prompt, streaming_callback=None, generation_kwargs=None):
+        tokens = []
+        async for token in self.stream(prompt, generation_kwargs=generation_kwargs):
+            tokens.append(token)
+            if streaming_callback is not None:
+                await _call(streaming_callback, token)
+        return {"replies": ["".join(tokens)], "meta": [{"model": self.model}]}
+
+
+class AsyncOpenAIGenerator(AsyncGenerator):
+    def __init__(
+        self,
+        model="gpt-3.5-turbo",
+        api_base_url="https://api.openai.com/v1",
+        api_key=Secret.from_env_var("OPENAI_API_KEY"),
+        **kwargs,
+    ):
+        super().__init__(model=model, api_base_url=api_base_url, api_key=api_key, **kwargs)
+
+    def _request(self, prompt, generation_kwargs):
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": True,
+            **generation_kwargs,
+        }
+        return f"{self.api_base_url}/chat/completions", payload
+
+    def _parse_event(self, data):
+        if data == "[DONE]":
+            return None, True
+        choices = json.loads(data).get("choices") or [{}]
+        return choices[0].get("delta", {}).get("content"), choices[0].get("finish_reason") is not None
+
+
+class AsyncHuggingFaceAPIGenerator(AsyncGenerator):
+    def __init__(
+        self,
+        model="HuggingFaceH4/zephyr-7b-beta",
+        api_base_url="https://api-inference.huggingface.co",
+        api_key=Secret.from_env_var(["HF_API_TOKEN", "HF_TOKEN"], strict=False),
+        **kwargs,
+    ):
+        super().__init__(model=model, api_base_url=api_base_url, api_key=api_key, **kwargs)
+
+    def _request(self, prompt, generation_kwargs):
+        payload = {"inputs": prompt, "parameters": generation_kwargs, "stream": True}
+        return f"{self.api_base_url}/models/{self.model}", payload
+
+    def _parse_event(self, data):
+        event = json.loads(data)
+        if "error" in event:
+            raise GenerationError(event["error"])
+        token = event.get("token") or {}
+        text = None if token.get("special") else token.get("text")
+        return text, event.get("generated_text") is not None
+
+
+async def run_prompt_batch(
+    prompt_pipeline, generator, inputs, prompt_component="prompt_builder", generation_kwargs=None, on_token=None
+):
+    # The local stages share models and are not thread-safe, so they run one at a time off the event loop
+    local_stage_lock = asyncio.Lock()
+
+    async def run_one(index, data):
+        async with local_stage_lock:
+            result = await asyncio.to_thread(prompt_pipeline.run, data)
+        prompt = result[prompt_component]["prompt"]
+        streaming_callback = None
+        if on_token is not None:
+            async def streaming_callback(token):
+                await _call(on_token, index, token)
+        return await generator.generate(
+            prompt, streaming_callback=streaming_callback, generation_kwargs=generation_kwargs
+        )
+
+    return await asyncio.gather(*(run_one(index, data) for index, data in enumerate(inputs)))
@@ -0,0 +1,224 @@
+'''
+An ExtractiveReader that answers many queries at once.
+run_batch takes a list of queries with one list of documents per query, splits every (query, document) pair into
+windows, sorts the windows by token length and runs them through the model in batches of similar length,
+so almost no compute goes to padding. The answers are then mapped back to their query.
+With retrieval_top_k set, only the best `retrieval_top_k` documents of each query (by retrieval score) are read.
+This is a plain cut by retrieval score, not a bound: an answer score is only known once its window has been through
+the model, so a document below the cut could have held the best answer.
+
+run keeps the signature of ExtractiveReader.run, so the reader still works as a drop-in pipeline component.
+The model and tokenizer come from the shared model registry (see model_registry.py), so readers of the same model
+share one loaded copy.
+'''
+
+import math
+import warnings
+from typing import List, Optional
+
+from haystack import Document, ExtractedAnswer, component
+from haystack.components.readers import ExtractiveReader
+from haystack.lazy_imports import LazyImport
+from haystack.utils import ComponentDevice, DeviceMap
+
+from model_registry import REGISTRY, model_key, release_model, token_key
+
+with LazyImport("Run 'pip install transformers[torch,sentencepiece]'") as torch_import:
+    import torch
+    from transformers import AutoModelForQuestionAnswering, AutoTokenizer
+
+
+def top_documents(documents, retrieval_top_k=None):
+    documents = [doc for doc in documents if doc.content is not None]
+    if retrieval_top_k is None or len(documents) <= retrieval_top_k:
+        return documents
+    # Documents without a retrieval score keep their position after the scored ones
+    ranked = sorted(documents, key=lambda doc: -doc.score if doc.score is not None else math.inf)
+    return ranked[:retrieval_top_k]
+
+
+def length_buckets(lengths, batch_size):
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+@component
+class BatchedExtractiveReader(ExtractiveReader):
+    def __init__(self, *args, batch_size=32, retrieval_top_k=None, **kwargs):
+        # The @component decorator rebuilds the class, so the base class is called explicitly instead of via super()
+        ExtractiveReader.__init__(self, *args, **kwargs)
+        self.batch_size = batch_size
+        self.retrieval_top_k = retrieval_top_k
+
+    def to_dict(self):
+        data = ExtractiveReader.to_dict(self)
+        data["init_parameters"]["batch_size"] = self.batch_size
+        data["init_parameters"]["retrieval_top_k"] = self.retrieval_top_k
+        return data
+
+    def _load_model(self):
+        token = self.token.resolve_value() if self.token else None
+        model = AutoModelForQuestionAnswering.from_pretrained(self.model_name_or_path, token=token, **self.model_kwargs)
+        return model, AutoTokenizer.from_pretrained(self.model_name_or_path, token=token)
+
+    def warm_up(self):
+        if self.model is None:
+            self._model_key = model_key(
+                "extractive_reader",
+                model=self.model_name_or_path,
+                token=token_key(self.token),
+                model_kwargs=self.model_kwargs,
+            )
+            self.model, self.tokenizer = REGISTRY.acquire(self._model_key, self._load_model)
+            # Take the first device used by `accelerate`, like ExtractiveReader.warm_up
+            self.device = ComponentDevice.from_multiple(device_map=DeviceMap.from_hf(self.model.hf_device_map))
+
+    def release(self):
+        release_model(self, "model")
+        self.tokenizer = None
+
+    def _windows(self, queries, documents, max_seq_length, stride):
+        pairs = [(query_id, doc) for query_id, docs in enumerate(documents) for doc in docs]
+        if not pairs:
+            return [], []
+        encoded = self.tokenizer(
+            [queries[query_id] for query_id, _ in pairs],
+            [doc.content for _, doc in pairs],
+            padding=False,
+            truncation=True,
+            max_length=max_seq_length,
+            return_overflowing_tokens=True,
+            stride=stride,
+        )
+        return [pairs[sample] for sample in encoded["overflow_to_sample_mapping"]], encoded.encodings
+
+    def _forward(self, encodings, answers_per_seq):
+        pad_id = self.tokenizer.pad_token_id or 0
+        length = max(len(encoding.ids) for encoding in encodings)
+        input_ids = torch.full((len(encodings), length), pad_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(encodings), length), dtype=torch.long)
+        sequence_ids = torch.full((len(encodings), length), -1, dtype=torch.long)
+        for row, encoding in enumerate(encodings):
+            size = len(encoding.ids)
+            input_ids[row, :size] = torch.tensor(encoding.ids)
+            attention_mask[row, :size] = torch.tensor(encoding.attention_mask)
+            sequence_ids[row, :size] = torch.tensor([-1 if id_ is None else id_ for id_ in encoding.sequence_ids])
+
+        first_device = self.device.first_device.to_torch()
+        input_ids, attention_mask, sequence_ids = (
+            tensor.to(first_device) for tensor in (input_ids, attention_mask, sequence_ids)
+        )
+        with torch.inference_mode():
+            output = self.model(input_ids=input_ids, attention_mask=attention_mask)
+        return self._postprocess(
+            output.start_logits, output.end_logits, sequence_ids, attention_mask, answers_per_seq, encodings
+        )
+
+    def _collect_answers(self, query, answers, top_k, score_threshold, no_answer, overlap_threshold):
+        # The same ranking, deduplication and no-answer scoring as ExtractiveReader._nest_answers
+        answers = sorted(answers, key=lambda ans: ans.score, reverse=True)
+        if answers:
+            answers = self.deduplicate_by_overlap(answers, overlap_threshold=overlap_threshold)
+        answers = [self._add_answer_page_number(answer=answer) for answer in answers[:top_k]]
+        if no_answer:
+            no_answer_score = math.prod(1 - answer.score for answer in answers)
+            answers.append(ExtractedAnswer(data=None, query=query, meta={}, document=None, score=no_answer_score))
+        answers = sorted(answers, key=lambda ans: ans.score, reverse=True)
+        if score_threshold is not None:
+            answers = [answer for answer in answers if answer.score >= score_threshold]
+        return answers
+
+    def run_batch(
+        self,
+        queries,
+        documents,
+        top_k=None,
+        score_threshold=None,
+        max_seq_length=None,
+        stride=None,
+        batch_size=None,
+        answers_per_seq=None,
+        no_answer=None,
+        overlap_threshold=None,
+        retrieval_top_k=None,
+    ):
+        if self.model is None:
+            raise RuntimeError(
+                "The component BatchedExtractiveReader was not warmed up. Run 'warm_up()' before calling 'run()'."
+            )
+        if len(queries) != len(documents):
+            raise ValueError("run_batch needs one list of documents per query.")
+
+        top_k = top_k or self.top_k
+        score_threshold = score_threshold or self.score_threshold
+        max_seq_length = max_seq_length or self.max_seq_length
+        stride = stride or self.stride
+        batch_size = batch_size or self.batch_size
+        answers_per_seq = answers_per_seq or self.answers_per_seq or 20
+        no_answer = no_answer if no_answer is not None else self.no_answer
+        overlap_threshold = overlap_threshold or self.overlap_threshold
+        retrieval_top_k = retrieval_top_k or self.retrieval_top_k
+
+        for docs in documents:
+            for doc in docs:
+                if doc.content is None:
+                    warnings.warn(
+                        f"Document with id {doc.id} was passed to ExtractiveReader. The Document doesn't "
+                        f"contain any text and it will be ignored."
+                    )
+        documents = [top_documents(docs, retrieval_top_k) for docs in documents]
+        windows, encodings = self._windows(queries, documents, max_seq_length, stride)
+
+        answers = [[] for _ in queries]
+        for bucket in length_buckets([len(encoding.ids) for encoding in encodings], batch_size):
+            start, end, probabilities = self._forward([encodings[i] for i in bucket], answers_per_seq)
+            for i, starts, ends, probabilities_ in zip(bucket, start, end, probabilities):
+                query_id, doc = windows[i]
+                for start_, end_, probability in zip(starts, ends, probabilities_):
+                    answers[query_id].append(
+                        ExtractedAnswer(
+                            query=queries[query_id],
+                            data=doc.content[start_:end_],
+                            document=doc,
+                            score=probability.item(),
+                            document_offset=ExtractedAnswer.Span(start_, end_),
+                            meta={},
+                        )
+                    )
+
+        return {
+            "answers": [
+                self._collect_answers(query, answers_, top_k, score_threshold, no_answer, overlap_threshold)
+                for query, answers_ in zip(queries, answers)
+            ]
+        }
+
+    @component.output_types(answers=List[ExtractedAnswer])
+    def run(
+        self,
+        query: str,
+        documents: List[Document],
+        top_k: Optional[int] = None,
+        score_threshold: Optional[float] = None,
+        max_seq_length: Optional[int] = None,
+        stride: Optional[int] = None,
+        max_batch_size: Optional[int] = None,
+        answers_per_seq: Optional[int] = None,
+        no_answer: Optional[bool] = None,
+        overlap_threshold: Optional[float] = None,
+    ):
+        if not documents:
+            return {"answers": []}
+        result = self.run_batch(
+            [query],
+            [documents],
+            top_k=top_k,
+            score_threshold=score_threshold,
+            max_seq_length=max_seq_length,
+            stride=stride,
+            batch_size=max_batch_size,
+            answers_per_seq=answers_per_seq,
+            no_answer=no_answer,
+            overlap_threshold=overlap_threshold,
+        )
+        return {"answers": result["answers"][0]}
@@ -0,0 +1,363 @@
+'''
+Offline performance benchmarks for the pipelines in this repo, without network models or datasets.
+Synthetic corpora (Zipf distributed words with category/year/version metadata) are indexed with a hashing embedder,
+and queried with BM25, embedding and filtered retrieval, an end-to-end RAG query with a stub generator,
+and the BatchedExtractiveReader on a tiny randomly initialized BERT model that is built locally on first use.
+
+    python benchmarks.py --sizes 1000 10000 100000 --output results.json --baseline baseline.json
+
+Results are written as JSON with one flat metric per key, e.g. "10000/retrieval/bm25/p99_ms" or
+"10000/indexing/document_embedder/docs_per_s". With --baseline every metric is compared to the stored one and the
+run fails if a metric got worse by more than --tolerance. Use --save-baseline to store the results as the new baseline.
+'''
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime, timezone
+from importlib.metadata import version
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from haystack import Document, Pipeline, component
+from haystack.components.builders import PromptBuilder
+from haystack.components.preprocessors import DocumentCleaner, DocumentSplitter
+from haystack.components.retrievers.in_memory import InMemoryEmbeddingRetriever
+from haystack.components.writers import DocumentWriter
+from haystack.lazy_imports import LazyImport
+
+from batched_reader import BatchedExtractiveReader
+from indexed_document_store import IndexedInMemoryDocumentStore
+from profiling import percentile, profiling
+from streaming_indexing import run_streaming_indexing
+
+with LazyImport("Run 'pip install transformers[torch,sentencepiece]'") as transformers_import:
+    import torch
+    from transformers import BertConfig, BertForQuestionAnswering, BertTokenizerFast
+
+DEFAULT_SIZES = (1_000, 10_000)
+DEFAULT_RESULTS_PATH = "benchmark_results.json"
+DEFAULT_READER_MODEL_PATH = ".benchmark_reader_model"
+VOCABULARY = [f"w{i}" for i in range(5_000)]
+CATEGORIES = [f"category_{i}" for i in range(10)]
+EMBEDDING_DIM = 64
+# Metrics where a higher value is better, for all others (latencies) lower is better
+THROUGHPUT_SUFFIXES = ("docs_per_s", "queries_per_s")
+
+
+def _words(rng, count):
+    ids = np.minimum(rng.zipf(1.3, size=count), len(VOCABULARY)) - 1
+    return " ".join(VOCABULARY[i] for i in ids)
+
+
+def synthetic_documents(count, seed=0):
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(20, 120, size=count)
+    return (
+        Document(
+            content=_words(rng, length),
+            meta={
+                "category": CATEGORIES[rng.integers(len(CATEGORIES))],
+                "year": int(rng.integers(1990, 2025)),
+                "version": float(rng.integers(10, 30)) / 10,
+            },
+        )
+        for length in lengths
+    )
+
+
+def synthetic_queries(count, seed=1):
+    rng = np.random.default_rng(seed)
+    return [_words(rng, int(rng.integers(2, 6))) for _ in range(count)]
+
+
+def hashing_embedding(text, dim=EMBEDDING_DIM):
+    # Feature hashing of the words: similar texts get similar vectors, and the same text always the same vector
+    buckets = [zlib.crc32(word.encode()) % dim for word in text.split()]
+    vector = np.bincount(buckets, minlength=dim).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+@component
+class HashingDocumentEmbedder:
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document]):
+        for doc in documents:
+            doc.embedding = hashing_embedding(doc.content or "", self.dim)
+        return {"documents": documents}
+
+
+@component
+class HashingTextEmbedder:
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+
+    @component.output_types(embedding=List[float])
+    def run(self, text: str):
+        return {"embedding": hashing_embedding(text, self.dim)}
+
+
+@component
+class StubGenerator:
+    def __init__(self, reply_words=20):
+        self.reply_words = reply_words
+
+    @component.output_types(replies=List[str])
+    def run(self, prompt: str):
+        return {"replies": [" ".join(prompt.split()[-self.reply_words:])]}
+
+
+def create_indexing_pipeline(document_store):
+    pipeline = Pipeline()
+    pipeline.add_component("document_cleaner", DocumentCleaner())
+    pipeline.add_component("document_splitter", DocumentSplitter(split_by="word", split_length=100, split_overlap=20))
+    pipeline.add_component("document_embedder", HashingDocumentEmbedder())
+    pipeline.add_component("document_writer", DocumentWriter(document_store))
+    pipeline.connect("document_cleaner", "document_splitter")
+    pipeline.connect("document_splitter", "document_embedder")
+    pipeline.connect("document_embedder", "document_writer")
+    return pipeline
+
+
+def create_rag_pipeline(document_store):
+    template = """
+    Given the following information, answer the question.
+    {% for document in documents %}
+        {{ document.content }}
+    {% endfor %}
+    Question: {{question}}
+    """
+    pipeline = Pipeline()
+    pipeline.add_component("text_embedder", HashingTextEmbedder())
+    pipeline.add_component("retriever", InMemoryEmbeddingRetriever(document_store, top_k=5))
+    pipeline.add_component("prompt_builder", PromptBuilder(template=template))
+    pipeline.add_component("llm", StubGenerator())
+    pipeline.connect("text_embedder.embedding", "retriever.query_embedding")
+    pipeline.connect("retriever", "prompt_builder.documents")
+    pipeline.connect("prompt_builder", "llm")
+    return pipeline
+
+
+def tiny_reader_model(path=DEFAULT_READER_MODEL_PATH):
+    path = Path(path)
+    if (path / "config.json").exists():
+        return str(path)
+    transformers_import.check()
+    path.mkdir(parents=True, exist_ok=True)
+    (path / "vocab.txt").write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", *VOCABULARY]))
+    BertTokenizerFast(vocab_file=str(path / "vocab.txt")).save_pretrained(path)
+    # Random weights: the answers are meaningless, but the compute per window is that of a small real reader
+    torch.manual_seed(0)
+    config = BertConfig(
+        vocab_size=len(VOCABULARY) + 5,
+        hidden_size=128,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=512,
+    )
+    BertForQuestionAnswering(config).save_pretrained(path)
+    return str(path)
+
+
+def latencies_ms(function, inputs, warmup=3):
+    for value in inputs[:warmup]:
+        function(value)
+    latencies = []
+    for value in inputs:
+        start = time.perf_counter()
+        function(value)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": percentile(latencies, 50), "p99_ms": percentile(latencies, 99)}
+
+
+def bench_indexing(document_store, size, seed=0):
+    pipeline = create_indexing_pipeline(document_store)
+    start = time.perf_counter()
+    with profiling(track_memory=False) as tracer:
+        run_streaming_indexing(pipeline, synthetic_documents(size, seed), batch_size=1_000, component="document_cleaner")
+    results = {"total/docs_per_s": size / (time.perf_counter() - start)}
+
+    # Every stage's throughput is the documents it received divided by the time it ran
+    stages = {}
+    for span in tracer.spans:
+        if span.operation_name == "haystack.component.run":
+            documents, seconds = stages.get(span.name, (0, 0.0))
+            stages[span.name] = (documents + span.sizes["input"].get("documents", 0), seconds + span.wall_ms / 1000)
+    for name, (documents, seconds) in stages.items():
+        results[f"{name}/docs_per_s"] = documents / seconds if seconds else 0.0
+    return results
+
+
+def bench_retrieval(document_store, queries, top_k=10):
+    embeddings = [hashing_embedding(query) for query in queries]
+    filters = {
+        "operator": "AND",
+        "conditions": [
+            {"field": "meta.category", "operator": "==", "value": CATEGORIES[0]},
+            {"field": "meta.year", "operator": ">=", "value": 2010},
+        ],
+    }
+    start = time.perf_counter()
+    document_store.bm25_retrieval(queries[0], top_k=top_k)
+    first_bm25_ms = (time.perf_counter() - start) * 1000
+    return {
+        "bm25": {
+            "first_query_ms": first_bm25_ms,
+            **latencies_ms(lambda query: document_store.bm25_retrieval(query, top_k=top_k), queries),
+        },
+        "bm25_filtered": latencies_ms(
+            lambda query: document_store.bm25_retrieval(query, filters=filters, top_k=top_k), queries
+        ),
+        "embedding": latencies_ms(
+            lambda embedding: document_store.embedding_retrieval(embedding, top_k=top_k), embeddings
+        ),
+        "embedding_filtered": latencies_ms(
+            lambda embedding: document_store.embedding_retrieval(embedding, filters=filters, top_k=top_k), embeddings
+        ),
+    }
+
+
+def bench_rag_query(document_store, queries):
+    pipeline = create_rag_pipeline(document_store)
+    return latencies_ms(
+        lambda query: pipeline.run({"text_embedder": {"text": query}, "prompt_builder": {"question": query}}), queries
+    )
+
+
+def bench_reader(document_store, queries, model_path, top_k=5):
+    reader = BatchedExtractiveReader(model=model_path, max_seq_length=256, batch_size=32)
+    reader.warm_up()
+    documents = [document_store.bm25_retrieval(query, top_k=top_k) for query in queries]
+    reader.run_batch(queries[:2], documents[:2])
+    start = time.perf_counter()
+    reader.run_batch(queries, documents)
+    seconds = time.perf_counter() - start
+    return {
+        "queries_per_s": len(queries) / seconds,
+        "docs_per_s": sum(len(docs) for docs in documents) / seconds,
+    }
+
+
+def bench_snapshot_load(document_store):
+    with tempfile.TemporaryDirectory() as path:
+        document_store.save_snapshot(path)
+        start = time.perf_counter()
+        IndexedInMemoryDocumentStore.load_snapshot(path)
+        return {"ms": (time.perf_counter() - start) * 1000}
+
+
+def bench_pipeline_load(repeat=20):
+    yaml_pipeline = create_indexing_pipeline(IndexedInMemoryDocumentStore()).dumps()
+    return latencies_ms(Pipeline.loads, [yaml_pipeline] * repeat)
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}/"))
+        else:
+            flat[name] = value
+    return flat
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "haystack": version("haystack-ai"),
+        "numpy": np.__version__,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, query_count=100, reader_queries=16, reader=True, seed=0):
+    queries = synthetic_queries(query_count, seed + 1)
+    results = {"pipeline_load": bench_pipeline_load()}
+    model_path = tiny_reader_model() if reader else None
+    for size in sizes:
+        document_store = IndexedInMemoryDocumentStore(ann_index="ivf")
+        results[str(size)] = {
+            "indexing": bench_indexing(document_store, size, seed),
+            "retrieval": bench_retrieval(document_store, queries),
+            "rag_query": bench_rag_query(document_store, queries),
+            "snapshot_load": bench_snapshot_load(document_store),
+        }
+        if model_path:
+            results[str(size)]["reader"] = bench_reader(document_store, queries[:reader_queries], model_path)
+    return {"environment": environment(), "metrics": flatten(results)}
+
+
+def compare(metrics, baseline, tolerance=0.2):
+    rows = []
+    for name, expected in baseline.items():
+        if name not in metrics or not expected:
+            continue
+        change = (metrics[name] - expected) / expected
+        higher_is_better = name.endswith(THROUGHPUT_SUFFIXES)
+        regressed = change < -tolerance if higher_is_better else change > tolerance
+        rows.append({"metric": name, "baseline": expected, "value": metrics[name], "change": change, "regressed": regressed})
+    return rows
+
+
+def print_comparison(rows):
+    print(f"{'metric':<56}{'baseline':>12}{'value':>12}{'change':>9}")
+    for row in rows:
+        flag = "  REGRESSION" if row["regressed"] else ""
+        print(f"{row['metric']:<56}{row['baseline']:>12.2f}{row['value']:>12.2f}{row['change']:>+9.1%}{flag}")
+
+
+def save_results(results, path):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path, "r") as f:
+        return json.load(f)["metrics"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the haystack-explore pipelines.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--no-reader", action="store_true")
+    parser.add_argument("--output", default=DEFAULT_RESULTS_PATH)
+    parser.add_argument("--baseline")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, query_count=args.queries, reader=not args.no_reader)
+    save_results(results, args.output)
+    print(f"Results written to {args.output}")
+    if not args.baseline:
+        return 0
+    if args.save_baseline or not Path(args.baseline).exists():
+        save_results(results, args.baseline)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    rows = compare(results["metrics"], load_baseline(args.baseline), args.tolerance)
+    print_comparison(rows)
+    regressions = [row["metric"] for row in rows if row["regressed"]]
+    if regressions:
+        print(f"{len(regressions)} metrics regressed by more than {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
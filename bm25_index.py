@@ -0,0 +1,208 @@
+'''
+An inverted index for the BM25 variants of InMemoryDocumentStore (BM25Okapi, BM25L and BM25Plus).
+Postings (token -> {document id: term frequency}) are maintained on every write and delete,
+so a query only touches the documents that contain one of its tokens instead of every stored document.
+
+search() evaluates the query term at a time with MaxScore-style pruning. Each term's postings are kept sorted by
+their score contribution, which also gives an exact upper bound per term. Terms are visited from the highest bound
+down, and a term only adds the new documents whose contribution plus the bounds of the remaining terms can still
+reach the current top_k; the rest of its postings are never touched. Candidates that can't make it anymore are dropped.
+The sorted postings depend on the average document length, so the first query after a write re-sorts the postings
+of its terms.
+The survivors are rescored with exactly the formulas (and float operation order) of InMemoryDocumentStore,
+so scores and rankings are identical to a full scan.
+'''
+
+import heapq
+import math
+
+import numpy as np
+
+DEFAULT_PARAMETERS = {
+    "BM25Okapi": {"k1": 1.5, "b": 0.75, "epsilon": 0.25},
+    "BM25L": {"k1": 1.5, "b": 0.75, "delta": 0.5},
+    "BM25Plus": {"k1": 1.5, "b": 0.75, "delta": 1.0},
+}
+
+
+class BM25Index:
+    def __init__(self, algorithm="BM25L", parameters=None):
+        if algorithm not in DEFAULT_PARAMETERS:
+            raise ValueError(f"BM25 algorithm '{algorithm}' is not supported.")
+        self.algorithm = algorithm
+        self.parameters = {**DEFAULT_PARAMETERS[algorithm], **(parameters or {})}
+        self.k = self.parameters["k1"]
+        self.b = self.parameters["b"]
+
+        self.postings = {}
+        self.freqs = {}
+        self.lengths = {}
+        self.positions = {}
+        self._next_position = 0
+        self._impact_cache = {}
+        self._okapi_idf = None
+
+    def __len__(self):
+        return len(self.freqs)
+
+    def add(self, doc_id, freq_token, doc_len):
+        if doc_id in self.freqs:
+            self.remove(doc_id)
+        self.freqs[doc_id] = freq_token
+        self.lengths[doc_id] = doc_len
+        self.positions[doc_id] = self._next_position
+        self._next_position += 1
+        for token, freq in freq_token.items():
+            self.postings.setdefault(token, {})[doc_id] = freq
+            self._impact_cache.pop(token, None)
+        self._okapi_idf = None
+
+    def remove(self, doc_id):
+        freq_token = self.freqs.pop(doc_id, None)
+        if freq_token is None:
+            return
+        del self.lengths[doc_id]
+        del self.positions[doc_id]
+        for token in freq_token:
+            postings = self.postings[token]
+            del postings[doc_id]
+            if not postings:
+                del self.postings[token]
+            self._impact_cache.pop(token, None)
+        self._okapi_idf = None
+
+    def idf(self, tokens, n_docs, document_frequencies):
+        # Same formulas as InMemoryDocumentStore._score_bm25*, keyed by the query tokens in order of appearance
+        if self.algorithm == "BM25Okapi":
+            if self._okapi_idf is None:
+                self._okapi_idf = self._compute_okapi_idf(n_docs, document_frequencies)
+            return {tok: self._okapi_idf.get(tok, 0.0) for tok in tokens}
+        idf = {}
+        for tok in tokens:
+            n = document_frequencies.get(tok, 0)
+            if self.algorithm == "BM25L":
+                idf[tok] = math.log((n_docs + 1.0) / (n + 0.5)) * int(n != 0)
+            else:
+                idf[tok] = math.log(1 + (n_docs - n + 0.5) / (n + 0.5)) * int(n != 0)
+        return idf
+
+    def _compute_okapi_idf(self, n_docs, document_frequencies):
+        # Depends on the whole vocabulary, so it is computed once per change instead of once per query
+        sum_idf = 0.0
+        neg_idf_tokens = []
+        idf = {}
+        for tok, n in document_frequencies.items():
+            idf[tok] = math.log((n_docs - n + 0.5) / (n + 0.5))
+            sum_idf += idf[tok]
+            if idf[tok] < 0:
+                neg_idf_tokens.append(tok)
+        eps = self.parameters["epsilon"] * sum_idf / len(document_frequencies)
+        for tok in neg_idf_tokens:
+            idf[tok] = eps
+        return idf
+
+    def tf(self, freq_term, doc_len, avg_doc_len):
+        k, b = self.k, self.b
+        if self.algorithm == "BM25L":
+            delta = self.parameters["delta"]
+            ctd = freq_term / (1 - b + b * doc_len / avg_doc_len)
+            return (1.0 + k) * (ctd + delta) / (k + ctd + delta)
+        if self.algorithm == "BM25Plus":
+            freq_damp = k * (1 - b + b * doc_len / avg_doc_len)
+            return freq_term * (1.0 + k) / (freq_term + freq_damp) + self.parameters["delta"]
+        freq_norm = freq_term + k * (1 - b + b * doc_len / avg_doc_len)
+        return freq_term * (1.0 + k) / freq_norm
+
+    def score(self, idf, freq, doc_len, avg_doc_len):
+        score = 0.0
+        for tok in idf.keys():
+            score += idf[tok] * self.tf(freq.get(tok, 0.0), doc_len, avg_doc_len)
+        return score
+
+    def _impacts(self, token, avg_doc_len):
+        # A term's postings sorted by their contribution to the score (before idf), highest first.
+        # The contributions depend on the average document length, so they are recomputed after writes.
+        cached = self._impact_cache.get(token)
+        if cached is None or cached[0] != avg_doc_len:
+            postings = self.postings[token]
+            doc_ids = np.array(list(postings), dtype=object)
+            freqs = np.fromiter(postings.values(), dtype=np.float64, count=len(doc_ids))
+            lengths = np.fromiter(map(self.lengths.__getitem__, postings), dtype=np.float64, count=len(doc_ids))
+            impacts = self.tf(freqs, lengths, avg_doc_len) - self.tf(0.0, 0, avg_doc_len)
+            order = np.argsort(-impacts, kind="stable")
+            cached = (avg_doc_len, doc_ids[order], impacts[order])
+            self._impact_cache[token] = cached
+        return cached[1], cached[2]
+
+    def search(self, tokens, top_k, n_docs, avg_doc_len, document_frequencies, allowed_ids=None):
+        idf = self.idf(tokens, n_docs, document_frequencies)
+        terms = [tok for tok in idf if tok in self.postings]
+        if any(idf[tok] <= 0 for tok in terms):
+            # A matching document could score below a non-matching one, the caller falls back to a full scan
+            return None
+        if not terms:
+            return []
+
+        impacts = {tok: self._impacts(tok, avg_doc_len) for tok in terms}
+        bounds = {tok: idf[tok] * impacts[tok][1][0] for tok in terms}
+        terms.sort(key=bounds.__getitem__, reverse=True)
+        remaining = sum(bounds.values())
+        # Scores are accumulated as gains over a document that contains none of the terms
+        baseline = self.tf(0.0, 0, avg_doc_len)
+        gains = {}
+        threshold = None
+
+        def slack(value):
+            return 1e-9 * max(1.0, abs(value))
+
+        def kth_best():
+            return heapq.nlargest(top_k, gains.values())[-1] if len(gains) >= top_k else None
+
+        for tok in terms:
+            postings = self.postings[tok]
+            remaining -= bounds[tok]
+            updated = set()
+
+            if allowed_ids is not None and len(allowed_ids) < len(postings):
+                for doc_id in allowed_ids:
+                    if doc_id in postings:
+                        gain = idf[tok] * (self.tf(postings[doc_id], self.lengths[doc_id], avg_doc_len) - baseline)
+                        gains[doc_id] = gains.get(doc_id, 0.0) + gain
+                threshold = kth_best()
+                continue
+
+            doc_ids, term_impacts = impacts[tok]
+            start = 0
+            while start < len(doc_ids):
+                if threshold is None:
+                    # Until there are top_k candidates, the best postings of the term are taken in small steps
+                    stop = start + top_k
+                else:
+                    # A new document needs at least this gain from the term to still reach the top_k
+                    limit = (threshold - remaining - slack(threshold)) / idf[tok]
+                    stop = int(np.searchsorted(-term_impacts, -limit, side="right"))
+                    if stop <= start:
+                        break
+                for doc_id, impact in zip(doc_ids[start:stop], term_impacts[start:stop].tolist()):
+                    if allowed_ids is not None and doc_id not in allowed_ids:
+                        continue
+                    gains[doc_id] = gains.get(doc_id, 0.0) + idf[tok] * impact
+                    updated.add(doc_id)
+                start = stop
+                threshold = kth_best()
+
+            # Candidates that were already collected still get this term's contribution
+            for doc_id in gains.keys() - updated:
+                if doc_id in postings:
+                    gains[doc_id] += idf[tok] * (self.tf(postings[doc_id], self.lengths[doc_id], avg_doc_len) - baseline)
+
+            threshold = kth_best()
+            if threshold is not None and remaining < threshold:
+                limit = threshold - remaining - slack(threshold)
+                gains = {doc_id: gain for doc_id, gain in gains.items() if gain >= limit}
+
+        scored = [
+            (doc_id, self.score(idf, self.freqs[doc_id], self.lengths[doc_id], avg_doc_len)) for doc_id in gains
+        ]
+        scored.sort(key=lambda x: (-x[1], self.positions[x[0]]))
+        return scored[:top_k]
@@ -0,0 +1,152 @@
+'''
+Packs retrieved chunks into a token budget before they are rendered into the prompt.
+ContextPacker sits between a retriever and a PromptBuilder and
+- merges chunks of the same source that overlap or touch (DocumentSplitter's split_overlap repeats text between
+  neighbouring chunks; its source_id and split_idx_start meta tell where every chunk starts in the source),
+- drops sentences that were already included from a higher scoring passage,
+- adds passages by score until `max_tokens` is reached. A passage that doesn't fit anymore is cut at a sentence
+  boundary, and the remaining budget still goes to smaller passages.
+
+Tokens are counted with the tokenizer of `tokenizer` (a Hugging Face model name), or estimated from words and
+punctuation when it isn't set.
+'''
+
+import re
+from typing import List, Optional
+
+from haystack import Document, component, default_from_dict, default_to_dict
+from haystack.lazy_imports import LazyImport
+
+with LazyImport("Run 'pip install transformers'") as transformers_import:
+    from transformers import AutoTokenizer
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text):
+    return len(TOKEN.findall(text))
+
+
+def split_sentences(text):
+    return [sentence for sentence in SENTENCE_END.split(text) if sentence.strip()]
+
+
+def _normalized(sentence):
+    return " ".join(sentence.lower().split())
+
+
+def _span(doc):
+    start = doc.meta.get("split_idx_start")
+    if doc.meta.get("source_id") is None or start is None or doc.content is None:
+        return None
+    return start, start + len(doc.content)
+
+
+def merge_chunks(documents):
+    # Groups of chunks of the same source whose character ranges overlap or touch become one passage
+    passages = []
+    by_source = {}
+    for doc in documents:
+        if doc.content is None:
+            continue
+        if _span(doc) is None:
+            passages.append([doc])
+        else:
+            by_source.setdefault(doc.meta["source_id"], []).append(doc)
+
+    for chunks in by_source.values():
+        chunks = sorted(chunks, key=lambda doc: doc.meta["split_idx_start"])
+        group, end = [chunks[0]], _span(chunks[0])[1]
+        for doc in chunks[1:]:
+            start, doc_end = _span(doc)
+            if start <= end:
+                group.append(doc)
+                end = max(end, doc_end)
+            else:
+                passages.append(group)
+                group, end = [doc], doc_end
+        passages.append(group)
+    return [_merged(group) for group in passages]
+
+
+def _merged(group):
+    first = group[0]
+    scores = [doc.score for doc in group if doc.score is not None]
+    if len(group) == 1:
+        return Document(id=first.id, content=first.content, meta=first.meta, score=first.score)
+
+    content = first.content
+    end = _span(first)[1]
+    for doc in group[1:]:
+        start, doc_end = _span(doc)
+        if doc_end > end:
+            content += doc.content[end - start:]
+            end = doc_end
+    meta = {key: value for key, value in first.meta.items() if key != "_split_overlap"}
+    meta["packed_from"] = [doc.id for doc in group]
+    return Document(content=content, meta=meta, score=max(scores) if scores else None)
+
+
+@component
+class ContextPacker:
+    def __init__(self, max_tokens=1500, tokenizer=None, dedupe_sentences=True):
+        if max_tokens <= 0:
+            raise ValueError(f"max_tokens must be greater than 0. Currently, max_tokens is {max_tokens}")
+        self.max_tokens = max_tokens
+        self.tokenizer = tokenizer
+        self.dedupe_sentences = dedupe_sentences
+        self._tokenizer = None
+
+    def warm_up(self):
+        if self.tokenizer and self._tokenizer is None:
+            transformers_import.check()
+            self._tokenizer = AutoTokenizer.from_pretrained(self.tokenizer)
+
+    def to_dict(self):
+        return default_to_dict(
+            self, max_tokens=self.max_tokens, tokenizer=self.tokenizer, dedupe_sentences=self.dedupe_sentences
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        return default_from_dict(cls, data)
+
+    def count_tokens(self, text):
+        if self._tokenizer is not None:
+            return len(self._tokenizer.encode(text, add_special_tokens=False))
+        return estimate_tokens(text)
+
+    def _pack(self, passage, seen, budget):
+        kept, tokens = [], 0
+        for sentence in split_sentences(passage.content):
+            key = _normalized(sentence)
+            if self.dedupe_sentences and key in seen:
+                continue
+            sentence_tokens = self.count_tokens(sentence)
+            if tokens + sentence_tokens > budget:
+                break
+            kept.append(sentence)
+            tokens += sentence_tokens
+            seen.add(key)
+        return kept, tokens
+
+    @component.output_types(documents=List[Document], tokens=int)
+    def run(self, documents: List[Document], max_tokens: Optional[int] = None):
+        budget = max_tokens or self.max_tokens
+        passages = merge_chunks(documents)
+        # Highest scores first, passages without a score keep their retrieval order after the scored ones
+        order = sorted(range(len(passages)), key=lambda i: (passages[i].score is None, -(passages[i].score or 0), i))
+
+        packed, seen, used = [], set(), 0
+        for i in order:
+            passage = passages[i]
+            kept, tokens = self._pack(passage, seen, budget - used)
+            if not kept:
+                continue
+            content = passage.content if len(kept) == len(split_sentences(passage.content)) else " ".join(kept)
+            packed.append(Document(id=passage.id, content=content, meta=passage.meta, score=passage.score))
+            used += tokens
+            if used >= budget:
+                break
+        return {"documents": packed, "tokens": used}
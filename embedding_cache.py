@@ -0,0 +1,155 @@
+'''
+A persistent, content-addressed cache for document embeddings.
+CachedDocumentEmbedder sits in front of a SentenceTransformersDocumentEmbedder and looks up every chunk by
+a hash of the model name, the exact text that would be embedded (including the meta_fields_to_embed prefix)
+and the normalization settings. Only chunks that miss the cache are sent through the model,
+so re-indexing unchanged data does not load or run the model at all.
+'''
+
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from haystack import Document, component, default_from_dict, default_to_dict
+from haystack.core.serialization import component_from_dict, component_to_dict, import_class_by_name
+
+DEFAULT_CACHE_PATH = ".embedding_cache/embeddings.sqlite"
+
+
+def text_to_embed(embedder, document):
+    meta_values_to_embed = [
+        str(document.meta[key]) for key in embedder.meta_fields_to_embed if key in document.meta and document.meta[key]
+    ]
+    text = embedder.embedding_separator.join(meta_values_to_embed + [document.content or ""])
+    return embedder.prefix + text + embedder.suffix
+
+
+def embedding_key(embedder, text):
+    settings = {
+        "model": embedder.model,
+        "normalize_embeddings": embedder.normalize_embeddings,
+        "truncate_dim": getattr(embedder, "truncate_dim", None),
+        "precision": getattr(embedder, "precision", "float32"),
+    }
+    payload = json.dumps(settings, sort_keys=True) + "\x00" + text
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=500_000):
+        self.path = str(path)
+        self.max_entries = max_entries
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings "
+            "(key TEXT PRIMARY KEY, dtype TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self.connection.commit()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, keys):
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        # SQLite limits the number of bound parameters per statement
+        for start in range(0, len(unique_keys), 500):
+            batch = unique_keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.connection.execute(
+                f"SELECT key, dtype, vector FROM embeddings WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            for key, dtype, vector in rows:
+                found[key] = np.frombuffer(vector, dtype=np.dtype(dtype)).tolist()
+
+        if found:
+            now = time.time()
+            self.connection.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+            self.connection.commit()
+        return found
+
+    def put_many(self, items):
+        now = time.time()
+        rows = []
+        for key, embedding in items.items():
+            array = np.asarray(embedding)
+            rows.append((key, array.dtype.str, array.tobytes(), now))
+        self.connection.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+        self.evict()
+        self.connection.commit()
+
+    def evict(self):
+        overflow = len(self) - self.max_entries
+        if overflow > 0:
+            self.connection.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (overflow,),
+            )
+
+    def clear(self):
+        self.connection.execute("DELETE FROM embeddings")
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+@component
+class CachedDocumentEmbedder:
+    def __init__(self, embedder, cache_path=DEFAULT_CACHE_PATH, max_entries=500_000):
+        self.embedder = embedder
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self.cache = None
+        self._embedder_warm = False
+
+    def warm_up(self):
+        # The wrapped model is loaded lazily in run(), only when there is a cache miss
+        if self.cache is None:
+            self.cache = EmbeddingCache(self.cache_path, max_entries=self.max_entries)
+
+    def to_dict(self):
+        return default_to_dict(
+            self, embedder=component_to_dict(self.embedder), cache_path=self.cache_path, max_entries=self.max_entries
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        embedder_data = data["init_parameters"]["embedder"]
+        embedder_class = import_class_by_name(embedder_data["type"])
+        data["init_parameters"]["embedder"] = component_from_dict(embedder_class, embedder_data, "embedder")
+        return default_from_dict(cls, data)
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document]):
+        self.warm_up()
+
+        keys = [embedding_key(self.embedder, text_to_embed(self.embedder, doc)) for doc in documents]
+        cached = self.cache.get_many(keys)
+
+        # Embed each distinct missing text only once, even if several chunks share it
+        to_embed = {}
+        for doc, key in zip(documents, keys):
+            if key not in cached and key not in to_embed:
+                to_embed[key] = doc
+
+        if to_embed:
+            if not self._embedder_warm:
+                self.embedder.warm_up()
+                self._embedder_warm = True
+            embedded = self.embedder.run(documents=list(to_embed.values()))["documents"]
+            fresh = {key: doc.embedding for key, doc in zip(to_embed.keys(), embedded)}
+            self.cache.put_many(fresh)
+            cached.update(fresh)
+
+        for doc, key in zip(documents, keys):
+            doc.embedding = cached[key]
+
+        return {"documents": documents}
@@ -4,44 +4,51 @@ In this tutorial, we will see how we can embed metadata as well as the text of a
 We will fetch various pages from Wikipedia and index them into an InMemoryDocumentStore with metadata information that includes their title, and URL. 
 """
 
-import wikipedia
-from haystack import Document, Pipeline
-from haystack.document_stores.in_memory import InMemoryDocumentStore
+from haystack import Pipeline
 from haystack.components.preprocessors import DocumentCleaner, DocumentSplitter
-from haystack.components.embedders import SentenceTransformersDocumentEmbedder, SentenceTransformersTextEmbedder
-from haystack.components.writers import DocumentWriter
-from haystack.components.retrievers.in_memory import InMemoryEmbeddingRetriever
 from haystack.document_stores.types import DuplicatePolicy
+from embedding_cache import CachedDocumentEmbedder
+from indexed_document_store import IndexedInMemoryDocumentStore
+from multi_view_embeddings import InMemoryMultiViewRetriever, MultiViewDocumentWriter, MultiViewEmbedder
+from model_registry import SharedSentenceTransformersDocumentEmbedder, SharedSentenceTransformersTextEmbedder
+from wikipedia_fetcher import fetch_wikipedia_documents
+
+# Each view is an embedding of the same chunks; "title" also embeds the title metadata field
+EMBEDDING_VIEWS = {"content": None, "title": ["title"]}
+
+def create_indexing_pipeline(document_store, views=EMBEDDING_VIEWS):
+    embedders = {
+        view: CachedDocumentEmbedder(SharedSentenceTransformersDocumentEmbedder(
+            model="thenlper/gte-large", meta_fields_to_embed=metadata_fields_to_embed
+        ))
+        for view, metadata_fields_to_embed in views.items()
+    }
 
-def create_indexing_pipeline(document_store, metadata_fields_to_embed=None):
     pipeline = Pipeline()
     pipeline.add_component("cleaner", DocumentCleaner())
     pipeline.add_component("splitter", DocumentSplitter(split_by="sentence", split_length=2))
-    pipeline.add_component("embedder", SentenceTransformersDocumentEmbedder(
-        model="thenlper/gte-large", meta_fields_to_embed=metadata_fields_to_embed
-    ))
-    pipeline.add_component("writer", DocumentWriter(document_store=document_store, policy=DuplicatePolicy.OVERWRITE))
+    pipeline.add_component("embedder", MultiViewEmbedder(embedders))
+    pipeline.add_component("writer", MultiViewDocumentWriter(document_store=document_store, policy=DuplicatePolicy.OVERWRITE))
 
     pipeline.connect("cleaner", "splitter")
     pipeline.connect("splitter", "embedder")
-    pipeline.connect("embedder", "writer")
+    pipeline.connect("embedder.documents", "writer.documents")
+    pipeline.connect("embedder.views", "writer.views")
 
     return pipeline
 
 def fetch_wikipedia_docs(titles):
-    return [Document(content=wikipedia.page(title=title, auto_suggest=False).content,
-                     meta={"title": title, "url": wikipedia.page(title=title, auto_suggest=False).url})
-            for title in titles]
+    # One cached API request per title, fetched concurrently. The pages arrive in any order and are put back in the
+    # order of the titles, so indexing (and ties in retrieval) are the same on every run
+    documents = {doc.meta["title"]: doc for doc in fetch_wikipedia_documents(titles)}
+    return [documents[title] for title in titles if title in documents]
 
-def create_retrieval_pipeline(document_store, document_store_with_metadata):
+def create_retrieval_pipeline(document_store, views=None):
     pipeline = Pipeline()
-    pipeline.add_component("text_embedder", SentenceTransformersTextEmbedder(model="thenlper/gte-large"))
-    pipeline.add_component("retriever", InMemoryEmbeddingRetriever(document_store=document_store, scale_score=False, top_k=3))
-    pipeline.add_component("retriever_with_embeddings", 
-                           InMemoryEmbeddingRetriever(document_store=document_store_with_metadata, scale_score=False, top_k=3))
+    pipeline.add_component("text_embedder", SharedSentenceTransformersTextEmbedder(model="thenlper/gte-large"))
+    pipeline.add_component("retriever", InMemoryMultiViewRetriever(document_store=document_store, views=views, top_k=3))
 
     pipeline.connect("text_embedder", "retriever")
-    pipeline.connect("text_embedder", "retriever_with_embeddings")
 
     return pipeline
 
@@ -49,27 +56,26 @@ def main():
     some_bands = ["The Beatles", "The Cure"]
     raw_docs = fetch_wikipedia_docs(some_bands)
 
-    document_store = InMemoryDocumentStore(embedding_similarity_function="cosine")
-    document_store_with_embedded_metadata = InMemoryDocumentStore(embedding_similarity_function="cosine")
+    # One store holds the chunks once, with a content-only and a title + content embedding for each of them.
+    # The 1024-dim gte-large views become int8 codes, a quarter of their float32 size, once the store holds
+    # compression_parameters["train_size"] (2048 by default) chunks to learn the quantization ranges from.
+    # Below that they are kept as float32, which is the case for the few hundred chunks of two Wikipedia pages
+    document_store = IndexedInMemoryDocumentStore(embedding_similarity_function="cosine", vector_compression="int8")
 
     indexing_pipeline = create_indexing_pipeline(document_store=document_store)
-    indexing_with_metadata_pipeline = create_indexing_pipeline(
-        document_store=document_store_with_embedded_metadata, metadata_fields_to_embed=["title"]
-    )
-
     indexing_pipeline.run({"cleaner": {"documents": raw_docs}})
-    indexing_with_metadata_pipeline.run({"cleaner": {"documents": raw_docs}})
 
-    retrieval_pipeline = create_retrieval_pipeline(document_store, document_store_with_embedded_metadata)
+    retrieval_pipeline = create_retrieval_pipeline(document_store)
 
     result = retrieval_pipeline.run({"text_embedder": {"text": "Have the Beatles ever been to Bangor?"}})
+    documents_by_view = result["retriever"]["documents_by_view"]
 
     print("Retriever Results:\n")
-    for doc in result["retriever"]["documents"]:
+    for doc in documents_by_view["content"]:
         print(doc)
 
     print("\nRetriever with Embeddings Results:\n")
-    for doc in result["retriever_with_embeddings"]["documents"]:
+    for doc in documents_by_view["title"]:
         print(doc)
 
 if __name__ == "__main__":
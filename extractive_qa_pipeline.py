@@ -5,14 +5,22 @@ It's good for use cases where accuracy is paramount, and you need to know exactl
 If you want additional context, here's a deep dive on extractive versus generative language models. 
 '''
 
+import contextlib
+from pathlib import Path
 from datasets import load_dataset
 from haystack import Document, Pipeline
-from haystack.document_stores.in_memory import InMemoryDocumentStore
 from haystack.components.retrievers.in_memory import InMemoryEmbeddingRetriever
-from haystack.components.readers import ExtractiveReader
-from haystack.components.embedders import SentenceTransformersDocumentEmbedder, SentenceTransformersTextEmbedder
 from haystack.components.writers import DocumentWriter
 from haystack.telemetry import tutorial_running
+from indexed_document_store import IndexedInMemoryDocumentStore
+from batched_reader import BatchedExtractiveReader
+from profiling import print_summary, profiling, profiling_enabled
+from streaming_indexing import run_streaming_indexing, stream_dataset
+from model_registry import SharedSentenceTransformersDocumentEmbedder, SharedSentenceTransformersTextEmbedder
+
+SNAPSHOT_PATH = "seven_wonders_qa_snapshot"
+MODEL = "sentence-transformers/multi-qa-mpnet-base-dot-v1"
+READER_TOP_K = 2
 
 def enable_telemetry():
     tutorial_running(34)
@@ -21,26 +29,35 @@ def load_and_prepare_data():
     dataset = load_dataset("bilgeyucel/seven-wonders", split="train")
     return [Document(content=doc["content"], meta=doc["meta"]) for doc in dataset]
 
+def stream_documents():
+    return stream_dataset("bilgeyucel/seven-wonders")
+
 def create_document_store():
-    return InMemoryDocumentStore()
+    return IndexedInMemoryDocumentStore(ann_index="ivf")
 
 def create_indexing_pipeline(document_store, model):
     indexing_pipeline = Pipeline()
-    indexing_pipeline.add_component(instance=SentenceTransformersDocumentEmbedder(model=model), name="embedder")
+    indexing_pipeline.add_component(instance=SharedSentenceTransformersDocumentEmbedder(model=model), name="embedder")
     indexing_pipeline.add_component(instance=DocumentWriter(document_store=document_store), name="writer")
     indexing_pipeline.connect("embedder.documents", "writer.documents")
     return indexing_pipeline
 
-def create_extractive_qa_pipeline(document_store, model):
-    retriever = InMemoryEmbeddingRetriever(document_store=document_store)
-    reader = ExtractiveReader()
+def create_reader():
+    # Of the documents a query retrieves, only the READER_TOP_K best (by retrieval score) are read
+    reader = BatchedExtractiveReader(retrieval_top_k=READER_TOP_K)
     reader.warm_up()
+    return reader
 
-    qa_pipeline = Pipeline()
-    qa_pipeline.add_component(instance=SentenceTransformersTextEmbedder(model=model), name="embedder")
-    qa_pipeline.add_component(instance=retriever, name="retriever")
-    qa_pipeline.add_component(instance=reader, name="reader")
-    qa_pipeline.connect("embedder.embedding", "retriever.query_embedding")
+def create_retrieval_pipeline(document_store, model):
+    retrieval_pipeline = Pipeline()
+    retrieval_pipeline.add_component(instance=SharedSentenceTransformersTextEmbedder(model=model), name="embedder")
+    retrieval_pipeline.add_component(instance=InMemoryEmbeddingRetriever(document_store=document_store), name="retriever")
+    retrieval_pipeline.connect("embedder.embedding", "retriever.query_embedding")
+    return retrieval_pipeline
+
+def create_extractive_qa_pipeline(document_store, model, reader=None):
+    qa_pipeline = create_retrieval_pipeline(document_store, model)
+    qa_pipeline.add_component(instance=reader or create_reader(), name="reader")
     qa_pipeline.connect("retriever.documents", "reader.documents")
     return qa_pipeline
 
@@ -53,24 +70,50 @@ def run_query(pipeline, query, top_k_retriever=3, top_k_reader=2):
         }
     )
 
-def main():
-    enable_telemetry()
+def run_queries(retrieval_pipeline, reader, queries, top_k_retriever=3, top_k_reader=2):
+    # Retrieval runs per query, the reader then reads the windows of all queries in length-bucketed batches
+    documents = [
+        retrieval_pipeline.run({"embedder": {"text": query}, "retriever": {"top_k": top_k_retriever}})["retriever"]["documents"]
+        for query in queries
+    ]
+    return reader.run_batch(queries, documents, top_k=top_k_reader)["answers"]
 
-    model = "sentence-transformers/multi-qa-mpnet-base-dot-v1"
-    documents = load_and_prepare_data()
+def load_or_build_document_store(model, snapshot_path=SNAPSHOT_PATH):
+    if Path(snapshot_path).exists():
+        return IndexedInMemoryDocumentStore.load_snapshot(snapshot_path)
     document_store = create_document_store()
 
-    # Indexing pipeline
+    # Indexing pipeline, fed from the streamed dataset in micro-batches so memory stays flat
     indexing_pipeline = create_indexing_pipeline(document_store, model)
-    indexing_pipeline.run({"documents": documents})
+    run_streaming_indexing(indexing_pipeline, stream_documents(), component="embedder")
+    document_store.save_snapshot(snapshot_path)
+    return document_store
+
+def main(profile=False):
+    enable_telemetry()
+
+    model = MODEL
+    document_store = load_or_build_document_store(model)
 
     # Extractive QA pipeline
-    qa_pipeline = create_extractive_qa_pipeline(document_store, model)
+    reader = create_reader()
+    qa_pipeline = create_extractive_qa_pipeline(document_store, model, reader=reader)
 
     # Run a query
     query = "Who was Pliny the Elder?"
-    result = run_query(qa_pipeline, query)
+    # With profile=True the embedder, retriever and reader runs are timed, see profiling.py
+    with profiling() if profile else contextlib.nullcontext() as tracer:
+        result = run_query(qa_pipeline, query)
     print(result)
+    if tracer is not None:
+        tracer.write_chrome_trace("extractive_qa_trace.json")
+        print_summary(tracer.summary())
+
+    # Answer several questions in one batched reader call
+    queries = ["What did the Rhodes statue look like?", "Where were the Hanging Gardens?", "Who built the Lighthouse of Alexandria?"]
+    retrieval_pipeline = create_retrieval_pipeline(document_store, model)
+    for query, answers in zip(queries, run_queries(retrieval_pipeline, reader, queries)):
+        print(query, [answer.data for answer in answers])
 
 if __name__ == "__main__":
-    main()
+    main(profile=profiling_enabled())
@@ -4,6 +4,7 @@ Each file will have its own FileConverter.
 The rest of the indexing pipeline is fairly standard - split the documents into chunks, trim whitespace, create embeddings and write them to a Document Store.
 '''
 
+import asyncio
 import os
 import gdown
 from pathlib import Path
@@ -16,23 +17,47 @@ from haystack.components.converters import MarkdownToDocument, PyPDFToDocument,
 from haystack.components.preprocessors import DocumentSplitter, DocumentCleaner
 from haystack.components.routers import FileTypeRouter
 from haystack.components.joiners import DocumentJoiner
-from haystack.components.embedders import SentenceTransformersDocumentEmbedder, SentenceTransformersTextEmbedder
 from haystack.components.retrievers.in_memory import InMemoryEmbeddingRetriever
 from haystack.components.builders import PromptBuilder
 from haystack.components.generators import HuggingFaceAPIGenerator
+from incremental_indexing import run_incremental_indexing
+from parallel_conversion import ParallelConverter
+from async_generation import AsyncHuggingFaceAPIGenerator, run_prompt_batch
+from context_packing import ContextPacker
+from model_registry import SharedSentenceTransformersDocumentEmbedder, SharedSentenceTransformersTextEmbedder
+from near_duplicates import NearDuplicateFilter
+
+DOCUMENT_STORE_PATH = "recipe_document_store.json"
+MANIFEST_PATH = "recipe_index_manifest.json"
+NEAR_DUPLICATE_INDEX_PATH = "recipe_minhash_index.npz"
 
 def download_files(url, output_dir):
     gdown.download_folder(url, quiet=True, output=output_dir)
 
-def create_indexing_pipeline(document_store):
+def load_document_store(path):
+    if Path(path).exists():
+        return InMemoryDocumentStore.load_from_disk(path)
+    return InMemoryDocumentStore()
+
+def create_indexing_pipeline(document_store, conversion_workers=1, conversion_chunksize=4, near_duplicate_threshold=0.85):
     file_type_router = FileTypeRouter(mime_types=["text/plain", "application/pdf", "text/markdown"])
     text_file_converter = TextFileToDocument()
     markdown_converter = MarkdownToDocument()
     pdf_converter = PyPDFToDocument()
+    if conversion_workers > 1:
+        # Spread the sources of each converter over a process pool, PDF parsing is CPU bound
+        text_file_converter, markdown_converter, pdf_converter = (
+            ParallelConverter(converter, workers=conversion_workers, chunksize=conversion_chunksize)
+            for converter in (text_file_converter, markdown_converter, pdf_converter)
+        )
     document_joiner = DocumentJoiner()
     document_cleaner = DocumentCleaner()
     document_splitter = DocumentSplitter(split_by="word", split_length=150, split_overlap=50)
-    document_embedder = SentenceTransformersDocumentEmbedder(model="sentence-transformers/all-MiniLM-L6-v2")
+    # Recipes repeat a lot of boilerplate: chunks that nearly duplicate an indexed chunk aren't embedded and stored
+    near_duplicate_filter = NearDuplicateFilter(
+        index_path=NEAR_DUPLICATE_INDEX_PATH, threshold=near_duplicate_threshold, document_store=document_store
+    )
+    document_embedder = SharedSentenceTransformersDocumentEmbedder(model="sentence-transformers/all-MiniLM-L6-v2")
     document_writer = DocumentWriter(document_store)
 
     pipeline = Pipeline()
@@ -43,6 +68,7 @@ def create_indexing_pipeline(document_store):
     pipeline.add_component(instance=document_joiner, name="document_joiner")
     pipeline.add_component(instance=document_cleaner, name="document_cleaner")
     pipeline.add_component(instance=document_splitter, name="document_splitter")
+    pipeline.add_component(instance=near_duplicate_filter, name="near_duplicate_filter")
     pipeline.add_component(instance=document_embedder, name="document_embedder")
     pipeline.add_component(instance=document_writer, name="document_writer")
 
@@ -54,12 +80,13 @@ def create_indexing_pipeline(document_store):
     pipeline.connect("markdown_converter", "document_joiner")
     pipeline.connect("document_joiner", "document_cleaner")
     pipeline.connect("document_cleaner", "document_splitter")
-    pipeline.connect("document_splitter", "document_embedder")
+    pipeline.connect("document_splitter", "near_duplicate_filter")
+    pipeline.connect("near_duplicate_filter.documents", "document_embedder")
     pipeline.connect("document_embedder", "document_writer")
 
     return pipeline
 
-def create_query_pipeline(document_store):
+def create_query_prompt_pipeline(document_store, context_tokens=1500):
     template = """
     Answer the questions based on the given context.
 
@@ -73,46 +100,71 @@ def create_query_pipeline(document_store):
     """
     
     pipe = Pipeline()
-    pipe.add_component("embedder", SentenceTransformersTextEmbedder(model="sentence-transformers/all-MiniLM-L6-v2"))
+    pipe.add_component("embedder", SharedSentenceTransformersTextEmbedder(model="sentence-transformers/all-MiniLM-L6-v2"))
     pipe.add_component("retriever", InMemoryEmbeddingRetriever(document_store=document_store))
+    # The splitter's 50 word overlap would otherwise repeat a third of every neighbouring chunk in the prompt
+    pipe.add_component("context_packer", ContextPacker(max_tokens=context_tokens))
     pipe.add_component("prompt_builder", PromptBuilder(template=template))
+
+    pipe.connect("embedder.embedding", "retriever.query_embedding")
+    pipe.connect("retriever", "context_packer.documents")
+    pipe.connect("context_packer.documents", "prompt_builder.documents")
+
+    return pipe
+
+def create_query_pipeline(document_store, context_tokens=1500):
+    pipe = create_query_prompt_pipeline(document_store, context_tokens=context_tokens)
     pipe.add_component(
         "llm",
         HuggingFaceAPIGenerator(api_type="serverless_inference_api", api_params={"model": "HuggingFaceH4/zephyr-7b-beta"}),
     )
-
-    pipe.connect("embedder.embedding", "retriever.query_embedding")
-    pipe.connect("retriever", "prompt_builder.documents")
     pipe.connect("prompt_builder", "llm")
 
     return pipe
 
-def main():
+async def ask_questions_async(prompt_pipeline, questions, max_concurrency=8, on_token=None):
+    inputs = [{"embedder": {"text": question}, "prompt_builder": {"question": question}} for question in questions]
+    async with AsyncHuggingFaceAPIGenerator(model="HuggingFaceH4/zephyr-7b-beta", max_concurrency=max_concurrency) as llm:
+        results = await run_prompt_batch(
+            prompt_pipeline, llm, inputs, generation_kwargs={"max_new_tokens": 350}, on_token=on_token
+        )
+    return [result["replies"][0] for result in results]
+
+def main(incremental=True, conversion_workers=os.cpu_count()):
     # Download files
     url = "https://drive.google.com/drive/folders/1n9yqq5Gl_HWfND5bTlrCwAOycMDt5EMj"
     output_dir = "recipe_files"
     download_files(url, output_dir)
-
-    # Create document store
-    document_store = InMemoryDocumentStore()
-
-    # Create and run indexing pipeline
-    indexing_pipeline = create_indexing_pipeline(document_store)
-    indexing_pipeline.run({"file_type_router": {"sources": list(Path(output_dir).glob("**/*"))}})
+    sources = list(Path(output_dir).glob("**/*"))
+
+    if incremental:
+        # Only new or changed files are converted, split and embedded; stale chunks are removed
+        document_store = load_document_store(DOCUMENT_STORE_PATH)
+        indexing_pipeline = create_indexing_pipeline(document_store, conversion_workers=conversion_workers)
+        report = run_incremental_indexing(
+            indexing_pipeline,
+            document_store,
+            sources,
+            manifest_path=MANIFEST_PATH,
+            duplicates_name="near_duplicate_filter",
+        )
+        print(f"Indexed {len(report['indexed'])} files, removed {len(report['removed'])}, unchanged {report['unchanged']}")
+        document_store.save_to_disk(DOCUMENT_STORE_PATH)
+    else:
+        # Create document store
+        document_store = InMemoryDocumentStore()
+
+        # Create and run indexing pipeline
+        indexing_pipeline = create_indexing_pipeline(document_store, conversion_workers=conversion_workers)
+        indexing_pipeline.run({"file_type_router": {"sources": sources}})
 
     # Create query pipeline
-    query_pipeline = create_query_pipeline(document_store)
+    prompt_pipeline = create_query_prompt_pipeline(document_store)
 
-    # Run query
+    # Run query, printing the answer while it is generated
     question = "What ingredients would I need to make vegan keto eggplant lasagna, vegan persimmon flan, and vegan hemp cheese?"
-    result = query_pipeline.run(
-        {
-            "embedder": {"text": question},
-            "prompt_builder": {"question": question},
-            "llm": {"generation_kwargs": {"max_new_tokens": 350}},
-        }
-    )
-    print(result)
+    asyncio.run(ask_questions_async(prompt_pipeline, [question], on_token=lambda _, token: print(token, end="", flush=True)))
+    print()
 
 if __name__ == "__main__":
     # Set up Hugging Face API token
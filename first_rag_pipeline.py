@@ -5,25 +5,41 @@ InMemoryBM25Retriever for fetching relevant documents, PromptBuilder for creatin
 and OpenAIGenerator for generating responses.
 '''
 
+import asyncio
+import contextlib
 import os
 from getpass import getpass
+from pathlib import Path
 from datasets import load_dataset
 from haystack import Document, Pipeline
-from haystack.document_stores.in_memory import InMemoryDocumentStore
-from haystack.components.embedders import SentenceTransformersDocumentEmbedder, SentenceTransformersTextEmbedder
 from haystack.components.retrievers.in_memory import InMemoryEmbeddingRetriever
 from haystack.components.builders import PromptBuilder
 from haystack.components.generators import OpenAIGenerator
+from haystack.components.writers import DocumentWriter
+from embedding_cache import CachedDocumentEmbedder
+from indexed_document_store import IndexedInMemoryDocumentStore
+from async_generation import AsyncOpenAIGenerator, run_prompt_batch
+from semantic_cache import SemanticCacheLookup, SemanticCacheWriter
+from profiling import print_summary, profiling, profiling_enabled
+from streaming_indexing import BufferedDocumentWriter, run_streaming_indexing, stream_dataset
+from context_packing import ContextPacker
+from model_registry import SharedSentenceTransformersDocumentEmbedder, SharedSentenceTransformersTextEmbedder
+
+SNAPSHOT_PATH = "seven_wonders_snapshot"
+FLUSH_EVERY = 1024
 
 def initialize_document_store():
-    return InMemoryDocumentStore()
+    return IndexedInMemoryDocumentStore(ann_index="ivf")
 
 def fetch_and_prepare_data():
     dataset = load_dataset("bilgeyucel/seven-wonders", split="train")
     return [Document(content=doc["content"], meta=doc["meta"]) for doc in dataset]
 
+def stream_documents():
+    return stream_dataset("bilgeyucel/seven-wonders")
+
 def create_document_embedder():
-    embedder = SentenceTransformersDocumentEmbedder(model="sentence-transformers/all-MiniLM-L6-v2")
+    embedder = CachedDocumentEmbedder(SharedSentenceTransformersDocumentEmbedder(model="sentence-transformers/all-MiniLM-L6-v2"))
     embedder.warm_up()
     return embedder
 
@@ -31,8 +47,15 @@ def index_documents(document_store, docs, doc_embedder):
     docs_with_embeddings = doc_embedder.run(docs)
     document_store.write_documents(docs_with_embeddings["documents"])
 
-def create_rag_pipeline(document_store):
-    text_embedder = SentenceTransformersTextEmbedder(model="sentence-transformers/all-MiniLM-L6-v2")
+def create_indexing_pipeline(document_store, doc_embedder, writer=None):
+    pipeline = Pipeline()
+    pipeline.add_component("embedder", doc_embedder)
+    pipeline.add_component("writer", writer or DocumentWriter(document_store))
+    pipeline.connect("embedder.documents", "writer.documents")
+    return pipeline
+
+def create_prompt_pipeline(document_store, semantic_cache=False, context_tokens=1500):
+    text_embedder = SharedSentenceTransformersTextEmbedder(model="sentence-transformers/all-MiniLM-L6-v2")
     retriever = InMemoryEmbeddingRetriever(document_store)
     
     template = """
@@ -48,20 +71,44 @@ def create_rag_pipeline(document_store):
     """
     prompt_builder = PromptBuilder(template=template)
     
-    if "OPENAI_API_KEY" not in os.environ:
-        os.environ["OPENAI_API_KEY"] = getpass("Enter OpenAI API key:")
-    generator = OpenAIGenerator(model="gpt-3.5-turbo")
-    
     pipeline = Pipeline()
     pipeline.add_component("text_embedder", text_embedder)
     pipeline.add_component("retriever", retriever)
+    # Overlapping chunks are merged, repeated sentences dropped and the context cut to the token budget
+    pipeline.add_component("context_packer", ContextPacker(max_tokens=context_tokens))
     pipeline.add_component("prompt_builder", prompt_builder)
-    pipeline.add_component("llm", generator)
     
-    pipeline.connect("text_embedder.embedding", "retriever.query_embedding")
-    pipeline.connect("retriever", "prompt_builder.documents")
+    if semantic_cache:
+        # Near-identical questions are answered from the cache, skipping retrieval and the LLM
+        pipeline.add_component("cache_lookup", SemanticCacheLookup(document_store, threshold=0.95))
+        pipeline.connect("text_embedder.embedding", "cache_lookup.embedding")
+        pipeline.connect("cache_lookup.embedding", "retriever.query_embedding")
+    else:
+        pipeline.connect("text_embedder.embedding", "retriever.query_embedding")
+    pipeline.connect("retriever", "context_packer.documents")
+    pipeline.connect("context_packer.documents", "prompt_builder.documents")
+    
+    return pipeline
+
+def ensure_openai_api_key():
+    if "OPENAI_API_KEY" not in os.environ:
+        os.environ["OPENAI_API_KEY"] = getpass("Enter OpenAI API key:")
+
+def create_rag_pipeline(document_store, semantic_cache=True, context_tokens=1500):
+    pipeline = create_prompt_pipeline(document_store, semantic_cache=semantic_cache, context_tokens=context_tokens)
+    
+    ensure_openai_api_key()
+    generator = OpenAIGenerator(model="gpt-3.5-turbo")
+    
+    pipeline.add_component("llm", generator)
     pipeline.connect("prompt_builder", "llm")
     
+    if semantic_cache:
+        pipeline.add_component("cache_writer", SemanticCacheWriter(document_store))
+        pipeline.connect("cache_lookup.embedding", "cache_writer.embedding")
+        pipeline.connect("retriever.documents", "cache_writer.documents")
+        pipeline.connect("llm.replies", "cache_writer.replies")
+    
     return pipeline
 
 def ask_question(pipeline, question):
@@ -69,20 +116,50 @@ def ask_question(pipeline, question):
         "text_embedder": {"text": question},
         "prompt_builder": {"question": question}
     })
-    return response["llm"]["replies"][0]
+    # The reply comes from the cache on a hit, through the cache writer on a miss, or from the LLM without a cache
+    for name in ("cache_lookup", "cache_writer", "llm"):
+        if "replies" in response.get(name, {}):
+            return response[name]["replies"][0]
 
-def main():
+async def ask_questions_async(prompt_pipeline, questions, max_concurrency=8, on_token=None):
+    # All LLM calls are in flight at once, so the batch takes about as long as the slowest answer
+    ensure_openai_api_key()
+    inputs = [{"text_embedder": {"text": question}, "prompt_builder": {"question": question}} for question in questions]
+    async with AsyncOpenAIGenerator(model="gpt-3.5-turbo", max_concurrency=max_concurrency) as generator:
+        results = await run_prompt_batch(prompt_pipeline, generator, inputs, on_token=on_token)
+    return [result["replies"][0] for result in results]
+
+def load_or_build_document_store(snapshot_path=SNAPSHOT_PATH):
+    # Restoring the memory-mapped snapshot skips fetching, embedding and indexing on restart
+    if Path(snapshot_path).exists():
+        return IndexedInMemoryDocumentStore.load_snapshot(snapshot_path)
     document_store = initialize_document_store()
-    docs = fetch_and_prepare_data()
-    doc_embedder = create_document_embedder()
-    index_documents(document_store, docs, doc_embedder)
+    # The dataset is streamed through the embedder in micro-batches instead of loaded as one list.
+    # The writer buffers the embedded documents and writes them to the store every FLUSH_EVERY documents,
+    # so the ANN index grows in a few large steps instead of one per micro-batch
+    writer = BufferedDocumentWriter(document_store)
+    indexing_pipeline = create_indexing_pipeline(document_store, create_document_embedder(), writer=writer)
+    run_streaming_indexing(
+        indexing_pipeline, stream_documents(), component="embedder", flush_every=FLUSH_EVERY, flush=writer.flush
+    )
+    document_store.save_snapshot(snapshot_path)
+    return document_store
+
+def main(profile=False):
+    document_store = load_or_build_document_store()
     
     rag_pipeline = create_rag_pipeline(document_store)
     
     question = "Where is Gardens of Babylon?"
-    answer = ask_question(rag_pipeline, question)
+    # With profile=True every component run is timed and written as a Chrome trace and OpenTelemetry spans
+    with profiling() if profile else contextlib.nullcontext() as tracer:
+        answer = ask_question(rag_pipeline, question)
     print(f"Question: {question}")
     print(f"Answer: {answer}")
+    if tracer is not None:
+        tracer.write_chrome_trace("rag_trace.json")
+        tracer.write_otel_json("rag_spans.json")
+        print_summary(tracer.summary())
     
     # Additional example questions
     examples = [
@@ -94,9 +171,11 @@ def main():
         "How did Colossus of Rhodes collapse?",
     ]
     
-    for question in examples:
+    prompt_pipeline = create_prompt_pipeline(document_store)
+    answers = asyncio.run(ask_questions_async(prompt_pipeline, examples))
+    for question, answer in zip(examples, answers):
         print(f"\nQuestion: {question}")
-        print(f"Answer: {ask_question(rag_pipeline, question)}")
+        print(f"Answer: {answer}")
 
 if __name__ == "__main__":
-    main()
+    main(profile=profiling_enabled())
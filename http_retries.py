@@ -0,0 +1,24 @@
+'''
+Retry helpers shared by the aiohttp clients (async_generation.py and wikipedia_fetcher.py).
+retry_after reads a Retry-After header, given either in seconds or as an HTTP date, and caps it at `max_delay`,
+so a server (or a misbehaving proxy) can't park a client for hours.
+'''
+
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def retry_after(response, max_delay=60.0):
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            delay = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return min(max(delay, 0.0), max_delay)
@@ -0,0 +1,83 @@
+'''
+A retriever that runs hybrid BM25 + embedding search on an IndexedInMemoryDocumentStore in a single call.
+Both rankings are computed over the same filtered candidates and fused with reciprocal rank fusion (default)
+or a weighted sum of min-max normalized scores, which replaces a BM25 branch, an embedding branch and a DocumentJoiner.
+
+    pipeline.add_component("text_embedder", SentenceTransformersTextEmbedder(model=model))
+    pipeline.add_component("retriever", InMemoryHybridRetriever(document_store, top_k=5))
+    pipeline.connect("text_embedder.embedding", "retriever.query_embedding")
+    pipeline.run({"text_embedder": {"text": question}, "retriever": {"query": question}})
+'''
+
+from typing import Any, Dict, List, Optional
+
+from haystack import DeserializationError, Document, component, default_from_dict, default_to_dict
+
+from indexed_document_store import FUSION_METHODS, IndexedInMemoryDocumentStore
+
+
+@component
+class InMemoryHybridRetriever:
+    def __init__(
+        self,
+        document_store,
+        filters=None,
+        top_k=10,
+        fusion="reciprocal_rank_fusion",
+        dense_weight=0.5,
+        rrf_k=60,
+        candidate_k=None,
+    ):
+        if not isinstance(document_store, IndexedInMemoryDocumentStore):
+            raise ValueError("document_store must be an instance of IndexedInMemoryDocumentStore")
+        if top_k <= 0:
+            raise ValueError(f"top_k must be greater than 0. Currently, the top_k is {top_k}")
+        if fusion not in FUSION_METHODS:
+            raise ValueError(f"Fusion method '{fusion}' is not supported.")
+        self.document_store = document_store
+        self.filters = filters
+        self.top_k = top_k
+        self.fusion = fusion
+        self.dense_weight = dense_weight
+        self.rrf_k = rrf_k
+        self.candidate_k = candidate_k
+
+    def to_dict(self):
+        return default_to_dict(
+            self,
+            document_store=self.document_store.to_dict(),
+            filters=self.filters,
+            top_k=self.top_k,
+            fusion=self.fusion,
+            dense_weight=self.dense_weight,
+            rrf_k=self.rrf_k,
+            candidate_k=self.candidate_k,
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        init_params = data.get("init_parameters", {})
+        if "document_store" not in init_params:
+            raise DeserializationError("Missing 'document_store' in serialization data")
+        init_params["document_store"] = IndexedInMemoryDocumentStore.from_dict(init_params["document_store"])
+        return default_from_dict(cls, data)
+
+    @component.output_types(documents=List[Document])
+    def run(
+        self,
+        query: str,
+        query_embedding: List[float],
+        filters: Optional[Dict[str, Any]] = None,
+        top_k: Optional[int] = None,
+    ):
+        docs = self.document_store.hybrid_retrieval(
+            query=query,
+            query_embedding=query_embedding,
+            filters=filters or self.filters,
+            top_k=top_k or self.top_k,
+            fusion=self.fusion,
+            dense_weight=self.dense_weight,
+            rrf_k=self.rrf_k,
+            candidate_k=self.candidate_k,
+        )
+        return {"documents": docs}
@@ -0,0 +1,128 @@
+'''
+Incremental re-indexing for file based indexing pipelines.
+A manifest keeps the size, mtime and content hash of every indexed source file together with the ids of the chunks
+it produced. On the next run only new or changed files are sent through the pipeline,
+and the chunks of modified or deleted files are removed from the document store first.
+
+Chunks a NearDuplicateFilter (see near_duplicates.py) suppressed are never written: with `duplicates_name` the manifest
+keeps them apart with the id of the chunk they duplicate, and a file is indexed again when one of those chunks is removed.
+'''
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+DEFAULT_MANIFEST_PATH = ".index_manifest.json"
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(path=DEFAULT_MANIFEST_PATH):
+    if not Path(path).exists():
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path=DEFAULT_MANIFEST_PATH):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def drop_missing_entries(manifest, document_store):
+    # Entries whose chunks are no longer in the store (e.g. a fresh store) must be indexed again
+    if not manifest:
+        return manifest
+    present = {doc.id for doc in document_store.filter_documents()}
+    return {
+        source: entry
+        for source, entry in manifest.items()
+        if all(doc_id in present for doc_id in [*entry["document_ids"], *entry.get("duplicate_of", {}).values()])
+    }
+
+
+def plan_changes(sources, manifest):
+    current = {}
+    to_index = []
+    for source in sources:
+        path = Path(source)
+        if not path.is_file():
+            continue
+        stat = path.stat()
+        entry = manifest.get(str(path))
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            current[str(path)] = entry
+            continue
+
+        # Size or mtime changed: only the content hash decides if the file really needs re-indexing
+        sha256 = file_sha256(path)
+        if entry and entry["sha256"] == sha256:
+            current[str(path)] = {**entry, "size": stat.st_size, "mtime": stat.st_mtime}
+            continue
+        current[str(path)] = {
+            "size": stat.st_size, "mtime": stat.st_mtime, "sha256": sha256, "document_ids": [], "duplicate_of": {}
+        }
+        to_index.append(path)
+
+    # Sources that disappeared or were modified leave stale chunks behind in the store
+    pending = {str(path) for path in to_index}
+    stale = [source for source in manifest if source not in current or source in pending]
+    return to_index, stale, current
+
+
+def run_incremental_indexing(
+    pipeline,
+    document_store,
+    sources,
+    manifest_path=DEFAULT_MANIFEST_PATH,
+    router_name="file_type_router",
+    splitter_name="document_splitter",
+    duplicates_name=None,
+):
+    manifest = drop_missing_entries(load_manifest(manifest_path), document_store)
+    to_index, stale, current = plan_changes(sources, manifest)
+
+    stale_ids = [doc_id for source in stale for doc_id in manifest[source]["document_ids"]]
+    # Unchanged files whose chunks were skipped as near duplicates of a stale chunk lose their content otherwise
+    removed = set(stale_ids)
+    for source, entry in list(current.items()):
+        if source in manifest and source not in stale and removed.intersection(entry.get("duplicate_of", {}).values()):
+            stale_ids.extend(entry["document_ids"])
+            to_index.append(Path(source))
+            current[source] = {**entry, "document_ids": [], "duplicate_of": {}}
+    if stale_ids:
+        document_store.delete_documents(stale_ids)
+
+    # Persist the manifest without the files about to be indexed, so an interrupted run retries them
+    pending = {str(path) for path in to_index}
+    save_manifest({source: entry for source, entry in current.items() if source not in pending}, manifest_path)
+
+    if to_index:
+        outputs = {splitter_name, duplicates_name} - {None}
+        result = pipeline.run({router_name: {"sources": to_index}}, include_outputs_from=outputs)
+        duplicates = result.get(duplicates_name, {}).get("duplicates", []) if duplicates_name else []
+        duplicate_of = {chunk.id: chunk.meta["duplicate_of"] for chunk in duplicates}
+        for chunk in result[splitter_name]["documents"]:
+            source = chunk.meta.get("file_path")
+            if source not in current:
+                continue
+            if chunk.id in duplicate_of:
+                current[source].setdefault("duplicate_of", {})[chunk.id] = duplicate_of[chunk.id]
+            else:
+                current[source]["document_ids"].append(chunk.id)
+
+    save_manifest(current, manifest_path)
+    return {
+        "indexed": [str(path) for path in to_index],
+        "removed": [source for source in stale if source not in current],
+        "unchanged": len(current) - len(to_index),
+    }
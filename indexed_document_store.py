@@ -0,0 +1,841 @@
+'''
+An InMemoryDocumentStore that keeps search indexes up to date on write_documents and delete_documents,
+so retrieval no longer has to scan every stored document.
+batch_embedding_retrieval answers several query embeddings with one matrix product (see query_server.py).
+BM25 queries are answered from an inverted index (see bm25_index.py) that only touches documents with a query token.
+Filters are answered from per-field metadata indexes (see metadata_index.py) before any BM25 or embedding scoring.
+hybrid_retrieval scores BM25 and embeddings in a single pass over the filtered documents and fuses both rankings.
+Several named embedding views per document (e.g. content only and title + content) can be kept next to a single
+copy of the documents with write_embedding_views and searched together with multi_view_retrieval.
+With vector_compression ("fp16", "int8" or "pq", see vector_compression.py) the view block holds compressed codes.
+The codes are 2x, 4x or dim/pq_subvectors x smaller than float32, and 8x, 16x or more against embeddings kept as
+Python lists. Such a store keeps embeddings only as views: write_documents refuses documents with an embedding and
+ann_index can't be set, as neither would be compressed.
+Searches score the codes. With `rescore` the best `rescore * top_k` candidates are rescored with the float32 vectors,
+which are then kept next to the codes (a store loaded from a snapshot memory-maps them, so they stay on disk).
+compression_report compares the recall and latency of every compression against the float32 baseline.
+With ann_index="ivf" the embeddings live in an IVFIndex (see vector_index.py) and embedding_retrieval only scores
+the closest clusters. Stores below `exact_search_threshold` documents keep using exact brute-force search.
+It is a drop-in replacement for InMemoryDocumentStore, so InMemoryEmbeddingRetriever works with it unchanged.
+
+save_snapshot writes the store to a directory: the embeddings as one contiguous float32 matrix and the documents
+as an Arrow file. load_snapshot memory-maps both, so a restarted or forked query worker is serving right away
+and all workers on a machine share the same pages instead of each holding a private copy. A restored Document keeps
+its embedding as a row of the memory map: filter_documents hands out copies with the embedding as a list, and exact
+embedding search scores the memory-mapped matrix directly. An existing snapshot is only replaced once the new one is
+complete, and a snapshot is always loaded into a new index.
+'''
+
+import heapq
+import json
+import os
+import shutil
+import time
+from dataclasses import replace
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterable, Set
+
+import numpy as np
+import pyarrow as pa
+from haystack import Document, logging
+from haystack.document_stores.in_memory import InMemoryDocumentStore
+from haystack.document_stores.in_memory.document_store import BM25_SCALING_FACTOR, DOT_PRODUCT_SCALING_FACTOR
+from haystack.document_stores.types import DuplicatePolicy
+from haystack.utils import expit
+from haystack.utils.filters import convert
+
+from bm25_index import BM25Index
+from metadata_index import MetadataIndex
+from profiling import percentile
+from vector_compression import COMPRESSIONS
+from vector_index import IVFIndex, MultiViewIndex, normalize_rows, top_k_indices
+
+logger = logging.getLogger(__name__)
+
+# Like the documents themselves, indexes are shared by all store instances that use the same index name
+_ANN_INDEXES: Dict[str, IVFIndex] = {}
+_VIEW_INDEXES: Dict[str, MultiViewIndex] = {}
+_META_INDEXES: Dict[str, MetadataIndex] = {}
+# One inverted index per BM25 configuration, in case stores with different settings share an index name
+_LEXICAL_INDEXES: Dict[str, Dict[str, BM25Index]] = {}
+# Indexes restored from a snapshot whose BM25 statistics are only computed when they are first needed
+_PENDING_BM25_INDEXES: Set[str] = set()
+# Bumped on every change to an index, so caches built on top of a store know when they are stale
+_STORE_VERSIONS: Dict[str, int] = {}
+# The embeddings of an index as one float32 matrix for batched exact search, with the store version it was built at
+_EXACT_MATRICES: Dict[str, tuple] = {}
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+# The documents InMemoryDocumentStore.bm25_retrieval considers at all
+CONTENT_TYPE_FILTER = {
+    "operator": "OR",
+    "conditions": [
+        {"field": "content", "operator": "!=", "value": None},
+        {"field": "dataframe", "operator": "!=", "value": None},
+    ],
+}
+
+DEFAULT_ANN_PARAMETERS = {"nlist": None, "nprobe": 8, "exact_search_threshold": 10_000}
+
+DEFAULT_COMPRESSION_PARAMETERS = {"rescore": 0, "train_size": 2048, "pq_subvectors": None}
+
+
+class IndexedInMemoryDocumentStore(InMemoryDocumentStore):
+    def __init__(
+        self,
+        bm25_tokenization_regex=r"(?u)\b\w\w+\b",
+        bm25_algorithm="BM25L",
+        bm25_parameters=None,
+        embedding_similarity_function="dot_product",
+        index=None,
+        ann_index=None,
+        ann_parameters=None,
+        vector_compression=None,
+        compression_parameters=None,
+    ):
+        super().__init__(
+            bm25_tokenization_regex=bm25_tokenization_regex,
+            bm25_algorithm=bm25_algorithm,
+            bm25_parameters=bm25_parameters,
+            embedding_similarity_function=embedding_similarity_function,
+            index=index,
+        )
+        if ann_index not in (None, "ivf"):
+            raise ValueError(f"ANN index '{ann_index}' is not supported.")
+        self.ann_index = ann_index
+        self.ann_parameters = {**DEFAULT_ANN_PARAMETERS, **(ann_parameters or {})}
+        if vector_compression not in (None, *COMPRESSIONS):
+            raise ValueError(f"Vector compression '{vector_compression}' is not supported.")
+        if vector_compression and ann_index:
+            raise ValueError("vector_compression only applies to embedding views and can't be combined with ann_index.")
+        self.vector_compression = vector_compression
+        self.compression_parameters = {**DEFAULT_COMPRESSION_PARAMETERS, **(compression_parameters or {})}
+        self._overwriting = False
+
+        if self.ann_index and self.index not in _ANN_INDEXES:
+            _ANN_INDEXES[self.index] = IVFIndex(
+                similarity=self.embedding_similarity_function,
+                nlist=self.ann_parameters["nlist"],
+                nprobe=self.ann_parameters["nprobe"],
+                min_train_size=self.ann_parameters["exact_search_threshold"],
+            )
+            self._ann.add(*self._embedded(self.storage.values()))
+
+    @property
+    def _ann(self):
+        return _ANN_INDEXES.get(self.index)
+
+    @property
+    def _views(self):
+        return _VIEW_INDEXES.get(self.index)
+
+    @property
+    def _meta(self):
+        # Built on first use, so stores restored from a snapshot don't pay for it up front
+        if self.index not in _META_INDEXES:
+            _META_INDEXES[self.index] = MetadataIndex()
+            _META_INDEXES[self.index].add(self.storage.values())
+        return _META_INDEXES[self.index]
+
+    @property
+    def _lexical(self):
+        self._ensure_bm25_stats()
+        key = json.dumps([self.bm25_algorithm, self.bm25_parameters], sort_keys=True)
+        indexes = _LEXICAL_INDEXES.setdefault(self.index, {})
+        if key not in indexes:
+            indexes[key] = BM25Index(algorithm=self.bm25_algorithm, parameters=self.bm25_parameters)
+            for doc_id, stats in self._bm25_attr.items():
+                indexes[key].add(doc_id, stats.freq_token, stats.doc_len)
+        return indexes[key]
+
+    @property
+    def version(self):
+        return _STORE_VERSIONS.get(self.index, 0)
+
+    def _bump_version(self):
+        _STORE_VERSIONS[self.index] = self.version + 1
+
+    def to_dict(self):
+        data = super().to_dict()
+        data["init_parameters"]["ann_index"] = self.ann_index
+        data["init_parameters"]["ann_parameters"] = self.ann_parameters
+        data["init_parameters"]["vector_compression"] = self.vector_compression
+        data["init_parameters"]["compression_parameters"] = self.compression_parameters
+        return data
+
+    @staticmethod
+    def _embedded(documents):
+        documents = [doc for doc in documents if doc.embedding is not None]
+        return [doc.id for doc in documents], [doc.embedding for doc in documents]
+
+    def _ensure_bm25_stats(self):
+        if self.index not in _PENDING_BM25_INDEXES:
+            return
+        _PENDING_BM25_INDEXES.discard(self.index)
+        documents = list(self.storage.values())
+        self.storage.clear()
+        # Re-run the base class indexing so the statistics are exactly the ones a regular write produces
+        InMemoryDocumentStore.write_documents(self, documents)
+
+    def write_documents(self, documents, policy=DuplicatePolicy.NONE):
+        if self.vector_compression and any(doc.embedding is not None for doc in documents):
+            raise ValueError(
+                "A store with vector_compression only keeps embeddings as compressed views. Write the documents "
+                "without an embedding and their embeddings with write_embedding_views (see MultiViewDocumentWriter)."
+            )
+        self._ensure_bm25_stats()
+        # Anything else is rejected by the base class before a document is stored
+        candidates = [doc for doc in documents if isinstance(doc, Document)] if isinstance(documents, Iterable) else []
+        # A document object that is already stored is only written again (and reindexed) by an overwrite
+        unchanged = set()
+        if policy != DuplicatePolicy.OVERWRITE:
+            unchanged = {doc.id for doc in candidates if self.storage.get(doc.id) is doc}
+        # With DuplicatePolicy.OVERWRITE the base class deletes the old version through delete_documents,
+        # which must not take the document's embedding views with it
+        self._overwriting = True
+        try:
+            return super().write_documents(documents, policy=policy)
+        finally:
+            self._overwriting = False
+            # Also runs after a DuplicateDocumentError, raised once the documents before the duplicate are stored.
+            # Only the documents that actually ended up in the storage (not skipped duplicates) are indexed
+            self._index_stored(
+                [doc for doc in candidates if doc.id not in unchanged and self.storage.get(doc.id) is doc]
+            )
+
+    def _index_stored(self, stored):
+        if not stored:
+            return
+        if self.index in _META_INDEXES:
+            _META_INDEXES[self.index].add(stored)
+        for lexical in _LEXICAL_INDEXES.get(self.index, {}).values():
+            for doc in stored:
+                stats = self._bm25_attr[doc.id]
+                lexical.add(doc.id, stats.freq_token, stats.doc_len)
+        if self._ann is not None:
+            self._ann.add(*self._embedded(stored))
+        self._bump_version()
+
+    def delete_documents(self, document_ids):
+        self._ensure_bm25_stats()
+        super().delete_documents(document_ids)
+        if self.index in _META_INDEXES:
+            _META_INDEXES[self.index].remove(document_ids)
+        for lexical in _LEXICAL_INDEXES.get(self.index, {}).values():
+            for doc_id in document_ids:
+                lexical.remove(doc_id)
+        if self._ann is not None:
+            self._ann.remove(document_ids)
+        if self._views is not None and not self._overwriting:
+            self._views.remove(document_ids)
+        self._bump_version()
+
+    def _stored_documents(self, filters=None):
+        if filters:
+            if "operator" not in filters and "conditions" not in filters:
+                filters = convert(filters)
+            doc_ids = self._meta.plan(filters, self.storage)
+            if doc_ids is not None:
+                return [self.storage[doc_id] for doc_id in self._meta.ordered(doc_ids)]
+        return super().filter_documents(filters=filters)
+
+    def filter_documents(self, filters=None):
+        # Documents restored from a snapshot keep a row of the memory-mapped matrix, callers get a copy with a list
+        return [
+            replace(doc, embedding=doc.embedding.tolist()) if isinstance(doc.embedding, np.ndarray) else doc
+            for doc in self._stored_documents(filters)
+        ]
+
+    def save_to_disk(self, path):
+        data = self.to_dict()
+        data["documents"] = [doc.to_dict(flatten=False) for doc in self.filter_documents()]
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+    def _lexical_search(self, query, top_k, allowed_ids=None):
+        return self._lexical.search(
+            self._tokenize_bm25(query),
+            top_k,
+            n_docs=len(self._bm25_attr),
+            avg_doc_len=self._avg_doc_len,
+            document_frequencies=self._freq_vocab_for_idf,
+            allowed_ids=allowed_ids,
+        )
+
+    def bm25_retrieval(self, query, filters=None, top_k=10, scale_score=False):
+        if not query:
+            raise ValueError("Query should be a non-empty string")
+        self._ensure_bm25_stats()
+
+        allowed_ids = None
+        if filters:
+            if "operator" not in filters:
+                filters = convert(filters)
+            content_filters = {"operator": "AND", "conditions": [CONTENT_TYPE_FILTER, filters]}
+            documents = self._stored_documents(filters=content_filters)
+            if not documents:
+                return []
+            allowed_ids = {doc.id for doc in documents}
+        else:
+            documents = (doc for doc in self.storage.values() if doc.content is not None or doc.dataframe is not None)
+
+        results = self._lexical_search(query, top_k, allowed_ids)
+        if results is None:
+            return super().bm25_retrieval(query=query, filters=filters, top_k=top_k, scale_score=scale_score)
+
+        results = [(self.storage[doc_id], score) for doc_id, score in results]
+        if len(results) < top_k:
+            # Documents without any query token all get the same base score and follow in storage order
+            matched = {doc.id for doc, _ in results}
+            lexical = self._lexical
+            idf = lexical.idf(self._tokenize_bm25(query), len(self._bm25_attr), self._freq_vocab_for_idf)
+            for doc in documents:
+                if len(results) >= top_k:
+                    break
+                if doc.id not in matched:
+                    stats = self._bm25_attr[doc.id]
+                    results.append((doc, lexical.score(idf, stats.freq_token, stats.doc_len, self._avg_doc_len)))
+
+        # Same scaling and filtering of the scores as InMemoryDocumentStore.bm25_retrieval
+        negatives_are_valid = self.bm25_algorithm == "BM25Okapi" and not scale_score
+        return_documents = []
+        for doc, score in results:
+            if scale_score:
+                score = expit(score / BM25_SCALING_FACTOR)
+            if not negatives_are_valid and score <= 0.0:
+                continue
+            return_documents.append(self._result_document(doc.id, score, return_embedding=True))
+        return return_documents
+
+    def _scale_similarity(self, score):
+        if self.embedding_similarity_function == "dot_product":
+            return expit(float(score / DOT_PRODUCT_SCALING_FACTOR))
+        return (score + 1) / 2
+
+    def _result_document(self, doc_id, score, return_embedding=False, embedding=None):
+        doc_fields = self.storage[doc_id].to_dict()
+        doc_fields["score"] = score
+        if embedding is not None:
+            doc_fields["embedding"] = embedding
+        if return_embedding is False:
+            doc_fields["embedding"] = None
+        elif isinstance(doc_fields["embedding"], np.ndarray):
+            doc_fields["embedding"] = doc_fields["embedding"].tolist()
+        return Document.from_dict(doc_fields)
+
+    def _use_exact_search(self, candidates):
+        return self._ann is None or candidates < self.ann_parameters["exact_search_threshold"]
+
+    def embedding_retrieval(self, query_embedding, filters=None, top_k=10, scale_score=False, return_embedding=False):
+        allowed_ids = None
+        candidates = len(self._ann) if self._ann is not None else 0
+        if filters:
+            allowed_ids = {doc.id for doc in self._stored_documents(filters=filters)}
+            candidates = len(allowed_ids)
+
+        if len(query_embedding) == 0 or not isinstance(query_embedding[0], float):
+            raise ValueError("query_embedding should be a non-empty list of floats.")
+
+        if self._use_exact_search(candidates):
+            # Scored from one float32 matrix (the memory map itself for a restored store), never from the documents
+            hits = self._exact_search_batch([query_embedding], top_k, allowed_ids)[0]
+        else:
+            hits = self._ann.search(query_embedding, top_k=top_k, allowed_ids=allowed_ids)
+        return [
+            self._result_document(doc_id, self._scale_similarity(score) if scale_score else score, return_embedding)
+            for doc_id, score in hits
+        ]
+
+    def _cache_exact_matrix(self, ids, matrix):
+        # Cosine scores are divided by the row norms instead of normalizing a copy of the matrix
+        norms = None
+        if self.embedding_similarity_function == "cosine":
+            norms = np.linalg.norm(matrix, axis=1)
+            norms[norms == 0] = 1.0
+        _EXACT_MATRICES[self.index] = (self.version, ids, matrix, norms)
+
+    def _exact_matrix(self):
+        cached = _EXACT_MATRICES.get(self.index)
+        if cached is None or cached[0] != self.version:
+            ids, embeddings = self._embedded(self.storage.values())
+            self._cache_exact_matrix(ids, np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+            cached = _EXACT_MATRICES[self.index]
+        return cached[1:]
+
+    def _exact_search_batch(self, query_embeddings, top_k, allowed_ids):
+        ids, matrix, norms = self._exact_matrix()
+        if not ids:
+            logger.warning(
+                "No Documents found with embeddings. Returning empty list. "
+                "To generate embeddings, use a DocumentEmbedder."
+            )
+            return [[] for _ in query_embeddings]
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if self.embedding_similarity_function == "cosine":
+            queries = normalize_rows(queries)
+        columns = np.arange(len(ids))
+        if allowed_ids is not None:
+            columns = np.array([column for column, doc_id in enumerate(ids) if doc_id in allowed_ids], dtype=np.int64)
+            if len(columns) == 0:
+                return [[] for _ in query_embeddings]
+            matrix = matrix[columns]
+        scores = queries @ matrix.T
+        if norms is not None:
+            scores /= norms[columns]
+        return [
+            [(ids[columns[i]], float(query_scores[i])) for i in top_k_indices(query_scores, top_k)]
+            for query_scores in scores
+        ]
+
+    def batch_embedding_retrieval(
+        self, query_embeddings, filters=None, top_k=10, scale_score=False, return_embedding=False
+    ):
+        if len(query_embeddings) == 0:
+            return []
+        if any(len(query) == 0 or not isinstance(query[0], float) for query in query_embeddings):
+            raise ValueError("query_embeddings should be non-empty lists of floats.")
+        allowed_ids = None
+        candidates = len(self._ann) if self._ann is not None else 0
+        if filters:
+            allowed_ids = {doc.id for doc in self._stored_documents(filters=filters)}
+            candidates = len(allowed_ids)
+
+        if self._use_exact_search(candidates):
+            hits = self._exact_search_batch(query_embeddings, top_k, allowed_ids)
+        else:
+            hits = self._ann.search_batch(query_embeddings, top_k=top_k, allowed_ids=allowed_ids)
+        return [
+            [
+                self._result_document(doc_id, self._scale_similarity(score) if scale_score else score, return_embedding)
+                for doc_id, score in query_hits
+            ]
+            for query_hits in hits
+        ]
+
+    def _lexical_candidates(self, query, documents, candidate_k, filtered):
+        # Documents that share no token with the query are not lexical matches, however the BM25 variant scores them
+        results = self._lexical_search(query, candidate_k, {doc.id for doc in documents} if filtered else None)
+        if results is not None:
+            return results
+        query_tokens = set(self._tokenize_bm25(query))
+        matching = [doc for doc in documents if query_tokens & self._bm25_attr[doc.id].freq_token.keys()]
+        scored = self.bm25_algorithm_inst(query, matching)
+        return heapq.nlargest(candidate_k, ((doc.id, score) for doc, score in scored), key=lambda x: x[1])
+
+    def _dense_candidates(self, query_embedding, documents, candidate_k, filtered):
+        documents = [doc for doc in documents if doc.embedding is not None]
+        if not documents:
+            return []
+        if not self._use_exact_search(len(documents)):
+            allowed_ids = {doc.id for doc in documents} if filtered else None
+            return self._ann.search(query_embedding, top_k=candidate_k, allowed_ids=allowed_ids)
+        scores = self._compute_query_embedding_similarity_scores(embedding=query_embedding, documents=documents)
+        return heapq.nlargest(candidate_k, zip((doc.id for doc in documents), scores), key=lambda x: x[1])
+
+    def hybrid_retrieval(
+        self,
+        query,
+        query_embedding,
+        filters=None,
+        top_k=10,
+        fusion="reciprocal_rank_fusion",
+        dense_weight=0.5,
+        rrf_k=60,
+        candidate_k=None,
+        return_embedding=False,
+    ):
+        if not query:
+            raise ValueError("Query should be a non-empty string")
+        if len(query_embedding) == 0 or not isinstance(query_embedding[0], float):
+            raise ValueError("query_embedding should be a non-empty list of floats.")
+        if fusion not in FUSION_METHODS:
+            raise ValueError(f"Fusion method '{fusion}' is not supported.")
+        self._ensure_bm25_stats()
+
+        # Filters are evaluated once and shared by both scorers
+        documents = self._stored_documents(filters=filters)
+        candidate_k = candidate_k or max(4 * top_k, 50)
+        lexical = self._lexical_candidates(query, documents, candidate_k, filtered=bool(filters))
+        dense = self._dense_candidates(query_embedding, documents, candidate_k, filtered=bool(filters))
+
+        if fusion == "reciprocal_rank_fusion":
+            fused = reciprocal_rank_fusion([dense, lexical], k=rrf_k)
+        else:
+            fused = weighted_fusion(dense, lexical, dense_weight)
+
+        return [
+            self._result_document(doc_id, score, return_embedding)
+            for doc_id, score in sorted(fused.items(), key=lambda x: x[1], reverse=True)[:top_k]
+        ]
+
+    def _new_view_index(self):
+        return MultiViewIndex(
+            similarity=self.embedding_similarity_function,
+            compression=self.vector_compression,
+            **self.compression_parameters,
+        )
+
+    def write_embedding_views(self, document_ids, views):
+        if self._views is None:
+            _VIEW_INDEXES[self.index] = self._new_view_index()
+        self._views.add(list(document_ids), views)
+        self._bump_version()
+
+    def multi_view_retrieval(
+        self, query_embedding, views=None, filters=None, top_k=10, scale_score=False, return_embedding=False
+    ):
+        if len(query_embedding) == 0 or not isinstance(query_embedding[0], float):
+            raise ValueError("query_embedding should be a non-empty list of floats.")
+        if self._views is None:
+            logger.warning("No embedding views found. Returning empty results. Use MultiViewDocumentWriter to add them.")
+            return {view: [] for view in views or []}
+
+        allowed_ids = {doc.id for doc in self._stored_documents(filters=filters)} if filters else None
+        results = self._views.search(query_embedding, views=views, top_k=top_k, allowed_ids=allowed_ids)
+        return {
+            view: [
+                self._result_document(
+                    doc_id,
+                    self._scale_similarity(score) if scale_score else score,
+                    return_embedding,
+                    embedding=self._views.vector(doc_id, view) if return_embedding else None,
+                )
+                for doc_id, score in hits
+            ]
+            for view, hits in results.items()
+        }
+
+    def save_snapshot(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Written to a sibling directory and swapped in when complete: a crash leaves the previous snapshot intact,
+        # and workers that memory-mapped it keep reading their (unlinked) files instead of truncated ones
+        staging = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+        retired = path.with_name(f".{path.name}.old-{os.getpid()}")
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir()
+        try:
+            self._write_snapshot(staging)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        if path.exists():
+            shutil.rmtree(retired, ignore_errors=True)
+            os.replace(path, retired)
+        os.replace(staging, path)
+        shutil.rmtree(retired, ignore_errors=True)
+
+    def _write_snapshot(self, path):
+        documents = list(self.storage.values())
+        embedded = [doc for doc in documents if doc.embedding is not None]
+        rows = {doc.id: row for row, doc in enumerate(embedded)}
+        dim = len(embedded[0].embedding) if embedded else 0
+
+        matrix = np.lib.format.open_memmap(
+            path / "embeddings.npy", mode="w+", dtype=np.float32, shape=(len(embedded), dim)
+        )
+        for row, doc in enumerate(embedded):
+            matrix[row] = doc.embedding
+        matrix.flush()
+        del matrix
+
+        table = pa.table({
+            "id": [doc.id for doc in documents],
+            "content": [doc.content for doc in documents],
+            "meta": [json.dumps(doc.meta, default=_encode_json) for doc in documents],
+            "extra": [_extra_fields(doc) for doc in documents],
+            "embedding_row": [rows.get(doc.id, -1) for doc in documents],
+        })
+        with pa.OSFile(str(path / "documents.arrow"), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+        if self._ann is not None:
+            self._save_ann_snapshot(path, embedded)
+
+        config = {"format_version": SNAPSHOT_FORMAT_VERSION, "store": self.to_dict()}
+        if self._views is not None and len(self._views):
+            config["views"] = self._save_views_snapshot(path)
+        (path / "store.json").write_text(json.dumps(config, indent=2))
+
+    def _save_views_snapshot(self, path):
+        views = self._views
+        view_ids = [doc_id for doc_id in views.ids if doc_id is not None]
+        rows = [views.rows[doc_id] for doc_id in view_ids]
+        np.save(path / "views.npy", views.matrix[rows])
+        config = {"names": views.view_names, "ids": view_ids, "compressed": views.compressed}
+        if views.compressed:
+            np.savez(path / "views_codec.npz", **views.codec.state())
+            config["originals"] = views.originals is not None
+            if views.originals is not None:
+                np.save(path / "views_originals.npy", views.originals[rows])
+        return config
+
+    def _save_ann_snapshot(self, path, embedded):
+        ann = self._ann
+        ann_rows = np.array([ann.rows[doc.id] for doc in embedded], dtype=np.int64)
+        arrays = {"assignments": ann.assignments[ann_rows] if len(ann_rows) else np.empty(0, dtype=np.int64)}
+        if ann.is_trained:
+            arrays["centroids"] = ann.centroids
+        np.savez(path / "ann.npz", **arrays)
+        # Cosine search uses normalized vectors, which differ from the raw embeddings and are stored separately
+        if ann.similarity == "cosine":
+            vectors = ann.vectors[ann_rows] if len(ann_rows) else np.empty((0, 0), dtype=np.float32)
+            np.save(path / "ann_vectors.npy", vectors)
+
+    @classmethod
+    def load_snapshot(cls, path, index=None):
+        path = Path(path)
+        config = json.loads((path / "store.json").read_text())
+        if config["format_version"] != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format version {config['format_version']}.")
+        init_parameters = {**config["store"]["init_parameters"], "index": index}
+
+        # The ANN index is restored from the snapshot below instead of being rebuilt from the documents
+        ann_index = init_parameters.pop("ann_index")
+        document_store = cls(**init_parameters)
+        if document_store.storage:
+            # Its documents and BM25 statistics would be mixed with the snapshot's
+            raise ValueError(f"Index '{index}' already holds documents, load the snapshot into a new index.")
+        document_store.ann_index = ann_index
+
+        # A plain ndarray view keeps the memory-mapped buffer but makes row access cheaper than np.memmap
+        matrix = np.load(path / "embeddings.npy", mmap_mode="r").view(np.ndarray)
+        table = pa.ipc.open_file(pa.memory_map(str(path / "documents.arrow"), "r")).read_all()
+        columns = table.to_pydict()
+
+        storage = document_store.storage
+        embedded_ids = []
+        for doc_id, content, meta, extra, row in zip(
+            columns["id"], columns["content"], columns["meta"], columns["extra"], columns["embedding_row"]
+        ):
+            meta = json.loads(meta, object_hook=_decode_json)
+            if extra == "{}":
+                doc = Document(id=doc_id, content=content, meta=meta)
+            else:
+                doc = Document.from_dict({**json.loads(extra), "id": doc_id, "content": content, "meta": {}})
+                doc.meta = meta
+            if row >= 0:
+                # A row view into the memory map: no copy, pages are shared between processes
+                doc.embedding = matrix[row]
+                embedded_ids.append(doc_id)
+            storage[doc_id] = doc
+        _PENDING_BM25_INDEXES.add(document_store.index)
+        _META_INDEXES.pop(document_store.index, None)
+        _LEXICAL_INDEXES.pop(document_store.index, None)
+        document_store._bump_version()
+        # Exact search scores the memory map until the next write rebuilds the matrix from the documents
+        document_store._cache_exact_matrix(embedded_ids, matrix)
+
+        if ann_index:
+            document_store._restore_ann_snapshot(path, embedded_ids, matrix)
+        _VIEW_INDEXES.pop(document_store.index, None)
+        if "views" in config:
+            views = document_store._new_view_index()
+            _VIEW_INDEXES[document_store.index] = views
+            views_config = config["views"]
+            codec_state = originals = None
+            if views_config.get("compressed"):
+                codec_state = dict(np.load(path / "views_codec.npz"))
+                if views_config["originals"]:
+                    originals = np.load(path / "views_originals.npy", mmap_mode="r").view(np.ndarray)
+            views.restore(
+                views_config["ids"],
+                views_config["names"],
+                np.load(path / "views.npy", mmap_mode="r").view(np.ndarray),
+                originals=originals,
+                codec_state=codec_state,
+            )
+        return document_store
+
+    def _restore_ann_snapshot(self, path, embedded_ids, matrix):
+        _ANN_INDEXES[self.index] = ann = IVFIndex(
+            similarity=self.embedding_similarity_function,
+            nlist=self.ann_parameters["nlist"],
+            nprobe=self.ann_parameters["nprobe"],
+            min_train_size=self.ann_parameters["exact_search_threshold"],
+        )
+        arrays = np.load(path / "ann.npz")
+        vectors = matrix
+        if ann.similarity == "cosine":
+            vectors = np.load(path / "ann_vectors.npy", mmap_mode="r").view(np.ndarray)
+        centroids = arrays["centroids"] if "centroids" in arrays.files else None
+        ann.restore(embedded_ids, vectors, centroids=centroids, assignments=np.array(arrays["assignments"]))
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    fused = {}
+    for ranking in rankings:
+        for rank, (doc_id, _) in enumerate(ranking):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return fused
+
+
+def _min_max(ranking):
+    if not ranking:
+        return {}
+    scores = [score for _, score in ranking]
+    low, high = min(scores), max(scores)
+    return {doc_id: (score - low) / (high - low) if high > low else 1.0 for doc_id, score in ranking}
+
+
+def weighted_fusion(dense, lexical, dense_weight=0.5):
+    dense, lexical = _min_max(dense), _min_max(lexical)
+    return {
+        doc_id: dense_weight * dense.get(doc_id, 0.0) + (1 - dense_weight) * lexical.get(doc_id, 0.0)
+        for doc_id in dense.keys() | lexical.keys()
+    }
+
+
+FUSION_METHODS = ("reciprocal_rank_fusion", "weighted")
+
+
+def _encode_json(value):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode_json(value):
+    if "__datetime__" in value:
+        return datetime.fromisoformat(value["__datetime__"])
+    if "__date__" in value:
+        return date.fromisoformat(value["__date__"])
+    return value
+
+
+def _extra_fields(document):
+    fields = document.to_dict(flatten=False)
+    for key in ("id", "content", "meta", "embedding", "score"):
+        fields.pop(key, None)
+    return json.dumps({key: value for key, value in fields.items() if value is not None})
+
+
+def recall_latency_report(document_store, query_embeddings, top_k=10, nprobe_values=(1, 2, 4, 8, 16, 32)):
+    exact_results = []
+    exact_latencies = []
+    for query in query_embeddings:
+        start = time.perf_counter()
+        docs = InMemoryDocumentStore.embedding_retrieval(document_store, query_embedding=query, top_k=top_k)
+        exact_latencies.append((time.perf_counter() - start) * 1000)
+        exact_results.append({doc.id for doc in docs})
+
+    report = [{
+        "method": "exact",
+        "nprobe": None,
+        "recall": 1.0,
+        "p50_ms": percentile(exact_latencies, 50),
+        "p99_ms": percentile(exact_latencies, 99),
+    }]
+
+    ann = document_store._ann
+    for nprobe in nprobe_values:
+        latencies = []
+        recalls = []
+        for query, expected in zip(query_embeddings, exact_results):
+            start = time.perf_counter()
+            hits = ann.search(query, top_k=top_k, nprobe=nprobe)
+            latencies.append((time.perf_counter() - start) * 1000)
+            recalls.append(len(expected & {doc_id for doc_id, _ in hits}) / max(len(expected), 1))
+        report.append({
+            "method": "ivf",
+            "nprobe": nprobe,
+            "recall": float(np.mean(recalls)),
+            "p50_ms": percentile(latencies, 50),
+            "p99_ms": percentile(latencies, 99),
+        })
+    return report
+
+
+def compression_report(
+    vectors,
+    query_embeddings,
+    top_k=10,
+    similarity="cosine",
+    compressions=COMPRESSIONS,
+    rescore_values=(0, 4),
+    **parameters,
+):
+    ids = [str(i) for i in range(len(vectors))]
+    baseline = MultiViewIndex(similarity=similarity)
+    baseline.add(ids, {"embedding": vectors})
+    exact_results = [
+        {doc_id for doc_id, _ in baseline.search(query, top_k=top_k)["embedding"]} for query in query_embeddings
+    ]
+    float32_bytes = baseline.matrix[: len(ids)].nbytes / len(ids)
+
+    def measure(index, rescore):
+        latencies, recalls = [], []
+        for query, expected in zip(query_embeddings, exact_results):
+            start = time.perf_counter()
+            hits = index.search(query, top_k=top_k, rescore=rescore)["embedding"]
+            latencies.append((time.perf_counter() - start) * 1000)
+            recalls.append(len(expected & {doc_id for doc_id, _ in hits}) / max(len(expected), 1))
+        # Rescoring reads the float32 vectors, which can stay on disk, so only the codes count as index memory
+        code_bytes = index.matrix[: len(ids)].nbytes / len(ids)
+        return {
+            "method": index.codec.name if index.codec else "float32",
+            "rescore": rescore,
+            "recall": float(np.mean(recalls)),
+            "p50_ms": percentile(latencies, 50),
+            "p99_ms": percentile(latencies, 99),
+            "bytes_per_vector": code_bytes,
+            "ratio": float32_bytes / code_bytes,
+        }
+
+    report = [measure(baseline, 0)]
+    for compression in compressions:
+        index = MultiViewIndex(
+            similarity=similarity,
+            compression=compression,
+            rescore=max(rescore_values),
+            train_size=min(len(ids), parameters.get("train_size", DEFAULT_COMPRESSION_PARAMETERS["train_size"])),
+            pq_subvectors=parameters.get("pq_subvectors"),
+        )
+        index.add(ids, {"embedding": vectors})
+        report.extend(measure(index, rescore) for rescore in rescore_values)
+    return report
+
+
+def print_compression_report(report):
+    print(f"{'method':<10}{'rescore':>8}{'recall@k':>10}{'p50 ms':>10}{'p99 ms':>10}{'bytes':>8}{'ratio':>8}")
+    for row in report:
+        print(
+            f"{row['method']:<10}{row['rescore'] or '-':>8}{row['recall']:>10.3f}{row['p50_ms']:>10.2f}"
+            f"{row['p99_ms']:>10.2f}{row['bytes_per_vector']:>8.0f}{row['ratio']:>7.1f}x"
+        )
+
+
+def print_report(report):
+    print(f"{'method':<8}{'nprobe':>8}{'recall@k':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for row in report:
+        nprobe = "-" if row["nprobe"] is None else row["nprobe"]
+        print(f"{row['method']:<8}{nprobe:>8}{row['recall']:>10.3f}{row['p50_ms']:>10.2f}{row['p99_ms']:>10.2f}")
+
+
+def create_synthetic_documents(count, dim=384, clusters=64, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    embeddings = centers[rng.integers(clusters, size=count)] + 0.5 * rng.normal(size=(count, dim))
+    return [Document(content=f"document {i}", embedding=embedding.tolist()) for i, embedding in enumerate(embeddings)]
+
+
+def main():
+    documents = create_synthetic_documents(50_020)
+    document_store = IndexedInMemoryDocumentStore(embedding_similarity_function="cosine", ann_index="ivf")
+    document_store.write_documents(documents[:50_000])
+
+    # Held-out documents from the same distribution serve as queries
+    queries = [doc.embedding for doc in documents[50_000:]]
+    print_report(recall_latency_report(document_store, queries))
+    print()
+    vectors = np.array([doc.embedding for doc in documents[:50_000]], dtype=np.float32)
+    print_compression_report(compression_report(vectors, queries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+'''
+Fast cold start for YAML pipelines.
+lazy_pipeline.loads builds a Pipeline whose components are LazyComponent placeholders: they have the input and output
+sockets of the real components, so the graph and all connections are in place, but the component's module is only
+imported, and the component built and warmed up, the first time the pipeline runs it.
+A component that is never executed (e.g. a branch that isn't taken) never loads its model.
+
+Finding the sockets needs the real components, so the first load of a YAML definition is a normal Pipeline.from_dict,
+which also validates every connection. The sockets are then cached next to the parsed definition, in memory and
+on disk in `cache_dir` keyed by the hash of the YAML, and every later load (also in a new process) skips the imports.
+
+    pipeline = loads(Path("pipeline.yml").read_text())  # fast, no model imported or loaded
+    pipeline.run({"builder": {"sentence": "..."}})      # imports, builds and warms up the components on first use
+'''
+
+import hashlib
+import json
+import logging
+import threading
+from copy import deepcopy
+from importlib.metadata import version
+from pathlib import Path
+from typing import Any
+
+from haystack import Pipeline, component
+from haystack.core.component.types import Variadic
+from haystack.core.serialization import component_from_dict, import_class_by_name
+from haystack.marshal import YamlMarshaller
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = ".pipeline_cache"
+
+_DEFINITIONS = {}
+
+
+class _Default:
+    def __repr__(self):
+        return "<default>"
+
+
+# The pipeline passes this for optional inputs that got no value, so the real component falls back to its own default
+DEFAULT = _Default()
+
+
+@component
+class LazyComponent:
+    def __init__(self, name, data, sockets):
+        self.name = name
+        self.data = data
+        self.sockets = sockets
+        self._component = None
+        self._lock = threading.Lock()
+        for socket in sockets["inputs"]:
+            socket_type = Variadic[Any] if socket["variadic"] else Any
+            component.set_input_type(self, socket["name"], socket_type, *([] if socket["mandatory"] else [DEFAULT]))
+        component.set_output_types(self, **{name: Any for name in sockets["outputs"]})
+        self.__haystack_is_greedy__ = sockets["greedy"]
+
+    @property
+    def loaded(self):
+        return self._component is not None
+
+    @property
+    def component(self):
+        with self._lock:
+            if self._component is None:
+                logger.info("Loading component %s (%s)", self.name, self.data["type"])
+                # from_dict methods may replace init parameters in place, e.g. a document store dict by the store
+                data = deepcopy(self.data)
+                instance = component_from_dict(import_class_by_name(data["type"]), data, self.name)
+                if hasattr(instance, "warm_up"):
+                    instance.warm_up()
+                self._component = instance
+        return self._component
+
+    def warm_up(self):
+        # Pipeline.run warms up every component before running any of them, the real warm up waits for the first run
+        pass
+
+    def to_dict(self):
+        return deepcopy(self.data)
+
+    def run(self, **kwargs):
+        return self.component.run(**{name: value for name, value in kwargs.items() if value is not DEFAULT})
+
+
+def _sockets(instance):
+    inputs = [
+        {"name": socket.name, "mandatory": socket.is_mandatory, "variadic": socket.is_variadic}
+        for socket in instance.__haystack_input__._sockets_dict.values()
+    ]
+    return {
+        "inputs": inputs,
+        "outputs": list(instance.__haystack_output__._sockets_dict),
+        "greedy": getattr(instance, "__haystack_is_greedy__", False),
+    }
+
+
+def definition_key(yaml_pipeline):
+    # Another haystack version may have changed the sockets of a component
+    return hashlib.sha256(f"{version('haystack-ai')}\n{yaml_pipeline}".encode()).hexdigest()
+
+
+def validated_definition(yaml_pipeline, cache_dir=DEFAULT_CACHE_DIR):
+    key = definition_key(yaml_pipeline)
+    if key in _DEFINITIONS:
+        return _DEFINITIONS[key]
+
+    path = Path(cache_dir) / f"{key}.json" if cache_dir else None
+    if path is not None and path.exists():
+        definition = json.loads(path.read_text())
+    else:
+        data = YamlMarshaller().unmarshal(yaml_pipeline)
+        # Builds every component once, which validates the definition and all connections
+        pipeline = Pipeline.from_dict(data)
+        sockets = {name: _sockets(instance) for name, instance in pipeline.walk()}
+        definition = {"pipeline": data, "sockets": sockets}
+        if path is not None:
+            _save_definition(definition, path)
+    _DEFINITIONS[key] = definition
+    return definition
+
+
+def _save_definition(definition, path):
+    try:
+        text = json.dumps(definition)
+    except TypeError:
+        text = None
+    if text is None or json.loads(text) != definition:
+        # Init parameters that JSON can't represent (or not as the same type), the definition is only cached in memory
+        logger.warning("Pipeline definition can't be cached in %s", path.parent)
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(text)
+    tmp_path.replace(path)
+
+
+def loads(yaml_pipeline, cache_dir=DEFAULT_CACHE_DIR):
+    definition = validated_definition(yaml_pipeline, cache_dir)
+    data = definition["pipeline"]
+    pipeline = Pipeline(
+        metadata=data.get("metadata", {}),
+        max_loops_allowed=data.get("max_loops_allowed", 100),
+        debug_path=Path(data.get("debug_path", ".haystack_debug/")),
+    )
+    for name, component_data in data.get("components", {}).items():
+        pipeline.add_component(name, LazyComponent(name, component_data, definition["sockets"][name]))
+    for connection in data.get("connections", []):
+        pipeline.connect(connection["sender"], connection["receiver"])
+    return pipeline
+
+
+def load(path, cache_dir=DEFAULT_CACHE_DIR):
+    return loads(Path(path).read_text(), cache_dir)
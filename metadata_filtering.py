@@ -7,9 +7,9 @@ Metadata filtering is very useful in these situations.
 
 from datetime import datetime
 from haystack import Document, Pipeline
-from haystack.document_stores.in_memory import InMemoryDocumentStore
 from haystack.components.retrievers.in_memory import InMemoryBM25Retriever
 from haystack.telemetry import tutorial_running
+from indexed_document_store import IndexedInMemoryDocumentStore
 
 def enable_telemetry():
     tutorial_running(31)
@@ -31,7 +31,8 @@ def create_documents():
     ]
 
 def initialize_document_store(documents):
-    document_store = InMemoryDocumentStore(bm25_algorithm="BM25Plus")
+    # Filters on meta.version and meta.date are answered from sorted metadata indexes instead of a full scan
+    document_store = IndexedInMemoryDocumentStore(bm25_algorithm="BM25Plus")
     document_store.write_documents(documents=documents)
     return document_store
 
@@ -0,0 +1,273 @@
+'''
+Secondary indexes over document metadata, so filtered queries don't have to walk every document's meta dict.
+Every top-level meta field gets a hash index (value -> document ids) for ==, !=, in and not in,
+and a sorted index for >, >=, < and <= that is built on first use when all values of the field are comparable
+(numbers, datetimes, or ISO formatted date strings).
+
+MetadataIndex.plan turns a filter tree into index lookups and set intersections. Conditions it can't answer from
+the indexes (nested fields, unhashable values, mixed types...) are only evaluated on the remaining candidates,
+or the whole filter falls back to a scan, so the same documents are returned as with document_matches_filter.
+Malformed filters always fall back to the scan, which raises the same FilterError as InMemoryDocumentStore.
+'''
+
+from bisect import bisect_right
+from collections import Counter
+from dataclasses import fields
+from datetime import datetime
+
+from haystack import Document
+from haystack.utils.filters import document_matches_filter
+
+DOCUMENT_FIELDS = {field.name for field in fields(Document)}
+RANGE_OPERATORS = (">", ">=", "<", "<=")
+
+
+def _hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    # NaN is not equal to itself, so it can't be looked up by hash
+    return not (isinstance(value, float) and value != value)
+
+
+def _parse_iso(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _sort_key(value):
+    if isinstance(value, (bool, int, float)):
+        return ("number", value) if value == value else None
+    if isinstance(value, datetime):
+        return ("aware" if value.tzinfo is not None else "naive", value)
+    if isinstance(value, str):
+        # document_matches_filter compares strings as ISO dates
+        parsed = _parse_iso(value)
+        if parsed is not None:
+            return ("aware_iso" if parsed.tzinfo is not None else "naive_iso", parsed)
+    return None
+
+
+def _well_formed(filters):
+    # Malformed filters are left to a scan, where document_matches_filter raises a FilterError for them
+    if not isinstance(filters, dict):
+        return False
+    if "field" in filters:
+        if not isinstance(filters["field"], str) or "operator" not in filters or "value" not in filters:
+            return False
+        operator, value = filters["operator"], filters["value"]
+        if operator in ("in", "not in"):
+            return isinstance(value, list)
+        if operator in RANGE_OPERATORS:
+            # Only numbers, datetimes and ISO formatted date strings can be compared
+            return value is None or _sort_key(value) is not None
+        return operator in ("==", "!=")
+    conditions = filters.get("conditions")
+    return (
+        filters.get("operator") in ("AND", "OR", "NOT")
+        and isinstance(conditions, list)
+        and all(_well_formed(condition) for condition in conditions)
+    )
+
+
+def meta_field(field):
+    if field.startswith("meta."):
+        field = field[len("meta."):]
+        return field if "." not in field else None
+    # Like document_matches_filter, fields without the "meta." prefix that aren't Document fields are legacy meta fields
+    return field if "." not in field and field not in DOCUMENT_FIELDS else None
+
+
+class FieldIndex:
+    def __init__(self):
+        self.values = {}
+        self.equal = {}
+        self.kinds = Counter()
+        self.unhashable = 0
+        self._sorted = None
+
+    def add(self, doc_id, value):
+        self.values[doc_id] = value
+        key = _sort_key(value)
+        self.kinds[key[0] if key else None] += 1
+        if _hashable(value):
+            self.equal.setdefault(value, set()).add(doc_id)
+        else:
+            self.unhashable += 1
+        self._sorted = None
+
+    def remove(self, doc_id):
+        value = self.values.pop(doc_id)
+        key = _sort_key(value)
+        self.kinds[key[0] if key else None] -= 1
+        if _hashable(value):
+            self.equal[value].discard(doc_id)
+            if not self.equal[value]:
+                del self.equal[value]
+        else:
+            self.unhashable -= 1
+        self._sorted = None
+
+    def equal_ids(self, value):
+        if self.unhashable or not _hashable(value):
+            return None
+        return self.equal.get(value, set())
+
+    def _kind(self):
+        kinds = [kind for kind, count in self.kinds.items() if count]
+        return kinds[0] if len(kinds) == 1 else None
+
+    def _sorted_index(self):
+        if self._sorted is None:
+            doc_ids = list(self.values)
+            keys = [_sort_key(value)[1] for value in self.values.values()]
+            order = sorted(range(len(keys)), key=keys.__getitem__)
+            self._sorted = ([keys[i] for i in order], [doc_ids[i] for i in order])
+        return self._sorted
+
+    def range_ids(self, operator, value):
+        # Only fields whose values are all of one comparable kind, compared with a value of the same kind
+        key = _sort_key(value)
+        kind = self._kind()
+        if kind is None or key is None or key[0] != kind:
+            return None
+        equal = self.equal_ids(value)
+        if equal is None:
+            return None
+
+        keys, doc_ids = self._sorted_index()
+        split = bisect_right(keys, key[1])
+        # document_matches_filter defines ">=" as "== or >", "<" as "not >=" and "<=" as "not >"
+        if operator == ">":
+            return set(doc_ids[split:])
+        if operator == ">=":
+            return set(doc_ids[split:]) | equal
+        if operator == "<=":
+            return set(doc_ids[:split])
+        return set(doc_ids[:split]) - equal
+
+
+class MetadataIndex:
+    def __init__(self):
+        self.positions = {}
+        self.fields = {}
+        self._next_position = 0
+
+    def __len__(self):
+        return len(self.positions)
+
+    def add(self, documents):
+        for doc in documents:
+            if doc.id in self.positions:
+                self._remove_values(doc.id)
+            else:
+                # Same order as the store's storage dict, which is the order filter_documents returns
+                self.positions[doc.id] = self._next_position
+                self._next_position += 1
+            for field, value in (doc.meta or {}).items():
+                if value is not None:
+                    self.fields.setdefault(field, FieldIndex()).add(doc.id, value)
+
+    def _remove_values(self, doc_id):
+        for field_index in self.fields.values():
+            if doc_id in field_index.values:
+                field_index.remove(doc_id)
+
+    def remove(self, doc_ids):
+        for doc_id in doc_ids:
+            if self.positions.pop(doc_id, None) is not None:
+                self._remove_values(doc_id)
+
+    def ordered(self, doc_ids):
+        return sorted(doc_ids, key=self.positions.__getitem__)
+
+    def _all_ids(self):
+        return set(self.positions)
+
+    def _equal(self, field, value):
+        field_index = self.fields.get(field)
+        if value is None:
+            # Missing fields count as None
+            return self._all_ids() - set(field_index.values) if field_index else self._all_ids()
+        if field_index is None:
+            return set() if _hashable(value) else None
+        return field_index.equal_ids(value)
+
+    def _in(self, field, values):
+        if not isinstance(values, list):
+            return None
+        ids = set()
+        for value in values:
+            equal = self._equal(field, value)
+            if equal is None:
+                return None
+            ids |= equal
+        return ids
+
+    def _comparison(self, condition):
+        field, operator, value = meta_field(condition["field"]), condition["operator"], condition["value"]
+        if field is None:
+            return None
+        if operator in ("==", "!="):
+            ids = self._equal(field, value)
+        elif operator in ("in", "not in"):
+            ids = self._in(field, value)
+        elif operator in RANGE_OPERATORS:
+            if value is None:
+                return set()
+            field_index = self.fields.get(field)
+            return field_index.range_ids(operator, value) if field_index else set()
+        else:
+            return None
+        if ids is None or operator in ("==", "in"):
+            return ids
+        return self._all_ids() - ids
+
+    def _and(self, conditions, storage=None):
+        planned, residual = [], []
+        for condition in conditions:
+            ids = self._plan(condition)
+            (residual if ids is None else planned).append(ids)
+        # Conditions without an index are only evaluated at the top level, where a scan would evaluate them too
+        if not planned or (residual and storage is None):
+            return None
+        planned.sort(key=len)
+        ids = set(planned[0])
+        for other in planned[1:]:
+            ids &= other
+        if residual:
+            # The candidates the indexes left are checked against all conditions, in order, like a scan would
+            filters = {"operator": "AND", "conditions": conditions}
+            ids = {doc_id for doc_id in ids if document_matches_filter(filters, storage[doc_id])}
+        return ids
+
+    def _plan(self, filters):
+        if "field" in filters:
+            return self._comparison(filters)
+        if "operator" not in filters or "conditions" not in filters:
+            return None
+        operator, conditions = filters["operator"], filters["conditions"]
+        if operator == "AND":
+            return self._and(conditions)
+        if operator == "NOT":
+            ids = self._and(conditions)
+            return None if ids is None else self._all_ids() - ids
+        if operator == "OR":
+            ids = set()
+            for condition in conditions:
+                matches = self._plan(condition)
+                if matches is None:
+                    return None
+                ids |= matches
+            return ids
+        return None
+
+    def plan(self, filters, storage):
+        if len(self.positions) != len(storage) or not _well_formed(filters):
+            return None
+        if filters.get("operator") == "AND" and "conditions" in filters and "field" not in filters:
+            return self._and(filters["conditions"], storage)
+        return self._plan(filters)
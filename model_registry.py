@@ -0,0 +1,199 @@
+'''
+A process-wide registry of loaded models, so components that name the same model share one instance.
+Models are keyed by everything that changes the loaded weights (model, device, precision and other model kwargs,
+the token...), loaded once even when several threads warm up at the same time, and reference counted:
+every warm_up acquires the model and release() gives it back. Models nobody holds anymore stay loaded
+until they are evicted with REGISTRY.evict().
+
+SharedSentenceTransformersTextEmbedder, SharedSentenceTransformersDocumentEmbedder and SharedHuggingFaceLocalGenerator
+are drop-in replacements of the haystack components that get their model from the registry.
+BatchedExtractiveReader (see batched_reader.py) shares its model and tokenizer the same way.
+
+haystack caches Sentence Transformers backends by model, device, token and truncate_dim only,
+so embedders that differ in e.g. torch_dtype would get the same backend. The keys here include all model kwargs.
+'''
+
+import gc
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from haystack import component
+from haystack.components.embedders import SentenceTransformersDocumentEmbedder, SentenceTransformersTextEmbedder
+from haystack.components.embedders.backends.sentence_transformers_backend import (
+    _SentenceTransformersEmbeddingBackend,
+)
+from haystack.components.generators import HuggingFaceLocalGenerator
+from haystack.lazy_imports import LazyImport
+from haystack.utils import Secret
+
+with LazyImport("Run 'pip install transformers[torch]'") as transformers_import:
+    from transformers import pipeline
+
+logger = logging.getLogger(__name__)
+
+
+def token_key(token):
+    # Models loaded with different tokens are kept apart, without putting the token itself in the key
+    if isinstance(token, Secret):
+        token = token.resolve_value()
+    if not token:
+        return None
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+def model_key(kind, **options):
+    return json.dumps([kind, options], sort_keys=True, default=str)
+
+
+class _Entry:
+    def __init__(self):
+        self.model = None
+        self.refs = 0
+        self.error = None
+        self.load_seconds = None
+        self.loaded = threading.Event()
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def acquire(self, key, loader):
+        with self._lock:
+            entry = self._entries.get(key)
+            owner = entry is None
+            if owner:
+                entry = self._entries[key] = _Entry()
+            entry.refs += 1
+
+        if not owner:
+            # Another thread may still be loading the model, it is loaded only once
+            entry.loaded.wait()
+            if entry.error is not None:
+                raise entry.error
+            return entry.model
+
+        start = time.perf_counter()
+        try:
+            entry.model = loader()
+        except Exception as e:
+            with self._lock:
+                del self._entries[key]
+            entry.error = e
+            entry.loaded.set()
+            raise
+        entry.load_seconds = time.perf_counter() - start
+        entry.loaded.set()
+        logger.info("Loaded %s in %.1fs", key, entry.load_seconds)
+        return entry.model
+
+    def release(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.refs > 0:
+                entry.refs -= 1
+
+    def evict(self, key=None):
+        with self._lock:
+            if key is not None:
+                entry = self._entries.get(key)
+                if entry is not None and entry.refs > 0:
+                    raise RuntimeError(f"Model {key} is still used by {entry.refs} components.")
+                evicted = [key] if entry is not None else []
+            else:
+                evicted = [key for key, entry in self._entries.items() if entry.refs == 0 and entry.loaded.is_set()]
+            for evicted_key in evicted:
+                del self._entries[evicted_key]
+        if evicted:
+            gc.collect()
+        return evicted
+
+    def stats(self):
+        with self._lock:
+            return [
+                {"key": key, "refs": entry.refs, "load_seconds": entry.load_seconds}
+                for key, entry in self._entries.items()
+            ]
+
+
+REGISTRY = ModelRegistry()
+
+
+def release_model(instance, attribute):
+    key = getattr(instance, "_model_key", None)
+    if key is not None:
+        REGISTRY.release(key)
+        instance._model_key = None
+        setattr(instance, attribute, None)
+
+
+def _acquire_embedding_backend(embedder):
+    options = {
+        "model": embedder.model,
+        "device": embedder.device.to_torch_str(),
+        "token": token_key(embedder.token),
+        "trust_remote_code": embedder.trust_remote_code,
+        "truncate_dim": embedder.truncate_dim,
+        "model_kwargs": embedder.model_kwargs,
+        "tokenizer_kwargs": embedder.tokenizer_kwargs,
+    }
+    key = model_key("sentence_transformers", **options)
+
+    def load():
+        return _SentenceTransformersEmbeddingBackend(
+            model=embedder.model,
+            device=options["device"],
+            auth_token=embedder.token,
+            trust_remote_code=embedder.trust_remote_code,
+            truncate_dim=embedder.truncate_dim,
+            model_kwargs=embedder.model_kwargs,
+            tokenizer_kwargs=embedder.tokenizer_kwargs,
+        )
+
+    return key, REGISTRY.acquire(key, load)
+
+
+@component
+class SharedSentenceTransformersTextEmbedder(SentenceTransformersTextEmbedder):
+    def warm_up(self):
+        if self.embedding_backend is None:
+            self._model_key, self.embedding_backend = _acquire_embedding_backend(self)
+
+    def release(self):
+        release_model(self, "embedding_backend")
+
+
+@component
+class SharedSentenceTransformersDocumentEmbedder(SentenceTransformersDocumentEmbedder):
+    def warm_up(self):
+        if self.embedding_backend is None:
+            self._model_key, self.embedding_backend = _acquire_embedding_backend(self)
+
+    def release(self):
+        release_model(self, "embedding_backend")
+
+
+@component
+class SharedHuggingFaceLocalGenerator(HuggingFaceLocalGenerator):
+    def warm_up(self):
+        if self.pipeline is None:
+            kwargs = self.huggingface_pipeline_kwargs
+            key = model_key("huggingface_pipeline", **{**kwargs, "token": token_key(kwargs.get("token"))})
+            transformers_import.check()
+            self.pipeline = REGISTRY.acquire(key, lambda: pipeline(**kwargs))
+            self._model_key = key
+        # Sets up the stop words with the shared pipeline's tokenizer
+        HuggingFaceLocalGenerator.warm_up(self)
+
+    def release(self):
+        release_model(self, "pipeline")
@@ -0,0 +1,148 @@
+'''
+Several named embedding views of the same documents, kept in one IndexedInMemoryDocumentStore.
+MultiViewEmbedder runs one document embedder per view (e.g. content only, and title + content) over the same chunks,
+MultiViewDocumentWriter stores the documents once and their view embeddings as a single float32 block,
+and InMemoryMultiViewRetriever searches one or more views in a single matrix product.
+
+    pipeline.add_component("embedder", MultiViewEmbedder({"content": embedder, "title": title_embedder}))
+    pipeline.add_component("writer", MultiViewDocumentWriter(document_store))
+    pipeline.connect("embedder.documents", "writer.documents")
+    pipeline.connect("embedder.views", "writer.views")
+'''
+
+from dataclasses import replace
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from haystack import DeserializationError, Document, component, default_from_dict, default_to_dict
+from haystack.core.serialization import component_from_dict, component_to_dict, import_class_by_name
+from haystack.document_stores.types import DuplicatePolicy
+
+from indexed_document_store import IndexedInMemoryDocumentStore
+
+
+def _store_from_dict(init_params):
+    if "document_store" not in init_params:
+        raise DeserializationError("Missing 'document_store' in serialization data")
+    init_params["document_store"] = IndexedInMemoryDocumentStore.from_dict(init_params["document_store"])
+
+
+@component
+class MultiViewEmbedder:
+    def __init__(self, embedders):
+        if not embedders:
+            raise ValueError("MultiViewEmbedder needs at least one embedder.")
+        self.embedders = embedders
+
+    def warm_up(self):
+        for embedder in self.embedders.values():
+            if hasattr(embedder, "warm_up"):
+                embedder.warm_up()
+
+    def to_dict(self):
+        return default_to_dict(
+            self, embedders={view: component_to_dict(embedder) for view, embedder in self.embedders.items()}
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        embedders = data["init_parameters"]["embedders"]
+        for view, embedder_data in embedders.items():
+            embedders[view] = component_from_dict(import_class_by_name(embedder_data["type"]), embedder_data, view)
+        return default_from_dict(cls, data)
+
+    @component.output_types(documents=List[Document], views=Dict[str, Any])
+    def run(self, documents: List[Document]):
+        views = {}
+        for view, embedder in self.embedders.items():
+            # Embedders set document.embedding in place, so each one works on its own shallow copies
+            copies = [replace(doc, embedding=None) for doc in documents]
+            embedded = embedder.run(documents=copies)["documents"]
+            views[view] = np.array([doc.embedding for doc in embedded], dtype=np.float32)
+        # The vectors only live in the views block, not as Python lists on every document
+        documents = [replace(doc, embedding=None) for doc in documents]
+        return {"documents": documents, "views": views}
+
+
+@component
+class MultiViewDocumentWriter:
+    def __init__(self, document_store, policy=DuplicatePolicy.OVERWRITE):
+        if not isinstance(document_store, IndexedInMemoryDocumentStore):
+            raise ValueError("document_store must be an instance of IndexedInMemoryDocumentStore")
+        self.document_store = document_store
+        self.policy = policy
+
+    def to_dict(self):
+        return default_to_dict(self, document_store=self.document_store.to_dict(), policy=self.policy.name)
+
+    @classmethod
+    def from_dict(cls, data):
+        init_params = data.get("init_parameters", {})
+        _store_from_dict(init_params)
+        init_params["policy"] = DuplicatePolicy[init_params.get("policy", "OVERWRITE")]
+        return default_from_dict(cls, data)
+
+    @component.output_types(documents_written=int)
+    def run(self, documents: List[Document], views: Dict[str, Any]):
+        written = self.document_store.write_documents(documents, policy=self.policy)
+        # Only the documents that ended up in the store get views, not the ones DuplicatePolicy.SKIP left out
+        storage = self.document_store.storage
+        rows = [row for row, doc in enumerate(documents) if storage.get(doc.id) is doc]
+        self.document_store.write_embedding_views(
+            [documents[row].id for row in rows], {view: np.asarray(vectors)[rows] for view, vectors in views.items()}
+        )
+        return {"documents_written": written}
+
+
+@component
+class InMemoryMultiViewRetriever:
+    def __init__(self, document_store, views=None, filters=None, top_k=10, scale_score=False):
+        if not isinstance(document_store, IndexedInMemoryDocumentStore):
+            raise ValueError("document_store must be an instance of IndexedInMemoryDocumentStore")
+        if top_k <= 0:
+            raise ValueError(f"top_k must be greater than 0. Currently, the top_k is {top_k}")
+        self.document_store = document_store
+        self.views = views
+        self.filters = filters
+        self.top_k = top_k
+        self.scale_score = scale_score
+
+    def to_dict(self):
+        return default_to_dict(
+            self,
+            document_store=self.document_store.to_dict(),
+            views=self.views,
+            filters=self.filters,
+            top_k=self.top_k,
+            scale_score=self.scale_score,
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        _store_from_dict(data.get("init_parameters", {}))
+        return default_from_dict(cls, data)
+
+    @component.output_types(documents=List[Document], documents_by_view=Dict[str, List[Document]])
+    def run(
+        self,
+        query_embedding: List[float],
+        views: Optional[List[str]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        top_k: Optional[int] = None,
+    ):
+        top_k = top_k or self.top_k
+        documents_by_view = self.document_store.multi_view_retrieval(
+            query_embedding,
+            views=views or self.views,
+            filters=filters or self.filters,
+            top_k=top_k,
+            scale_score=self.scale_score,
+        )
+        # A document found through several views keeps its best score
+        best = {}
+        for docs in documents_by_view.values():
+            for doc in docs:
+                if doc.id not in best or doc.score > best[doc.id].score:
+                    best[doc.id] = doc
+        documents = sorted(best.values(), key=lambda doc: doc.score, reverse=True)[:top_k]
+        return {"documents": documents, "documents_by_view": documents_by_view}
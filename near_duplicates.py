@@ -0,0 +1,213 @@
+'''
+Near-duplicate detection for chunks, between the splitter and the embedder of an indexing pipeline.
+Every chunk gets a MinHash signature of its word shingles. An LSH index over the signatures finds earlier chunks
+whose estimated Jaccard similarity is at least `threshold`, within the batch and across earlier runs: the signatures
+are saved in `index_path`. Duplicates are not passed on to the embedder and come out of the `duplicates` socket,
+with the id, source and similarity of the chunk they duplicate in their meta. The index keeps that record too.
+
+With a document_store, signatures of chunks that are no longer in the store (e.g. removed by incremental indexing
+because their file changed) are dropped before a batch is checked, so they can't suppress their replacements.
+
+    pipeline.add_component("near_duplicates", NearDuplicateFilter("minhash_index.npz", document_store=document_store))
+    pipeline.connect("document_splitter", "near_duplicates")
+    pipeline.connect("near_duplicates.documents", "document_embedder")
+'''
+
+import json
+import os
+import re
+import zlib
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from haystack import Document, component, default_from_dict, default_to_dict
+from haystack.core.serialization import import_class_by_name
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+WORD = re.compile(r"\w+")
+
+
+def shingles(text, size):
+    words = WORD.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def lsh_bands(num_perm, threshold):
+    # The band count whose similarity curve (1/bands) ** (1/rows) is closest to just below the threshold,
+    # so pairs near the threshold are still found and verified on the full signature
+    options = [(bands, num_perm // bands) for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    return min(options, key=lambda option: abs((1 / option[0]) ** (1 / option[1]) - (threshold - 0.1)))
+
+
+class MinHashIndex:
+    def __init__(self, num_perm=128, threshold=0.85, shingle_size=5, seed=1):
+        self.num_perm = num_perm
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, int(MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, int(MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+        self.bands, self.rows = lsh_bands(num_perm, threshold)
+
+        self.ids = []
+        self.sources = []
+        self.signatures = []
+        self.positions = {}
+        self.buckets = [{} for _ in range(self.bands)]
+        self.duplicates = {}
+
+    def __len__(self):
+        return len(self.positions)
+
+    def signature(self, text):
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode()) for shingle in shingles(text, self.shingle_size)), dtype=np.uint64
+        )
+        # (a * x + b) mod p for every permutation, the multiplication wraps around like in datasketch
+        permuted = (np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def query(self, signature):
+        candidates = set()
+        for bucket, key in zip(self.buckets, self._band_keys(signature)):
+            candidates.update(bucket.get(key, ()))
+        best = None
+        for row in candidates:
+            similarity = float(np.mean(self.signatures[row] == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (row, similarity)
+        if best is None:
+            return None
+        return self.ids[best[0]], self.sources[best[0]], best[1]
+
+    def add(self, doc_id, source, signature):
+        row = len(self.ids)
+        self.ids.append(doc_id)
+        self.sources.append(source)
+        self.signatures.append(signature)
+        self.positions[doc_id] = row
+        for bucket, key in zip(self.buckets, self._band_keys(signature)):
+            bucket.setdefault(key, []).append(row)
+
+    def _rebuild(self, keep):
+        ids = [self.ids[row] for row in keep]
+        sources = [self.sources[row] for row in keep]
+        signatures = [self.signatures[row] for row in keep]
+        self.ids, self.sources, self.signatures = [], [], []
+        self.positions = {}
+        self.buckets = [{} for _ in range(self.bands)]
+        for doc_id, source, signature in zip(ids, sources, signatures):
+            self.add(doc_id, source, signature)
+
+    def retain(self, doc_ids):
+        keep = [row for row, doc_id in enumerate(self.ids) if doc_id in doc_ids]
+        if len(keep) != len(self.ids):
+            self._rebuild(keep)
+            self.duplicates = {
+                doc_id: record for doc_id, record in self.duplicates.items() if record["duplicate_of"] in doc_ids
+            }
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            ids=np.array(self.ids, dtype=str),
+            sources=np.array([json.dumps(source) for source in self.sources], dtype=str),
+            signatures=np.array(self.signatures, dtype=np.uint32).reshape(-1, self.num_perm),
+            duplicates=np.array(json.dumps(self.duplicates)),
+            config=np.array([self.num_perm, self.shingle_size], dtype=np.int64),
+        )
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        arrays = np.load(path)
+        if arrays["config"].tolist() != [self.num_perm, self.shingle_size]:
+            # Signatures of other settings can't be compared, the index starts over
+            return
+        self._rebuild([])
+        for doc_id, source, signature in zip(arrays["ids"], arrays["sources"], arrays["signatures"]):
+            self.add(str(doc_id), json.loads(str(source)), signature)
+        self.duplicates = json.loads(str(arrays["duplicates"]))
+
+
+@component
+class NearDuplicateFilter:
+    def __init__(
+        self,
+        index_path=None,
+        threshold=0.85,
+        num_perm=128,
+        shingle_size=5,
+        source_field="file_path",
+        document_store=None,
+    ):
+        if not 0 < threshold <= 1:
+            raise ValueError(f"threshold must be in (0, 1]. Currently, the threshold is {threshold}")
+        self.index_path = index_path
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.source_field = source_field
+        self.document_store = document_store
+        self.index = None
+
+    def warm_up(self):
+        if self.index is None:
+            self.index = MinHashIndex(num_perm=self.num_perm, threshold=self.threshold, shingle_size=self.shingle_size)
+            if self.index_path and Path(self.index_path).exists():
+                self.index.load(self.index_path)
+
+    def to_dict(self):
+        return default_to_dict(
+            self,
+            index_path=self.index_path,
+            threshold=self.threshold,
+            num_perm=self.num_perm,
+            shingle_size=self.shingle_size,
+            source_field=self.source_field,
+            document_store=self.document_store.to_dict() if self.document_store is not None else None,
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        store_data = data["init_parameters"].get("document_store")
+        if store_data is not None:
+            data["init_parameters"]["document_store"] = import_class_by_name(store_data["type"]).from_dict(store_data)
+        return default_from_dict(cls, data)
+
+    def _source(self, doc):
+        return doc.meta.get(self.source_field, doc.meta.get("source_id"))
+
+    @component.output_types(documents=List[Document], duplicates=List[Document])
+    def run(self, documents: List[Document]):
+        self.warm_up()
+        if self.document_store is not None and len(self.index):
+            self.index.retain({doc.id for doc in self.document_store.filter_documents()})
+
+        unique, duplicates = [], []
+        for doc in documents:
+            if not doc.content or doc.id in self.index.positions:
+                # The chunk itself was seen before, e.g. a file indexed again: it isn't a duplicate of another chunk
+                unique.append(doc)
+                continue
+            signature = self.index.signature(doc.content)
+            match = self.index.query(signature)
+            if match is None:
+                self.index.add(doc.id, self._source(doc), signature)
+                unique.append(doc)
+                continue
+            duplicate_of, source, similarity = match
+            record = {"duplicate_of": duplicate_of, "duplicate_source": source, "similarity": similarity}
+            self.index.duplicates[doc.id] = {**record, "source": self._source(doc)}
+            duplicates.append(Document(id=doc.id, content=doc.content, meta={**doc.meta, **record}, score=doc.score))
+
+        if self.index_path:
+            self.index.save(self.index_path)
+        return {"documents": unique, "duplicates": duplicates}
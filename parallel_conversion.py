@@ -0,0 +1,132 @@
+'''
+Parallel file conversion for indexing pipelines.
+ParallelConverter wraps any Haystack file converter (PyPDFToDocument, TextFileToDocument, MarkdownToDocument, ...)
+and spreads its sources over a pool of worker processes. Every worker builds its own copy of the converter once,
+documents come back in the order of the sources, and a file that fails to convert is logged and skipped
+instead of aborting the whole batch. When a worker process dies, the sources of the chunks it took down are converted
+in the calling process instead.
+Workers are started with "spawn", so they don't inherit the threads of a process that already loaded torch.
+The pool lives until close() (or the end of a `with` block, or the interpreter).
+'''
+
+import atexit
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from haystack import Document, component, default_from_dict, default_to_dict
+from haystack.components.converters.utils import normalize_metadata
+from haystack.core.serialization import component_from_dict, component_to_dict, import_class_by_name
+from haystack.dataclasses import ByteStream
+
+logger = logging.getLogger(__name__)
+
+_WORKER_CONVERTER = None
+
+
+def converter_from_dict(data):
+    return component_from_dict(import_class_by_name(data["type"]), data, "converter")
+
+
+def _init_worker(converter_data):
+    global _WORKER_CONVERTER
+    _WORKER_CONVERTER = converter_from_dict(converter_data)
+
+
+def convert_sources(converter, sources, meta_list):
+    documents = []
+    for source, metadata in zip(sources, meta_list):
+        try:
+            documents.extend(converter.run(sources=[source], meta=[metadata])["documents"])
+        except Exception as e:
+            logger.warning("Could not convert %s, skipping it. Error: %s", source, e)
+    return documents
+
+
+def _convert_in_worker(batch):
+    sources, meta_list = batch
+    return convert_sources(_WORKER_CONVERTER, sources, meta_list)
+
+
+@component
+class ParallelConverter:
+    def __init__(self, converter, workers=None, chunksize=4):
+        self.converter = converter
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self._executor = None
+
+    def to_dict(self):
+        return default_to_dict(
+            self, converter=component_to_dict(self.converter), workers=self.workers, chunksize=self.chunksize
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        data["init_parameters"]["converter"] = converter_from_dict(data["init_parameters"]["converter"])
+        return default_from_dict(cls, data)
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(component_to_dict(self.converter),),
+            )
+            atexit.register(self.close)
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            atexit.unregister(self.close)
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @component.output_types(documents=List[Document])
+    def run(
+        self,
+        sources: List[Union[str, Path, ByteStream]],
+        meta: Optional[Union[Dict[str, Any], List[Dict[str, Any]]]] = None,
+    ):
+        meta_list = normalize_metadata(meta, sources_count=len(sources))
+
+        # A pool does not pay off for a single batch of sources
+        if self.workers <= 1 or len(sources) <= self.chunksize:
+            return {"documents": convert_sources(self.converter, sources, meta_list)}
+
+        batches = [
+            (sources[start:start + self.chunksize], meta_list[start:start + self.chunksize])
+            for start in range(0, len(sources), self.chunksize)
+        ]
+        executor = self._get_executor()
+        futures = [executor.submit(_convert_in_worker, batch) for batch in batches]
+        documents = []
+        broken = False
+        # Results are collected in submission order, which keeps the output deterministic
+        for (batch_sources, batch_meta), future in zip(batches, futures):
+            try:
+                documents.extend(future.result())
+            except Exception as e:
+                # A crashed worker breaks the pool and fails every chunk that was still pending
+                broken = broken or isinstance(e, BrokenProcessPool)
+                logger.warning(
+                    "Converting %d sources in a worker process failed, converting them here instead. Error: %s",
+                    len(batch_sources),
+                    e,
+                )
+                documents.extend(convert_sources(self.converter, batch_sources, batch_meta))
+        if broken:
+            # The next run starts a new pool
+            self.close()
+        return {"documents": documents}
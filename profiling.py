@@ -0,0 +1,308 @@
+'''
+Opt-in profiling of Pipeline.run, built on haystack.tracing.
+ProfilingTracer records one span per pipeline run and per component run with wall time, CPU time of the running thread,
+peak traced memory above the memory at the start of the span, and the size of the component's inputs and outputs
+(documents, answers, vectors and whitespace tokens, plus the prompt and completion tokens LLMs report in their meta).
+Only sizes are kept, never the content itself.
+
+    with profiling() as tracer:
+        pipeline.run(...)
+    tracer.write_chrome_trace("trace.json")  # open in chrome://tracing or https://ui.perfetto.dev
+    tracer.write_otel_json("spans.json")     # OTLP/JSON, e.g. for an OpenTelemetry collector's file receiver
+    print_summary(tracer.summary())          # per component percentiles over all runs
+
+Memory is measured with tracemalloc, which slows Python allocations down; use track_memory=False for timings only.
+tracemalloc traces all threads, so with pipelines running concurrently the memory of a span includes the others'.
+'''
+
+import contextlib
+import json
+import os
+import secrets
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+import numpy as np
+from haystack import Answer, Document, tracing
+from haystack.tracing import Span, Tracer
+
+PROFILING_ENABLED_ENV_VAR = "HAYSTACK_PROFILING_ENABLED"
+COMPONENT_OPERATION = "haystack.component.run"
+PIPELINE_OPERATION = "haystack.pipeline.run"
+PAYLOAD_TAGS = {
+    "haystack.component.input": "input",
+    "haystack.component.output": "output",
+}
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def profiling_enabled():
+    return os.getenv(PROFILING_ENABLED_ENV_VAR, "false").lower() == "true"
+
+
+def _count(value, sizes):
+    if isinstance(value, Document):
+        sizes["documents"] += 1
+        if value.content:
+            sizes["tokens"] += len(value.content.split())
+    elif isinstance(value, Answer):
+        sizes["answers"] += 1
+    elif isinstance(value, str):
+        sizes["tokens"] += len(value.split())
+    elif isinstance(value, dict):
+        usage = value.get("usage")
+        if isinstance(usage, dict):
+            # Generator meta: the LLM's own token counts instead of the model name and finish reason
+            sizes["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            sizes["completion_tokens"] += usage.get("completion_tokens", 0)
+            return
+        for item in value.values():
+            _count(item, sizes)
+    elif isinstance(value, (list, tuple)):
+        if value and isinstance(value[0], float):
+            sizes["vectors"] += 1
+            return
+        for item in value:
+            _count(item, sizes)
+
+
+def payload_sizes(value):
+    sizes = Counter()
+    _count(value, sizes)
+    return dict(sizes)
+
+
+def _plain(value):
+    return value if isinstance(value, (str, int, float, bool)) or value is None else str(value)
+
+
+class ProfilingSpan(Span):
+    def __init__(self, operation_name, parent=None):
+        self.operation_name = operation_name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.thread_id = threading.get_ident()
+        self.tags = {}
+        self.sizes = {}
+        self.start_ns = self.end_ns = 0
+        self.cpu_ns = 0
+        self.memory_start = self.memory_peak = None
+        self.error = None
+
+    def set_tag(self, key, value):
+        # Pipeline inputs and outputs are passed as tags too, only scalar tags are kept
+        if isinstance(value, (str, int, float, bool)):
+            self.tags[key] = value
+
+    def set_content_tag(self, key, value):
+        if key in PAYLOAD_TAGS:
+            self.sizes[PAYLOAD_TAGS[key]] = payload_sizes(value)
+        super().set_content_tag(key, value)
+
+    @property
+    def name(self):
+        return self.tags.get("haystack.component.name", self.operation_name)
+
+    @property
+    def wall_ms(self):
+        return (self.end_ns - self.start_ns) / 1e6
+
+    @property
+    def cpu_ms(self):
+        return self.cpu_ns / 1e6
+
+    @property
+    def memory_kb(self):
+        if self.memory_start is None:
+            return None
+        return (self.memory_peak - self.memory_start) / 1024
+
+    def attributes(self):
+        attributes = {**self.tags, "wall_ms": self.wall_ms, "cpu_ms": self.cpu_ms}
+        if self.memory_kb is not None:
+            attributes["memory_kb"] = self.memory_kb
+        for direction, sizes in self.sizes.items():
+            for key, size in sizes.items():
+                attributes[f"{direction}.{key}"] = size
+        if self.error is not None:
+            attributes["error"] = self.error
+        return attributes
+
+
+class ProfilingTracer(Tracer):
+    def __init__(self, track_memory=True):
+        self.track_memory = track_memory
+        self.spans = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._started_tracemalloc = False
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def close(self):
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def current_span(self):
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def _start_memory(self, span):
+        current, peak = tracemalloc.get_traced_memory()
+        # The peak is reset for the new span, the open spans keep the peak reached so far
+        for open_span in self._stack():
+            open_span.memory_peak = max(open_span.memory_peak, peak)
+        tracemalloc.reset_peak()
+        span.memory_start = span.memory_peak = current
+
+    def _end_memory(self, span):
+        _, peak = tracemalloc.get_traced_memory()
+        span.memory_peak = max(span.memory_peak, peak)
+        if span.parent is not None and span.parent.memory_peak is not None:
+            span.parent.memory_peak = max(span.parent.memory_peak, span.memory_peak)
+
+    @contextlib.contextmanager
+    def trace(self, operation_name, tags=None):
+        stack = self._stack()
+        span = ProfilingSpan(operation_name, parent=stack[-1] if stack else None)
+        span.set_tags(tags or {})
+        tracking = self.track_memory and tracemalloc.is_tracing()
+        if tracking:
+            self._start_memory(span)
+        stack.append(span)
+        span.start_ns = time.time_ns()
+        start, cpu_start = time.perf_counter_ns(), time.thread_time_ns()
+        try:
+            yield span
+        except Exception as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.cpu_ns = time.thread_time_ns() - cpu_start
+            span.end_ns = span.start_ns + time.perf_counter_ns() - start
+            stack.pop()
+            if tracking:
+                self._end_memory(span)
+            with self._lock:
+                self.spans.append(span)
+
+    def reset(self):
+        with self._lock:
+            self.spans = []
+
+    def chrome_trace(self):
+        pid = os.getpid()
+        events = [
+            {
+                "name": span.name,
+                "cat": span.operation_name,
+                "ph": "X",
+                "ts": span.start_ns / 1000,
+                "dur": (span.end_ns - span.start_ns) / 1000,
+                "pid": pid,
+                "tid": span.thread_id,
+                "args": span.attributes(),
+            }
+            for span in sorted(self.spans, key=lambda span: span.start_ns)
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def otel_json(self):
+        spans = [
+            {
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": span.parent.span_id if span.parent else "",
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [_otel_attribute(key, value) for key, value in span.attributes().items()],
+                "status": {"code": 2 if span.error else 1},
+            }
+            for span in sorted(self.spans, key=lambda span: span.start_ns)
+        ]
+        resource = {"attributes": [_otel_attribute("service.name", "haystack")]}
+        return {"resourceSpans": [{"resource": resource, "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}]}]}
+
+    def write_chrome_trace(self, path):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f, default=_plain)
+
+    def write_otel_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.otel_json(), f, default=_plain)
+
+    def summary(self, percentiles=(50, 90, 99)):
+        runs = {}
+        for span in self.spans:
+            if span.operation_name == COMPONENT_OPERATION:
+                runs.setdefault(span.name, []).append(span)
+            elif span.operation_name == PIPELINE_OPERATION:
+                runs.setdefault("pipeline", []).append(span)
+
+        summary = {}
+        for name, spans in runs.items():
+            metrics = {
+                "wall_ms": [span.wall_ms for span in spans],
+                "cpu_ms": [span.cpu_ms for span in spans],
+                "memory_kb": [span.memory_kb for span in spans if span.memory_kb is not None],
+            }
+            row = {"runs": len(spans)}
+            for metric, values in metrics.items():
+                if values:
+                    row[metric] = {f"p{q}": percentile(values, q) for q in percentiles}
+            for direction in PAYLOAD_TAGS.values():
+                totals = Counter()
+                for span in spans:
+                    totals.update(span.sizes.get(direction, {}))
+                if totals:
+                    row[direction] = {key: total / len(spans) for key, total in totals.items()}
+            summary[name] = row
+        return summary
+
+
+def _otel_attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+@contextlib.contextmanager
+def profiling(track_memory=True):
+    tracer = ProfilingTracer(track_memory=track_memory)
+    previous = tracing.tracer.actual_tracer
+    tracing.enable_tracing(tracer)
+    try:
+        yield tracer
+    finally:
+        tracing.enable_tracing(previous)
+        tracer.close()
+
+
+def print_summary(summary):
+    print(f"{'component':<24}{'runs':>6}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'cpu p50':>10}{'mem p99 KB':>12}")
+    for name, row in summary.items():
+        wall, cpu, memory = row["wall_ms"], row["cpu_ms"], row.get("memory_kb")
+        memory = f"{memory['p99']:>12.1f}" if memory else f"{'-':>12}"
+        print(
+            f"{name:<24}{row['runs']:>6}{wall['p50']:>10.2f}{wall['p90']:>10.2f}{wall['p99']:>10.2f}"
+            f"{cpu['p50']:>10.2f}{memory}"
+        )
@@ -0,0 +1,339 @@
+'''
+An online query server for the RAG and extractive QA pipelines that batches concurrent requests.
+QueryServer takes the text embedder and the embedding retriever out of a query pipeline. Requests that arrive within
+`max_wait_ms` of each other (up to `max_batch_size` of them) are embedded in one forward pass and retrieved with one
+matrix product (IndexedInMemoryDocumentStore.batch_embedding_retrieval). Every request then runs the rest of its
+pipeline (context packing, prompt building, the LLM or the reader) with its own query embedding and documents.
+A longer wait gives bigger batches and more queries per second, at the cost of up to max_wait_ms of latency.
+
+The pipeline passed in isn't changed: the server works on copies of its components. Components aren't assumed to be
+thread-safe, so each of the `workers` copies of the rest of the pipeline serves one request at a time.
+
+The retriever has to get its query embedding straight from the embedder; build the RAG pipeline with
+semantic_cache=False. serve() exposes a QueryServer over HTTP:
+
+    python query_server.py --pipeline rag --port 8000 --max-batch-size 32 --max-wait-ms 5 --workers 8
+    curl -X POST localhost:8000/query -d '{"text_embedder": {"text": "..."}, "prompt_builder": {"question": "..."}}'
+'''
+
+import argparse
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from haystack import Pipeline
+from haystack.document_stores.types.filter_policy import apply_filter_policy
+
+import extractive_qa_pipeline
+import first_rag_pipeline
+from profiling import percentile
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class MicroBatcher:
+    def __init__(self, process, max_batch_size=32, max_wait_ms=5.0):
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be at least 1. Currently, max_batch_size is {max_batch_size}")
+        self.process = process
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.stats = {"batches": 0, "requests": 0}
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _collect(self, first):
+        # The window opens with the first request, a full batch doesn't wait for it to close
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(entry)
+        return batch
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = self._collect(first)
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+            self.stats["batches"] += 1
+            self.stats["requests"] += len(batch)
+            try:
+                results = self.process(items)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+
+def embed_texts(embedder, texts):
+    backend = getattr(embedder, "embedding_backend", None)
+    if backend is None:
+        # Embedders without a local model (e.g. API based ones) still embed one text per call
+        return [embedder.run(text=text)["embedding"] for text in texts]
+    # What SentenceTransformersTextEmbedder.run does for one text, for all texts in one forward pass
+    return backend.embed(
+        [embedder.prefix + text + embedder.suffix for text in texts],
+        batch_size=embedder.batch_size,
+        show_progress_bar=False,
+        normalize_embeddings=embedder.normalize_embeddings,
+        precision=embedder.precision,
+    )
+
+
+def _receivers(pipeline, name):
+    return [
+        (data["from_socket"].name, receiver, data["to_socket"].name)
+        for _, receiver, data in pipeline.graph.out_edges(name, data=True)
+    ]
+
+
+def _copy_components(pipeline, names):
+    # A new pipeline with new instances of the named components and the connections between them
+    names = set(names)
+    data = pipeline.to_dict()
+    data["components"] = {name: component for name, component in data["components"].items() if name in names}
+    data["connections"] = [
+        connection
+        for connection in data["connections"]
+        if connection["sender"].split(".")[0] in names and connection["receiver"].split(".")[0] in names
+    ]
+    return Pipeline.from_dict(data)
+
+
+def _jsonable(value):
+    if hasattr(value, "to_dict"):
+        return _jsonable(value.to_dict())
+    if isinstance(value, dict):
+        return {key: _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class QueryServer:
+    def __init__(
+        self, pipeline, embedder="text_embedder", retriever="retriever", max_batch_size=32, max_wait_ms=5.0, workers=1
+    ):
+        embedder_receivers = _receivers(pipeline, embedder)
+        if ("embedding", retriever, "query_embedding") not in embedder_receivers:
+            raise ValueError(f"'{retriever}' must get its query_embedding directly from '{embedder}.embedding'.")
+        self.embedder_name = embedder
+        self.retriever_name = retriever
+        self.receivers = [
+            ("embedding", *receiver[1:]) for receiver in embedder_receivers if receiver[1] != retriever
+        ] + [("documents", *receiver[1:]) for receiver in _receivers(pipeline, retriever)]
+
+        # The pipeline passed in is left as it is. The batcher thread is the only user of the embedder copy, and the
+        # retriever is only read for its document store and defaults
+        self.embedder = _copy_components(pipeline, [embedder]).get_component(embedder)
+        self.retriever = pipeline.get_component(retriever)
+        if hasattr(self.embedder, "warm_up"):
+            self.embedder.warm_up()
+
+        # The rest of the pipeline gets the embedding and the documents as inputs of the sockets they were sent to.
+        # Components aren't assumed to be thread-safe: every worker runs its own copy, one request at a time
+        # (models loaded through model_registry.py are still shared between the copies)
+        self.remaining = [name for name in pipeline.graph.nodes if name not in (embedder, retriever)]
+        self.pipelines = queue.Queue()
+        for _ in range(workers if self.remaining else 0):
+            worker_pipeline = _copy_components(pipeline, self.remaining)
+            worker_pipeline.warm_up()
+            self.pipelines.put(worker_pipeline)
+        self.batcher = MicroBatcher(self._retrieve, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+    def close(self):
+        self.batcher.close()
+
+    def _retriever_options(self, filters=None, top_k=None, scale_score=None, return_embedding=None):
+        retriever = self.retriever
+        return {
+            "filters": apply_filter_policy(retriever.filter_policy, retriever.filters, filters),
+            "top_k": retriever.top_k if top_k is None else top_k,
+            "scale_score": retriever.scale_score if scale_score is None else scale_score,
+            "return_embedding": retriever.return_embedding if return_embedding is None else return_embedding,
+        }
+
+    def _retrieve(self, requests):
+        embeddings = embed_texts(self.embedder, [text for text, _ in requests])
+        options = [request_options for _, request_options in requests]
+
+        # Requests with the same filters and scoring are retrieved together, with the largest top_k of the group
+        groups = {}
+        for position, request_options in enumerate(options):
+            key = json.dumps(
+                [request_options["filters"], request_options["scale_score"], request_options["return_embedding"]],
+                sort_keys=True,
+                default=str,
+            )
+            groups.setdefault(key, []).append(position)
+
+        documents = [None] * len(requests)
+        store = self.retriever.document_store
+        for positions in groups.values():
+            group_options = {**options[positions[0]], "top_k": max(options[position]["top_k"] for position in positions)}
+            group_embeddings = [embeddings[position] for position in positions]
+            if hasattr(store, "batch_embedding_retrieval"):
+                results = store.batch_embedding_retrieval(group_embeddings, **group_options)
+            else:
+                results = [store.embedding_retrieval(embedding, **group_options) for embedding in group_embeddings]
+            for position, result in zip(positions, results):
+                documents[position] = result[: options[position]["top_k"]]
+        return list(zip(embeddings, documents))
+
+    def query(self, inputs):
+        inputs = {name: dict(component_inputs) for name, component_inputs in inputs.items()}
+        text = inputs.pop(self.embedder_name, {}).get("text")
+        if not isinstance(text, str):
+            raise ValueError(f"'{self.embedder_name}' needs a text to embed.")
+        # Resolved here, so a request with invalid retriever inputs fails on its own and not the whole batch
+        try:
+            options = self._retriever_options(**inputs.pop(self.retriever_name, {}))
+        except TypeError as e:
+            raise ValueError(f"Invalid inputs for '{self.retriever_name}': {e}") from e
+        embedding, documents = self.batcher.submit((text, options)).result()
+
+        outputs = {"embedding": embedding, "documents": documents}
+        for socket, receiver, receiver_socket in self.receivers:
+            inputs.setdefault(receiver, {})[receiver_socket] = outputs[socket]
+        result = {}
+        if self.remaining:
+            pipeline = self.pipelines.get()
+            try:
+                result = pipeline.run(inputs)
+            finally:
+                self.pipelines.put(pipeline)
+        # Like Pipeline.run, retriever output that no other component consumes is returned
+        if not any(socket == "documents" for socket, _, _ in self.receivers):
+            result[self.retriever_name] = {"documents": documents}
+        return result
+
+
+def measure_throughput(server, inputs, concurrency=32):
+    latencies = []
+
+    def timed(request_inputs):
+        start = time.perf_counter()
+        server.query(request_inputs)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, inputs))
+    elapsed = time.perf_counter() - start
+    return {
+        "queries_per_s": len(inputs) / elapsed,
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "mean_batch_size": server.batcher.stats["requests"] / max(server.batcher.stats["batches"], 1),
+    }
+
+
+def serve(server, host="127.0.0.1", port=8000):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._reply(200, server.batcher.stats)
+            else:
+                self._reply(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/query":
+                self._reply(404, {"error": f"Unknown path {self.path}"})
+                return
+            try:
+                inputs = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                self._reply(200, _jsonable(server.query(inputs)))
+            except ValueError as e:
+                self._reply(400, {"error": str(e)})
+            except Exception as e:
+                logger.exception("Query failed")
+                self._reply(500, {"error": str(e)})
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+    # One thread per connection: requests wait for their batch in parallel, the batcher coalesces them
+    http_server = ThreadingHTTPServer((host, port), Handler)
+    http_server.daemon_threads = True
+    logger.info("Serving on http://%s:%s", host, port)
+    try:
+        http_server.serve_forever()
+    finally:
+        http_server.server_close()
+        server.close()
+
+
+def create_server(pipeline_name, max_batch_size=32, max_wait_ms=5.0, workers=None):
+    if pipeline_name == "rag":
+        document_store = first_rag_pipeline.load_or_build_document_store()
+        # A semantic cache hit must skip the LLM, which isn't possible once retrieval runs in the shared batch
+        pipeline = first_rag_pipeline.create_rag_pipeline(document_store, semantic_cache=False)
+        # Workers spend most of their time waiting for the LLM, so several of them keep the batches full
+        return QueryServer(pipeline, "text_embedder", "retriever", max_batch_size, max_wait_ms, workers or 8)
+
+    document_store = extractive_qa_pipeline.load_or_build_document_store(extractive_qa_pipeline.MODEL)
+    pipeline = extractive_qa_pipeline.create_extractive_qa_pipeline(document_store, extractive_qa_pipeline.MODEL)
+    return QueryServer(pipeline, "embedder", "retriever", max_batch_size, max_wait_ms, workers or 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a query pipeline with micro-batched embedding and retrieval.")
+    parser.add_argument("--pipeline", choices=("rag", "extractive_qa"), default="rag")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, help="Copies of the rest of the pipeline (default: 8 for rag, 1 else)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = create_server(
+        args.pipeline, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms, workers=args.workers
+    )
+    serve(server, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+'''
+A semantic answer cache for RAG pipelines.
+SemanticCacheLookup sits right after the text embedder: when a previous query embedding is at least `threshold`
+cosine-similar to the new one, it returns the stored replies and documents and the retriever, prompt builder and LLM
+never run. On a miss it forwards the embedding, and SemanticCacheWriter stores the LLM replies once they arrive.
+Entries expire after `ttl` seconds, the least recently used ones are evicted beyond `max_entries`,
+and the whole cache is dropped as soon as the document store changes.
+Both components of a pipeline get the same document store: the cache is shared by the pipelines over the same store
+index (or the same explicit `cache_name`), never by pipelines over different stores.
+'''
+
+import time
+from collections import OrderedDict
+from typing import Dict, List
+
+import numpy as np
+from haystack import Document, component, default_from_dict, default_to_dict
+
+from indexed_document_store import IndexedInMemoryDocumentStore
+
+# Lookup and writer components find their shared cache by name, by default the index name of their document store
+_CACHES: Dict[str, "SemanticCache"] = {}
+
+
+def store_version(document_store):
+    if document_store is None:
+        return None
+    version = getattr(document_store, "version", None)
+    return version if version is not None else document_store.count_documents()
+
+
+class SemanticCache:
+    def __init__(self, threshold=0.95, max_entries=1000, ttl=3600.0):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.version = None
+        self._keys = []
+        self._matrix = None
+        self._next_key = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+        self._matrix = None
+
+    def check_version(self, version):
+        if version != self.version:
+            self.clear()
+            self.version = version
+
+    def _expire(self):
+        now = time.monotonic()
+        expired = [key for key, entry in self.entries.items() if now - entry["created_at"] > self.ttl]
+        for key in expired:
+            del self.entries[key]
+        if expired:
+            self._matrix = None
+
+    def _index(self):
+        if self._matrix is None:
+            self._keys = list(self.entries.keys())
+            self._matrix = np.array([self.entries[key]["embedding"] for key in self._keys], dtype=np.float32)
+        return self._keys, self._matrix
+
+    def lookup(self, embedding):
+        self._expire()
+        if not self.entries:
+            return None
+        keys, matrix = self._index()
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        scores = matrix @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        self.entries.move_to_end(keys[best])
+        return {**self.entries[keys[best]], "similarity": float(scores[best])}
+
+    def add(self, embedding, replies, documents):
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        self.entries[self._next_key] = {
+            "embedding": vector,
+            "replies": replies,
+            "documents": documents,
+            "created_at": time.monotonic(),
+        }
+        self._next_key += 1
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self._matrix = None
+
+
+def resolve_cache_name(document_store, cache_name):
+    if cache_name is not None:
+        return cache_name
+    if document_store is None:
+        raise ValueError("Semantic cache components need a document_store or a cache_name.")
+    return document_store.index
+
+
+def _store_to_dict(document_store):
+    return document_store.to_dict() if document_store is not None else None
+
+
+def _store_from_dict(data):
+    store_data = data["init_parameters"].get("document_store")
+    if store_data is not None:
+        data["init_parameters"]["document_store"] = IndexedInMemoryDocumentStore.from_dict(store_data)
+
+
+def get_cache(cache_name, threshold=0.95, max_entries=1000, ttl=3600.0):
+    if cache_name not in _CACHES:
+        _CACHES[cache_name] = SemanticCache(threshold=threshold, max_entries=max_entries, ttl=ttl)
+    return _CACHES[cache_name]
+
+
+@component
+class SemanticCacheLookup:
+    def __init__(self, document_store=None, cache_name=None, threshold=0.95, max_entries=1000, ttl=3600.0):
+        self.document_store = document_store
+        self.cache_name = cache_name
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cache = get_cache(
+            resolve_cache_name(document_store, cache_name), threshold=threshold, max_entries=max_entries, ttl=ttl
+        )
+
+    def to_dict(self):
+        return default_to_dict(
+            self,
+            document_store=_store_to_dict(self.document_store),
+            cache_name=self.cache_name,
+            threshold=self.threshold,
+            max_entries=self.max_entries,
+            ttl=self.ttl,
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        _store_from_dict(data)
+        return default_from_dict(cls, data)
+
+    @component.output_types(embedding=List[float], replies=List[str], documents=List[Document])
+    def run(self, embedding: List[float]):
+        self.cache.check_version(store_version(self.document_store))
+        hit = self.cache.lookup(embedding)
+        if hit is None:
+            # Only the miss output is produced, so the retrieval and generation branch runs
+            return {"embedding": embedding}
+        return {"replies": hit["replies"], "documents": hit["documents"]}
+
+
+@component
+class SemanticCacheWriter:
+    def __init__(self, document_store=None, cache_name=None):
+        self.document_store = document_store
+        self.cache_name = cache_name
+        self.cache = get_cache(resolve_cache_name(document_store, cache_name))
+
+    def to_dict(self):
+        return default_to_dict(self, document_store=_store_to_dict(self.document_store), cache_name=self.cache_name)
+
+    @classmethod
+    def from_dict(cls, data):
+        _store_from_dict(data)
+        return default_from_dict(cls, data)
+
+    @component.output_types(replies=List[str], documents=List[Document])
+    def run(self, embedding: List[float], replies: List[str], documents: List[Document]):
+        self.cache.add(embedding, replies, documents)
+        return {"replies": replies, "documents": documents}
@@ -9,6 +9,7 @@ from haystack import Pipeline
 from haystack.components.builders import PromptBuilder
 from haystack.components.generators import HuggingFaceLocalGenerator
 from haystack.telemetry import tutorial_running
+import lazy_pipeline
 
 def enable_telemetry():
     tutorial_running(29)
@@ -64,7 +65,10 @@ def edit_yaml_pipeline():
     metadata: {}
     """
 
-def deserialize_pipeline(yaml_pipeline):
+def deserialize_pipeline(yaml_pipeline, lazy=True):
+    # The lazy pipeline only imports and loads flan-t5-large when the llm runs for the first time
+    if lazy:
+        return lazy_pipeline.loads(yaml_pipeline)
     return Pipeline.loads(yaml_pipeline)
 
 def run_new_pipeline(pipeline, sentence):
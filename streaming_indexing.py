@@ -0,0 +1,132 @@
+'''
+Streaming indexing for corpora that don't fit in memory as one list of Documents.
+Documents come from any iterable (e.g. stream_dataset, which reads a Hugging Face dataset with streaming=True)
+and go through the indexing pipeline in micro-batches of `batch_size`. A producer thread reads ahead into a queue
+of at most `max_pending` batches and blocks when it is full, so a fast source can't outrun the embedder.
+Only the batches in the queue and the one in the pipeline are in memory at any time.
+
+Every `flush_every` documents the `flush` callback is called, and once more at the end for the documents since the
+last flush. A BufferedDocumentWriter in place of the DocumentWriter collects the documents of the micro-batches and
+writes them to the store on flush, in one write_documents call per `flush_every` documents instead of one per batch
+(the documents since the last flush are then in memory too).
+A flush should only cost as much as the documents since the previous one: rewriting a full snapshot of an in-memory
+store every time makes the total I/O quadratic, save it once after run_streaming_indexing instead.
+
+    writer = BufferedDocumentWriter(document_store)
+    report = run_streaming_indexing(
+        indexing_pipeline, stream_dataset("bilgeyucel/seven-wonders"), component="embedder",
+        flush_every=1024, flush=writer.flush,
+    )
+    document_store.save_snapshot("snapshot")
+'''
+
+import logging
+import queue
+import threading
+from itertools import islice
+from typing import List
+
+from datasets import load_dataset
+from haystack import Document, component
+from haystack.document_stores.types import DuplicatePolicy
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+def iter_batches(documents, batch_size):
+    documents = iter(documents)
+    while True:
+        batch = list(islice(documents, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def stream_dataset(path, split="train", content_field="content", meta_field="meta", **kwargs):
+    # Rows are downloaded and parsed lazily, the dataset is never held in memory as a whole
+    for row in load_dataset(path, split=split, streaming=True, **kwargs):
+        yield Document(content=row[content_field], meta=row.get(meta_field) or {})
+
+
+def _put(batches, item, stop):
+    while not stop.is_set():
+        try:
+            batches.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _produce(documents, batch_size, batches, stop):
+    try:
+        for batch in iter_batches(documents, batch_size):
+            if not _put(batches, batch, stop):
+                return
+        item = _DONE
+    except Exception as e:
+        # The error is raised again in the indexing thread
+        item = e
+    _put(batches, item, stop)
+
+
+@component
+class BufferedDocumentWriter:
+    def __init__(self, document_store, policy=DuplicatePolicy.NONE):
+        self.document_store = document_store
+        self.policy = policy
+        self.buffer = []
+
+    @component.output_types(documents_buffered=int)
+    def run(self, documents: List[Document]):
+        self.buffer.extend(documents)
+        return {"documents_buffered": len(documents)}
+
+    def flush(self):
+        documents, self.buffer = self.buffer, []
+        return self.document_store.write_documents(documents, policy=self.policy) if documents else 0
+
+
+def documents_written(result):
+    return sum(outputs.get("documents_written", 0) for outputs in result.values())
+
+
+def run_streaming_indexing(
+    pipeline, documents, batch_size=64, max_pending=2, component=None, flush_every=None, flush=None
+):
+    batches = queue.Queue(maxsize=max_pending)
+    stop = threading.Event()
+    producer = threading.Thread(target=_produce, args=(documents, batch_size, batches, stop), daemon=True)
+    producer.start()
+
+    report = {"documents": 0, "documents_written": 0, "batches": 0, "flushes": 0}
+    unflushed = 0
+    try:
+        while True:
+            batch = batches.get()
+            if batch is _DONE:
+                break
+            if isinstance(batch, Exception):
+                raise batch
+            inputs = {"documents": batch}
+            result = pipeline.run({component: inputs} if component else inputs)
+            report["documents"] += len(batch)
+            report["documents_written"] += documents_written(result)
+            report["batches"] += 1
+            unflushed += len(batch)
+            if flush is not None and flush_every and unflushed >= flush_every:
+                # A flush may write documents itself, e.g. BufferedDocumentWriter.flush
+                report["documents_written"] += flush() or 0
+                report["flushes"] += 1
+                unflushed = 0
+                logger.info("Indexed %d documents", report["documents"])
+    finally:
+        stop.set()
+        producer.join()
+
+    if flush is not None and unflushed:
+        report["documents_written"] += flush() or 0
+        report["flushes"] += 1
+    return report
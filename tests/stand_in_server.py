@@ -0,0 +1,113 @@
+'''
+A local stand-in for the HTTP APIs the async clients talk to: an OpenAI compatible streaming chat completions
+endpoint and a MediaWiki API. It runs on its own event loop in a background thread, so both async and synchronous
+clients can be pointed at it, and it can fail requests on purpose and count how many are in flight at once.
+
+    with StandInServer() as server:
+        generator = AsyncOpenAIGenerator(api_base_url=server.url("/v1"), api_key=None)
+'''
+
+import asyncio
+import hashlib
+import json
+import threading
+
+from aiohttp import web
+
+
+class StandInServer:
+    def __init__(self, reply="Hello from the stand-in", delay=0.0):
+        self.reply = reply
+        self.delay = delay
+        # Statuses for the next requests, in order, before the server answers normally again
+        self.failures = []
+        self.retry_after = "0"
+        self.pages = {}
+        # Titles whose every request fails with the given status
+        self.failing_titles = {}
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.request_headers = []
+
+        self.app = web.Application()
+        self.app.router.add_post("/v1/chat/completions", self._chat_completions)
+        self.app.router.add_get("/w/api.php", self._mediawiki)
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self.port = None
+
+    def url(self, path=""):
+        return f"http://127.0.0.1:{self.port}{path}"
+
+    def __enter__(self):
+        self._loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def serve():
+            asyncio.set_event_loop(self._loop)
+            self._runner = web.AppRunner(self.app)
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, "127.0.0.1", 0)
+            self._loop.run_until_complete(site.start())
+            self.port = self._runner.addresses[0][1]
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=serve, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def __exit__(self, *exc_info):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    async def _enter_request(self, request):
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.request_headers.append(dict(request.headers))
+        await asyncio.sleep(self.delay)
+
+    def _failure(self, status):
+        return web.Response(status=status, text=f"Stand-in failure {status}", headers={"Retry-After": self.retry_after})
+
+    async def _chat_completions(self, request):
+        await self._enter_request(request)
+        try:
+            if self.failures:
+                return self._failure(self.failures.pop(0))
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+            await response.prepare(request)
+            for token in self.reply.split(" "):
+                chunk = {"choices": [{"delta": {"content": token + " "}, "finish_reason": None}]}
+                await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await response.write(b"data: [DONE]\n\n")
+            await response.write_eof()
+            return response
+        finally:
+            self.in_flight -= 1
+
+    async def _mediawiki(self, request):
+        await self._enter_request(request)
+        try:
+            title = request.query["titles"]
+            if title in self.failing_titles:
+                return self._failure(self.failing_titles[title])
+            if self.failures:
+                return self._failure(self.failures.pop(0))
+            if title not in self.pages:
+                return web.json_response({"query": {"pages": [{"title": title, "missing": True}]}})
+
+            text = self.pages[title]
+            etag = f'"{hashlib.sha256(text.encode()).hexdigest()[:16]}"'
+            if request.headers.get("If-None-Match") == etag:
+                return web.Response(status=304, headers={"ETag": etag})
+            page = {"title": title, "extract": text, "fullurl": f"https://en.wikipedia.org/wiki/{title}"}
+            return web.json_response({"query": {"pages": [page]}}, headers={"ETag": etag})
+        finally:
+            self.in_flight -= 1
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from async_generation import AsyncOpenAIGenerator, GenerationError
+from stand_in_server import StandInServer
+
+
+@pytest.fixture
+def server():
+    with StandInServer(reply="The Colossus stood in Rhodes") as server:
+        yield server
+
+
+def create_generator(server, **kwargs):
+    return AsyncOpenAIGenerator(api_base_url=server.url("/v1"), api_key=None, initial_backoff=0.01, **kwargs)
+
+
+async def generate(generator, prompt="Where was the Colossus?", **kwargs):
+    async with generator:
+        return await generator.generate(prompt, **kwargs)
+
+
+def test_streams_tokens_in_order(server):
+    tokens = []
+    result = asyncio.run(generate(create_generator(server), streaming_callback=tokens.append))
+
+    assert tokens == ["The ", "Colossus ", "stood ", "in ", "Rhodes "]
+    assert result["replies"] == ["The Colossus stood in Rhodes "]
+
+
+def test_retries_rate_limits_and_server_errors(server):
+    server.failures = [429, 503, 500]
+    result = asyncio.run(generate(create_generator(server)))
+
+    assert result["replies"] == ["The Colossus stood in Rhodes "]
+    assert server.requests == 4
+
+
+def test_gives_up_on_client_errors_and_after_max_retries(server):
+    server.failures = [400]
+    with pytest.raises(GenerationError) as error:
+        asyncio.run(generate(create_generator(server)))
+    assert error.value.status == 400
+    assert server.requests == 1
+
+    server.failures = [503] * 3
+    with pytest.raises(GenerationError):
+        asyncio.run(generate(create_generator(server, max_retries=2)))
+    assert server.requests == 4
+
+
+def test_caps_concurrent_requests(server):
+    server.delay = 0.05
+
+    async def generate_all(generator):
+        async with generator:
+            return await asyncio.gather(*(generator.generate(f"question {i}") for i in range(10)))
+
+    results = asyncio.run(generate_all(create_generator(server, max_concurrency=3)))
+
+    assert len(results) == 10
+    assert server.max_in_flight == 3
+
+
+def test_recreated_session_keeps_the_semaphore(server):
+    async def recreate(generator):
+        generator._get_session()
+        semaphore = generator._semaphore
+        await generator.close()
+        generator._get_session()
+        await generator.close()
+        return semaphore is generator._semaphore
+
+    assert asyncio.run(recreate(create_generator(server)))
+
+
+def test_new_event_loop_gets_a_new_session(server):
+    generator = create_generator(server)
+
+    async def session_of_this_loop():
+        return generator._get_session()
+
+    first = asyncio.run(session_of_this_loop())
+    second = asyncio.run(session_of_this_loop())
+    assert second is not first
+    assert asyncio.run(generate(generator))["replies"] == ["The Colossus stood in Rhodes "]
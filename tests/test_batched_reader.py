@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+import numpy as np
+from haystack import Document
+
+from batched_reader import BatchedExtractiveReader, length_buckets, top_documents
+
+
+def stub_reader(batch_size=2, retrieval_top_k=None):
+    # Each window is one Document with a window length in its meta, and the model answers with its first word
+    reader = BatchedExtractiveReader(batch_size=batch_size, retrieval_top_k=retrieval_top_k, no_answer=False)
+    reader.model = object()
+    batches = []
+
+    def windows(queries, documents, max_seq_length, stride):
+        pairs = [(query_id, doc) for query_id, docs in enumerate(documents) for doc in docs]
+        return pairs, [SimpleNamespace(ids=[0] * doc.meta["length"], doc=doc) for _, doc in pairs]
+
+    def forward(encodings, answers_per_seq):
+        batches.append([len(encoding.ids) for encoding in encodings])
+        ends = [[encoding.doc.content.index(" ")] for encoding in encodings]
+        probabilities = [[np.float32(encoding.doc.meta["answer_score"])] for encoding in encodings]
+        return [[0] for _ in encodings], ends, probabilities
+
+    reader._windows = windows
+    reader._forward = forward
+    return reader, batches
+
+
+def create_documents(name, lengths, scores):
+    return [
+        Document(
+            content=f"{name}{i} answer", score=score, meta={"length": length, "answer_score": 0.5 + score / 10}
+        )
+        for i, (length, score) in enumerate(zip(lengths, scores))
+    ]
+
+
+def test_length_buckets_group_similar_lengths():
+    assert length_buckets([5, 1, 9, 2, 8], 2) == [[1, 3], [0, 4], [2]]
+
+
+def test_top_documents_cuts_by_retrieval_score():
+    documents = [
+        Document(content="a", score=0.1),
+        Document(content="b", score=None),
+        Document(content=None, score=0.9),
+        Document(content="c", score=0.7),
+    ]
+    assert [doc.content for doc in top_documents(documents, 2)] == ["c", "a"]
+    assert [doc.content for doc in top_documents(documents)] == ["a", "b", "c"]
+
+
+def test_run_batch_buckets_windows_and_maps_answers_back():
+    reader, batches = stub_reader(batch_size=2)
+    documents = [create_documents("q0_", [30, 4], [0.2, 0.9]), create_documents("q1_", [5, 28, 12], [0.1, 0.3, 0.5])]
+
+    answers = reader.run_batch(["first", "second"], documents, top_k=2)["answers"]
+
+    # Windows of all queries are batched together by length, so padding stays small
+    assert batches == [[4, 5], [12, 28], [30]]
+    assert [[answer.data for answer in query_answers] for query_answers in answers] == [
+        ["q0_1", "q0_0"],
+        ["q1_2", "q1_1"],
+    ]
+    for query, query_answers in zip(["first", "second"], answers):
+        assert all(answer.query == query for answer in query_answers)
+
+
+def test_run_batch_only_reads_retrieval_top_k_documents():
+    reader, batches = stub_reader(retrieval_top_k=1)
+    documents = [create_documents("q0_", [30, 4], [0.2, 0.9]), create_documents("q1_", [5, 28, 12], [0.1, 0.3, 0.5])]
+
+    answers = reader.run_batch(["first", "second"], documents, top_k=2)["answers"]
+
+    assert sorted(length for batch in batches for length in batch) == [4, 12]
+    assert [[answer.data for answer in query_answers] for query_answers in answers] == [["q0_1"], ["q1_2"]]
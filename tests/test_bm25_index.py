@@ -0,0 +1,52 @@
+import random
+
+import pytest
+from haystack import Document
+from haystack.document_stores.in_memory import InMemoryDocumentStore
+from haystack.document_stores.types import DuplicatePolicy
+
+from indexed_document_store import IndexedInMemoryDocumentStore
+
+WORDS = ["apple", "banana", "cherry", "date", "elder", "fig", "grape", "honey", "kiwi", "lemon", "mango", "nut"]
+
+QUERIES = ["apple", "banana cherry", "fig fig grape", "kiwi lemon mango nut", "unknown", "apple unknown honey"]
+
+
+def create_documents(seed=0):
+    rng = random.Random(seed)
+    return [
+        Document(
+            id=str(i),
+            content=" ".join(rng.choices(WORDS[: 4 + i % 8], k=rng.randint(3, 30))),
+            meta={"group": i % 3},
+        )
+        for i in range(60)
+    ]
+
+
+def retrieval(document_store, query, **kwargs):
+    return [(doc.id, doc.score) for doc in document_store.bm25_retrieval(query, **kwargs)]
+
+
+@pytest.mark.parametrize("algorithm", ["BM25Okapi", "BM25L", "BM25Plus"])
+def test_index_matches_stock_store(algorithm):
+    documents = create_documents()
+    baseline = InMemoryDocumentStore(bm25_algorithm=algorithm, index=f"bm25_baseline_{algorithm}")
+    baseline.write_documents(documents)
+    document_store = IndexedInMemoryDocumentStore(bm25_algorithm=algorithm, index=f"bm25_indexed_{algorithm}")
+    document_store.write_documents(documents)
+
+    # Deletes and new writes after the postings exist keep them in sync with the stock statistics
+    for store in (baseline, document_store):
+        retrieval(store, "apple")
+        store.delete_documents([str(i) for i in range(0, 60, 7)])
+        store.write_documents(create_documents(seed=1)[:10], policy=DuplicatePolicy.OVERWRITE)
+
+    for query in QUERIES:
+        for kwargs in (
+            {"top_k": 5},
+            {"top_k": 100},
+            {"top_k": 5, "scale_score": True},
+            {"top_k": 10, "filters": {"field": "meta.group", "operator": "==", "value": 1}},
+        ):
+            assert retrieval(document_store, query, **kwargs) == retrieval(baseline, query, **kwargs)
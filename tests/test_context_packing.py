@@ -0,0 +1,73 @@
+import pytest
+from haystack import Document
+from haystack.components.preprocessors import DocumentSplitter
+
+from context_packing import ContextPacker, estimate_tokens
+
+TEXT = "Alpha is first. Beta is second. Gamma is third. Delta is fourth."
+
+
+def split(text, **meta):
+    splitter = DocumentSplitter(split_by="sentence", split_length=2, split_overlap=1)
+    return splitter.run([Document(content=text, meta=meta)])["documents"]
+
+
+def scored(documents, scores):
+    for doc, score in zip(documents, scores):
+        doc.score = score
+    return documents
+
+
+def test_overlapping_chunks_become_one_passage():
+    chunks = scored(split(TEXT), [0.9, 0.8, 0.7, 0.1])
+
+    packed = ContextPacker().run(chunks)["documents"]
+
+    assert [doc.content for doc in packed] == [TEXT]
+    assert packed[0].score == 0.9
+    assert packed[0].meta["packed_from"] == [chunk.id for chunk in chunks]
+
+
+def test_only_touching_chunks_of_the_same_source_are_merged():
+    chunks = scored(split(TEXT), [0.9, 0.8, 0.7, 0.1])
+    # The first and last chunk leave a gap, a chunk of another text with the same offsets stays separate
+    other = scored(split("Epsilon is fifth. Zeta is sixth. Eta is seventh."), [0.5, 0.4, 0.3])
+
+    packed = ContextPacker().run([chunks[0], chunks[3], other[0]])["documents"]
+
+    assert [doc.content for doc in packed] == [
+        "Alpha is first. Beta is second.",
+        "Epsilon is fifth. Zeta is sixth.",
+        " Delta is fourth.",
+    ]
+
+
+def test_sentences_of_better_passages_are_dropped():
+    documents = [
+        Document(content="Rhodes had a statue. It was bronze.", score=0.9),
+        Document(content="It was bronze. It fell in an earthquake.", score=0.5),
+    ]
+
+    packed = ContextPacker().run(documents)["documents"]
+
+    assert [doc.content for doc in packed] == [documents[0].content, "It fell in an earthquake."]
+    assert ContextPacker(dedupe_sentences=False).run(documents)["documents"][1].content == documents[1].content
+
+
+def test_passages_are_cut_to_the_budget():
+    documents = [
+        Document(content="One two three. Four five six seven eight.", score=0.9),
+        Document(content="Nine ten eleven twelve thirteen fourteen.", score=0.5),
+        Document(content="Short one.", score=0.1),
+    ]
+
+    result = ContextPacker(max_tokens=8).run(documents)
+
+    # The first passage is cut after its first sentence, the second doesn't fit, the remaining budget goes to the third
+    assert [doc.content for doc in result["documents"]] == ["One two three.", "Short one."]
+    assert result["tokens"] == estimate_tokens("One two three.") + estimate_tokens("Short one.") <= 8
+
+
+def test_max_tokens_must_be_positive():
+    with pytest.raises(ValueError):
+        ContextPacker(max_tokens=0)
@@ -0,0 +1,86 @@
+import json
+
+import numpy as np
+import pytest
+from haystack import Document
+
+from indexed_document_store import IndexedInMemoryDocumentStore
+
+
+def create_documents():
+    return [
+        Document(content=f"document {i}", meta={"group": i % 2}, embedding=[float(i), 1.0, 0.5 * i])
+        for i in range(6)
+    ]
+
+
+def test_snapshot_restores_documents_with_list_embeddings(tmp_path):
+    documents = create_documents()
+    document_store = IndexedInMemoryDocumentStore(index="snapshot_source")
+    document_store.write_documents(documents)
+    document_store.save_snapshot(tmp_path / "snapshot")
+
+    restored = IndexedInMemoryDocumentStore.load_snapshot(tmp_path / "snapshot", index="snapshot_restored")
+    filtered = restored.filter_documents(filters={"field": "meta.group", "operator": "==", "value": 1})
+
+    assert filtered == [doc for doc in documents if doc.meta["group"] == 1]
+    assert all(isinstance(doc.embedding, list) for doc in filtered)
+    assert restored.filter_documents() == documents
+
+    restored.save_to_disk(str(tmp_path / "store.json"))
+    assert len(json.loads((tmp_path / "store.json").read_text())["documents"]) == len(documents)
+    reloaded = IndexedInMemoryDocumentStore.load_from_disk(str(tmp_path / "store.json"))
+    assert reloaded.filter_documents() == documents
+
+
+def test_snapshot_retrieval_returns_list_embeddings(tmp_path):
+    document_store = IndexedInMemoryDocumentStore(index="snapshot_retrieval_source")
+    document_store.write_documents(create_documents())
+    document_store.save_snapshot(tmp_path / "snapshot")
+    restored = IndexedInMemoryDocumentStore.load_snapshot(tmp_path / "snapshot", index="snapshot_retrieval")
+
+    for doc in restored.bm25_retrieval("document", top_k=3):
+        assert isinstance(doc.embedding, list)
+    expected = document_store.embedding_retrieval([1.0, 0.0, 0.0], top_k=3, return_embedding=True)
+    assert restored.embedding_retrieval([1.0, 0.0, 0.0], top_k=3, return_embedding=True) == expected
+    # Queries hand out copies, the restored documents still point into the memory map
+    for doc_id in restored.storage:
+        assert isinstance(restored.storage[doc_id].embedding, np.ndarray)
+
+
+def test_snapshot_overwrites_the_snapshot_it_was_loaded_from(tmp_path):
+    document_store = IndexedInMemoryDocumentStore(index="snapshot_overwrite_source")
+    document_store.write_documents(create_documents())
+    document_store.save_snapshot(tmp_path / "snapshot")
+    restored = IndexedInMemoryDocumentStore.load_snapshot(tmp_path / "snapshot", index="snapshot_overwrite")
+    restored.write_documents([Document(id="new", content="new document", embedding=[0.0, 1.0, 0.0])])
+
+    # The restored documents still point into the old files while the new snapshot replaces them
+    restored.save_snapshot(tmp_path / "snapshot")
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["snapshot"]
+    reloaded = IndexedInMemoryDocumentStore.load_snapshot(tmp_path / "snapshot", index="snapshot_overwrite_reloaded")
+    assert reloaded.filter_documents() == restored.filter_documents()
+    assert reloaded.count_documents() == len(create_documents()) + 1
+
+
+def test_snapshot_is_not_loaded_into_a_live_index(tmp_path):
+    document_store = IndexedInMemoryDocumentStore(index="snapshot_live")
+    document_store.write_documents(create_documents())
+    document_store.save_snapshot(tmp_path / "snapshot")
+    with pytest.raises(ValueError):
+        IndexedInMemoryDocumentStore.load_snapshot(tmp_path / "snapshot", index="snapshot_live")
+    assert document_store.count_documents() == len(create_documents())
+
+
+def test_compressed_store_only_takes_embedding_views():
+    with pytest.raises(ValueError):
+        IndexedInMemoryDocumentStore(vector_compression="int8", ann_index="ivf")
+
+    document_store = IndexedInMemoryDocumentStore(index="compressed_views", vector_compression="int8")
+    with pytest.raises(ValueError):
+        document_store.write_documents([Document(content="embedded", embedding=[1.0, 0.0])])
+
+    document_store.write_documents([Document(id="a", content="a"), Document(id="b", content="b")])
+    document_store.write_embedding_views(["a", "b"], {"content": [[1.0, 0.0], [0.0, 1.0]]})
+    hits = document_store.multi_view_retrieval([1.0, 0.0], top_k=1)["content"]
+    assert [doc.id for doc in hits] == ["a"]
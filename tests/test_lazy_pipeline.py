@@ -0,0 +1,77 @@
+from haystack import Pipeline, component
+
+import lazy_pipeline
+
+BUILT = []
+
+
+@component
+class Shout:
+    def __init__(self, suffix="!"):
+        self.suffix = suffix
+        self.warmed_up = False
+        BUILT.append(self)
+
+    def warm_up(self):
+        self.warmed_up = True
+
+    @component.output_types(text=str)
+    def run(self, text: str, times: int = 1):
+        return {"text": text + self.suffix * times}
+
+
+@component
+class LengthRouter:
+    def __init__(self, max_length=10):
+        self.max_length = max_length
+
+    @component.output_types(short=str, long=str)
+    def run(self, text: str):
+        return {"short": text} if len(text) <= self.max_length else {"long": text}
+
+
+def create_yaml():
+    pipeline = Pipeline()
+    pipeline.add_component("router", LengthRouter())
+    pipeline.add_component("first", Shout("!"))
+    pipeline.add_component("second", Shout("?"))
+    pipeline.add_component("unused", Shout("."))
+    pipeline.connect("router.short", "first.text")
+    pipeline.connect("router.long", "unused.text")
+    pipeline.connect("first.text", "second.text")
+    return pipeline.dumps()
+
+
+def test_components_load_on_first_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(lazy_pipeline, "_DEFINITIONS", {})
+    yaml_pipeline = create_yaml()
+    BUILT.clear()
+
+    # The first load of a definition builds every component once to validate it and find the sockets
+    lazy_pipeline.loads(yaml_pipeline, cache_dir=tmp_path)
+    assert len(BUILT) == 3
+    assert len(list(tmp_path.iterdir())) == 1
+
+    # A new process finds the sockets in the cache and builds nothing until the pipeline runs
+    monkeypatch.setattr(lazy_pipeline, "_DEFINITIONS", {})
+    BUILT.clear()
+    pipeline = lazy_pipeline.loads(yaml_pipeline, cache_dir=tmp_path)
+    assert BUILT == []
+
+    result = pipeline.run({"router": {"text": "hey"}, "second": {"times": 2}})
+    assert result == {"second": {"text": "hey!??"}}
+    assert [shout.suffix for shout in BUILT] == ["!", "?"]
+    assert all(shout.warmed_up for shout in BUILT)
+    # The branch that isn't taken never loads its component
+    assert not pipeline.get_component("unused").loaded
+
+    # Optional inputs that got no value fall back to the real component's default
+    assert pipeline.run({"router": {"text": "hey"}}) == {"second": {"text": "hey!?"}}
+    assert len(BUILT) == 2
+
+
+def test_lazy_pipeline_serializes_like_the_definition(tmp_path, monkeypatch):
+    monkeypatch.setattr(lazy_pipeline, "_DEFINITIONS", {})
+    yaml_pipeline = create_yaml()
+    pipeline = lazy_pipeline.loads(yaml_pipeline, cache_dir=tmp_path)
+    assert pipeline.to_dict() == Pipeline.loads(yaml_pipeline).to_dict()
@@ -0,0 +1,101 @@
+import pytest
+from haystack import Document
+from haystack.document_stores.in_memory import InMemoryDocumentStore
+from haystack.errors import FilterError
+
+from indexed_document_store import IndexedInMemoryDocumentStore
+
+FILTERS = [
+    {"field": "meta.year", "operator": "==", "value": 2021},
+    {"field": "meta.year", "operator": "!=", "value": 2021},
+    {"field": "meta.year", "operator": ">=", "value": 2021},
+    {"field": "meta.year", "operator": "<", "value": 2022},
+    {"field": "meta.year", "operator": "<=", "value": None},
+    {"field": "meta.genre", "operator": "in", "value": ["news", "blog"]},
+    {"field": "meta.genre", "operator": "not in", "value": ["news"]},
+    {"field": "meta.genre", "operator": "==", "value": None},
+    {"field": "meta.date", "operator": ">", "value": "2021-06-01"},
+    {"field": "meta.missing", "operator": "==", "value": "anything"},
+    {"field": "meta.tags", "operator": "==", "value": ["a", "b"]},
+    {"field": "genre", "operator": "==", "value": "news"},
+    {
+        "operator": "AND",
+        "conditions": [
+            {"field": "meta.year", "operator": ">", "value": 2020},
+            {"field": "meta.tags", "operator": "==", "value": ["a"]},
+        ],
+    },
+    {
+        "operator": "OR",
+        "conditions": [
+            {"field": "meta.genre", "operator": "==", "value": "blog"},
+            {"field": "meta.year", "operator": "<", "value": 2021},
+        ],
+    },
+    {
+        "operator": "NOT",
+        "conditions": [
+            {"field": "meta.genre", "operator": "==", "value": "news"},
+            {"field": "meta.year", "operator": "==", "value": 2022},
+        ],
+    },
+]
+
+MALFORMED_FILTERS = [
+    {"operator": "OR", "conditions": [{"field": "meta.year", "value": 2021}]},
+    {"operator": "OR", "conditions": [{"field": "meta.year", "operator": "=="}]},
+    {"field": "meta.year", "operator": ">", "value": "not a date"},
+    {"field": "meta.year", "operator": "<", "value": [2021]},
+    {"field": "meta.genre", "operator": "in", "value": "news"},
+    {"field": "meta.genre", "operator": "~", "value": "news"},
+    {
+        "operator": "AND",
+        "conditions": [
+            {"field": "meta.year", "operator": "==", "value": 2021},
+            {"field": "meta.genre", "operator": "in", "value": "news"},
+        ],
+    },
+]
+
+
+def create_documents():
+    genres = ["news", "blog", None, "paper"]
+    return [
+        Document(
+            content=f"document {i}",
+            meta={
+                "year": 2020 + i % 3,
+                "genre": genres[i % 4],
+                "date": f"2021-{i % 12 + 1:02d}-01",
+                "tags": ["a"] if i % 2 else ["a", "b"],
+            },
+        )
+        for i in range(24)
+    ]
+
+
+@pytest.fixture(scope="module")
+def document_stores():
+    documents = create_documents()
+    baseline = InMemoryDocumentStore(index="metadata_baseline")
+    baseline.write_documents(documents)
+    document_store = IndexedInMemoryDocumentStore(index="metadata_indexed")
+    document_store.write_documents(documents)
+    return baseline, document_store
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_index_matches_document_matches_filter(document_stores, filters):
+    baseline, document_store = document_stores
+    assert document_store.filter_documents(filters) == baseline.filter_documents(filters)
+
+
+@pytest.mark.parametrize("filters", MALFORMED_FILTERS)
+def test_malformed_filters_raise(document_stores, filters):
+    baseline, document_store = document_stores
+    assert document_store._meta.plan(filters, document_store.storage) is None
+    # Whatever the stock store raises (a KeyError for an unknown operator), the indexed store raises too
+    with pytest.raises((FilterError, KeyError)) as expected:
+        baseline.filter_documents(filters)
+    with pytest.raises(expected.type):
+        document_store.filter_documents(filters)
@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+import model_registry
+from model_registry import ModelRegistry, SharedSentenceTransformersTextEmbedder
+
+
+class Loader:
+    def __init__(self, delay=0.0, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return object()
+
+
+def test_models_are_reference_counted_and_evicted():
+    registry = ModelRegistry()
+    loader = Loader()
+    first = registry.acquire("model", loader)
+    assert registry.acquire("model", loader) is first
+    assert loader.calls == 1
+    assert registry.stats()[0]["refs"] == 2
+
+    registry.release("model")
+    with pytest.raises(RuntimeError):
+        registry.evict("model")
+    # Models still in use are skipped when evicting everything
+    assert registry.evict() == []
+
+    registry.release("model")
+    assert registry.evict() == ["model"]
+    assert "model" not in registry
+    registry.acquire("model", loader)
+    assert loader.calls == 2
+
+
+def test_concurrent_acquires_load_once():
+    registry = ModelRegistry()
+    loader = Loader(delay=0.05)
+    models = []
+    threads = [threading.Thread(target=lambda: models.append(registry.acquire("model", loader))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert loader.calls == 1
+    assert len(models) == 8 and all(model is models[0] for model in models)
+    assert registry.stats()[0]["refs"] == 8
+
+
+def test_failed_load_is_not_kept():
+    registry = ModelRegistry()
+    with pytest.raises(OSError):
+        registry.acquire("model", Loader(error=OSError("no such model")))
+    assert len(registry) == 0
+    assert registry.acquire("model", Loader()) is not None
+
+
+def test_embedders_share_a_backend(monkeypatch):
+    registry = ModelRegistry()
+    monkeypatch.setattr(model_registry, "REGISTRY", registry)
+    monkeypatch.setattr(model_registry, "_SentenceTransformersEmbeddingBackend", lambda **kwargs: object())
+
+    first = SharedSentenceTransformersTextEmbedder(model="some/model")
+    second = SharedSentenceTransformersTextEmbedder(model="some/model")
+    other = SharedSentenceTransformersTextEmbedder(model="some/model", model_kwargs={"torch_dtype": "float16"})
+    for embedder in (first, second, other):
+        embedder.warm_up()
+
+    assert first.embedding_backend is second.embedding_backend
+    assert other.embedding_backend is not first.embedding_backend
+    assert len(registry) == 2
+
+    first.release()
+    second.release()
+    assert first.embedding_backend is None
+    assert len(registry.evict()) == 1
+    assert len(registry) == 1
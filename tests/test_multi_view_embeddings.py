@@ -0,0 +1,59 @@
+from typing import List
+
+import numpy as np
+import pandas as pd
+from haystack import Document, component
+from haystack.components.writers import DocumentWriter
+from haystack.document_stores.types import DuplicatePolicy
+
+from indexed_document_store import IndexedInMemoryDocumentStore
+from multi_view_embeddings import MultiViewDocumentWriter, MultiViewEmbedder
+
+
+@component
+class LengthEmbedder:
+    def __init__(self, scale=1.0):
+        self.scale = scale
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document]):
+        for doc in documents:
+            doc.embedding = [self.scale * len(doc.content or ""), 1.0]
+        return {"documents": documents}
+
+
+def embed_and_write(document_store, documents, policy=DuplicatePolicy.OVERWRITE):
+    embedded = MultiViewEmbedder({"content": LengthEmbedder(), "scaled": LengthEmbedder(2.0)}).run(documents)
+    MultiViewDocumentWriter(document_store, policy=policy).run(**embedded)
+    return embedded
+
+
+def test_embedder_keeps_document_fields():
+    document = Document(content="table", dataframe=pd.DataFrame({"a": [1]}), score=0.5, meta={"title": "t"})
+    embedded = embed_and_write(IndexedInMemoryDocumentStore(index="views_fields"), [document])
+
+    assert embedded["documents"] == [document]
+    assert embedded["documents"][0] is not document
+    assert document.embedding is None
+
+
+def test_plain_overwrite_keeps_views():
+    document_store = IndexedInMemoryDocumentStore(index="views_overwrite")
+    documents = [Document(content="short"), Document(content="a longer document")]
+    embed_and_write(document_store, documents)
+
+    DocumentWriter(document_store, policy=DuplicatePolicy.OVERWRITE).run(documents=[Document(content="short")])
+
+    results = document_store.multi_view_retrieval([1.0, 0.0], top_k=5)
+    assert {doc.content for doc in results["content"]} == {"short", "a longer document"}
+
+
+def test_skipped_documents_get_no_views():
+    document_store = IndexedInMemoryDocumentStore(index="views_skip")
+    original = Document(id="same", content="original")
+    embed_and_write(document_store, [original])
+    embed_and_write(document_store, [Document(id="same", content="a much longer replacement")], DuplicatePolicy.SKIP)
+
+    assert document_store.filter_documents()[0].content == "original"
+    vector = document_store._views.vector("same", "content")
+    assert np.allclose(vector, [len("original"), 1.0])
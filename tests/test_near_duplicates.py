@@ -0,0 +1,70 @@
+from haystack import Document
+from haystack.document_stores.in_memory import InMemoryDocumentStore
+
+from near_duplicates import MinHashIndex, NearDuplicateFilter
+
+TEXT = (
+    "The Colossus of Rhodes was a statue of the Greek sun god Helios, erected in the city of Rhodes "
+    "by Chares of Lindos in 280 BC. It was one of the Seven Wonders of the Ancient World."
+)
+OTHER_TEXT = (
+    "The Lighthouse of Alexandria was built by the Ptolemaic Kingdom during the reign of Ptolemy II "
+    "Philadelphus. It was one of the tallest man-made structures in the world for many centuries."
+)
+
+
+def document(doc_id, content, file_path):
+    return Document(id=doc_id, content=content, meta={"file_path": file_path})
+
+
+def test_similar_signatures_estimate_jaccard():
+    index = MinHashIndex(threshold=0.8)
+    signature = index.signature(TEXT)
+    index.add("original", "a.txt", signature)
+    assert index.query(index.signature(TEXT + " Indeed."))[0] == "original"
+    assert index.query(index.signature(OTHER_TEXT)) is None
+
+
+def test_duplicates_are_suppressed_across_runs(tmp_path):
+    index_path = tmp_path / "minhash_index.npz"
+    first_run = NearDuplicateFilter(str(index_path), threshold=0.8)
+    result = first_run.run([document("a", TEXT, "a.txt"), document("b", TEXT + " Copied.", "b.txt")])
+    assert [doc.id for doc in result["documents"]] == ["a"]
+    assert [doc.meta["duplicate_of"] for doc in result["duplicates"]] == ["a"]
+
+    # A new filter (e.g. the next process) loads the signatures of the earlier run
+    second_run = NearDuplicateFilter(str(index_path), threshold=0.8)
+    result = second_run.run(
+        [
+            document("a", TEXT, "a.txt"),
+            document("c", "Copied. " + TEXT, "c.txt"),
+            document("d", OTHER_TEXT, "d.txt"),
+        ]
+    )
+    # The chunk that was indexed before isn't a duplicate of itself
+    assert [doc.id for doc in result["documents"]] == ["a", "d"]
+    [duplicate] = result["duplicates"]
+    assert (duplicate.id, duplicate.meta["duplicate_of"], duplicate.meta["duplicate_source"]) == ("c", "a", "a.txt")
+    assert set(second_run.index.duplicates) == {"b", "c"}
+
+
+def test_chunks_removed_from_the_store_no_longer_suppress(tmp_path):
+    document_store = InMemoryDocumentStore(index="near_duplicates_store")
+    index_path = str(tmp_path / "minhash_index.npz")
+    first_run = NearDuplicateFilter(index_path, threshold=0.8, document_store=document_store)
+    document_store.write_documents(first_run.run([document("a", TEXT, "a.txt")])["documents"])
+
+    document_store.delete_documents(["a"])
+    second_run = NearDuplicateFilter(index_path, threshold=0.8, document_store=document_store)
+    result = second_run.run([document("c", "Copied. " + TEXT, "c.txt")])
+    assert [doc.id for doc in result["documents"]] == ["c"]
+    assert "a" not in second_run.index.positions
+
+
+def test_index_of_other_settings_starts_over(tmp_path):
+    index_path = str(tmp_path / "minhash_index.npz")
+    NearDuplicateFilter(index_path, threshold=0.8).run([document("a", TEXT, "a.txt")])
+
+    other_settings = NearDuplicateFilter(index_path, threshold=0.8, num_perm=64)
+    result = other_settings.run([document("c", "Copied. " + TEXT, "c.txt")])
+    assert [doc.id for doc in result["documents"]] == ["c"]
@@ -0,0 +1,34 @@
+import multiprocessing
+import os
+from typing import List
+
+from haystack import Document, component
+
+from parallel_conversion import ParallelConverter
+
+
+@component
+class NameConverter:
+    # Kills the worker process it runs in for sources named "crash", converts them fine in the main process
+    @component.output_types(documents=List[Document])
+    def run(self, sources: List[str], meta: List[dict] = None):
+        documents = []
+        for source in sources:
+            if source == "crash" and multiprocessing.parent_process() is not None:
+                os._exit(1)
+            if source == "invalid":
+                raise ValueError("Invalid source")
+            documents.append(Document(content=source))
+        return {"documents": documents}
+
+
+def test_converts_in_order_and_survives_failures():
+    sources = [f"file {i}" for i in range(6)] + ["invalid", "crash"] + [f"file {i}" for i in range(6, 12)]
+    with ParallelConverter(NameConverter(), workers=2, chunksize=2) as converter:
+        documents = converter.run(sources=sources)["documents"]
+        assert converter._executor is None
+        # A new pool replaces the broken one
+        assert converter.run(sources=sources[:6])["documents"] == [Document(content=s) for s in sources[:6]]
+
+    assert [doc.content for doc in documents] == [source for source in sources if source != "invalid"]
+    assert converter._executor is None
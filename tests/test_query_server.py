@@ -0,0 +1,84 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import pytest
+from haystack import Document, Pipeline, component
+from haystack.components.retrievers.in_memory import InMemoryEmbeddingRetriever
+from haystack.document_stores.types import FilterPolicy
+
+from indexed_document_store import IndexedInMemoryDocumentStore
+from query_server import QueryServer
+
+
+@component
+class KeywordEmbedder:
+    def __init__(self, keywords=("red", "green", "blue")):
+        self.keywords = list(keywords)
+
+    @component.output_types(embedding=List[float])
+    def run(self, text: str):
+        return {"embedding": [1.0 if keyword in text else 0.0 for keyword in self.keywords]}
+
+
+@component
+class ExclusiveReader:
+    # Fails when two requests run the same instance at the same time
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @component.output_types(contents=List[str])
+    def run(self, documents: List[Document]):
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("ExclusiveReader runs concurrently.")
+        try:
+            threading.Event().wait(0.002)
+            return {"contents": [doc.content for doc in documents]}
+        finally:
+            self._lock.release()
+
+
+def create_pipeline(index, **retriever_parameters):
+    document_store = IndexedInMemoryDocumentStore(index=index)
+    document_store.write_documents([
+        Document(content="red", meta={"color": "red", "size": 1}, embedding=[1.0, 0.0, 0.0]),
+        Document(content="green", meta={"color": "green", "size": 1}, embedding=[0.0, 1.0, 0.0]),
+        Document(content="blue", meta={"color": "blue", "size": 2}, embedding=[0.0, 0.0, 1.0]),
+    ])
+    pipeline = Pipeline()
+    pipeline.add_component("text_embedder", KeywordEmbedder())
+    pipeline.add_component("retriever", InMemoryEmbeddingRetriever(document_store, **retriever_parameters))
+    pipeline.add_component("reader", ExclusiveReader())
+    pipeline.connect("text_embedder.embedding", "retriever.query_embedding")
+    pipeline.connect("retriever.documents", "reader.documents")
+    return pipeline
+
+
+def test_server_leaves_pipeline_unchanged_and_matches_it():
+    pipeline = create_pipeline("query_server_copy")
+    server = QueryServer(pipeline, max_wait_ms=2, workers=2)
+    try:
+        inputs = [{"text_embedder": {"text": text}, "retriever": {"top_k": 1}} for text in ("red", "green", "blue")]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(server.query, inputs * 20))
+    finally:
+        server.close()
+
+    assert set(pipeline.graph.nodes) == {"text_embedder", "retriever", "reader"}
+    expected = [pipeline.run({name: dict(value) for name, value in request.items()}) for request in inputs]
+    assert results == expected * 20
+
+
+def test_merge_filter_policy_combines_init_and_runtime_filters():
+    init_filters = {"field": "meta.size", "operator": "==", "value": 1}
+    pipeline = create_pipeline("query_server_filters", filters=init_filters, filter_policy=FilterPolicy.MERGE)
+    server = QueryServer(pipeline, max_wait_ms=1)
+    try:
+        runtime_filters = {"field": "meta.color", "operator": "!=", "value": "red"}
+        result = server.query({"text_embedder": {"text": "blue"}, "retriever": {"filters": runtime_filters}})
+        with pytest.raises(ValueError):
+            server.query({"text_embedder": {"text": "red"}, "retriever": {"unknown": 1}})
+    finally:
+        server.close()
+
+    assert result["reader"]["contents"] == ["green"]
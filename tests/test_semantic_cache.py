@@ -0,0 +1,36 @@
+import pytest
+from haystack import Document
+
+from indexed_document_store import IndexedInMemoryDocumentStore
+from semantic_cache import SemanticCacheLookup, SemanticCacheWriter
+
+
+def test_pipelines_over_different_stores_do_not_share_answers():
+    first_store = IndexedInMemoryDocumentStore(index="semantic_cache_first")
+    second_store = IndexedInMemoryDocumentStore(index="semantic_cache_second")
+    first_lookup, first_writer = SemanticCacheLookup(first_store), SemanticCacheWriter(first_store)
+    second_lookup = SemanticCacheLookup(second_store)
+
+    assert first_lookup.run(embedding=[1.0, 0.0]) == {"embedding": [1.0, 0.0]}
+    first_writer.run(embedding=[1.0, 0.0], replies=["first"], documents=[])
+    assert first_lookup.run(embedding=[1.0, 0.0])["replies"] == ["first"]
+    assert second_lookup.run(embedding=[1.0, 0.0]) == {"embedding": [1.0, 0.0]}
+
+    # A change to the second store doesn't drop the answers cached for the first one
+    second_store.write_documents([Document(content="new")])
+    assert second_lookup.run(embedding=[1.0, 0.0]) == {"embedding": [1.0, 0.0]}
+    assert first_lookup.run(embedding=[1.0, 0.0])["replies"] == ["first"]
+
+
+def test_cache_needs_a_store_or_a_name():
+    with pytest.raises(ValueError):
+        SemanticCacheWriter()
+    assert SemanticCacheWriter(cache_name="named").cache is SemanticCacheLookup(cache_name="named").cache
+
+
+def test_serialization_keeps_the_cache():
+    document_store = IndexedInMemoryDocumentStore(index="semantic_cache_serialized")
+    writer = SemanticCacheWriter(document_store)
+    assert SemanticCacheWriter.from_dict(writer.to_dict()).cache is writer.cache
+    lookup = SemanticCacheLookup(document_store)
+    assert SemanticCacheLookup.from_dict(lookup.to_dict()).cache is writer.cache
@@ -0,0 +1,91 @@
+import time
+from typing import List
+
+import pytest
+from haystack import Document, Pipeline, component
+from haystack.components.writers import DocumentWriter
+from haystack.document_stores.in_memory import InMemoryDocumentStore
+
+from streaming_indexing import BufferedDocumentWriter, run_streaming_indexing
+
+
+class CountingSource:
+    def __init__(self, n_documents, fail_at=None):
+        self.n_documents = n_documents
+        self.fail_at = fail_at
+        self.produced = 0
+
+    def __iter__(self):
+        for i in range(self.n_documents):
+            if i == self.fail_at:
+                raise RuntimeError("source failed")
+            self.produced += 1
+            yield Document(id=str(i), content=f"document {i}")
+
+
+@component
+class SlowRecorder:
+    def __init__(self, source, document_store, delay=0.01):
+        self.source = source
+        self.document_store = document_store
+        self.delay = delay
+        self.consumed = 0
+        self.read_ahead = []
+        self.stored = []
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document]):
+        time.sleep(self.delay)
+        self.consumed += len(documents)
+        self.read_ahead.append(self.source.produced - self.consumed)
+        self.stored.append(self.document_store.count_documents())
+        return {"documents": documents}
+
+
+def create_pipeline(source, document_store, writer):
+    recorder = SlowRecorder(source, document_store)
+    pipeline = Pipeline()
+    pipeline.add_component("recorder", recorder)
+    pipeline.add_component("writer", writer)
+    pipeline.connect("recorder.documents", "writer.documents")
+    return pipeline, recorder
+
+
+def test_producer_is_held_back_by_the_queue():
+    source = CountingSource(200)
+    document_store = InMemoryDocumentStore(index="streaming_backpressure")
+    pipeline, recorder = create_pipeline(source, document_store, DocumentWriter(document_store))
+
+    report = run_streaming_indexing(pipeline, source, batch_size=10, max_pending=2, component="recorder")
+
+    assert report == {"documents": 200, "documents_written": 200, "batches": 20, "flushes": 0}
+    assert document_store.count_documents() == 200
+    # At most the queued batches and the one waiting to be put are read ahead of the pipeline
+    assert max(recorder.read_ahead) <= (2 + 1) * 10
+
+
+def test_buffered_writer_writes_on_flush():
+    source = CountingSource(95)
+    document_store = InMemoryDocumentStore(index="streaming_flush")
+    writer = BufferedDocumentWriter(document_store)
+    pipeline, recorder = create_pipeline(source, document_store, writer)
+
+    report = run_streaming_indexing(
+        pipeline, source, batch_size=10, component="recorder", flush_every=30, flush=writer.flush
+    )
+
+    assert report == {"documents": 95, "documents_written": 95, "batches": 10, "flushes": 4}
+    assert document_store.count_documents() == 95
+    assert writer.buffer == []
+    # The store only changes on a flush, every 30 documents
+    assert recorder.stored == [0, 0, 0, 30, 30, 30, 60, 60, 60, 90]
+
+
+def test_source_errors_are_raised():
+    source = CountingSource(100, fail_at=25)
+    document_store = InMemoryDocumentStore(index="streaming_error")
+    pipeline, _ = create_pipeline(source, document_store, DocumentWriter(document_store))
+
+    with pytest.raises(RuntimeError, match="source failed"):
+        run_streaming_indexing(pipeline, source, batch_size=10, component="recorder")
+    assert document_store.count_documents() == 20
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+from haystack import Document
+from haystack.document_stores.errors import DuplicateDocumentError
+from haystack.document_stores.in_memory import InMemoryDocumentStore
+
+from indexed_document_store import IndexedInMemoryDocumentStore
+from vector_index import IVFIndex
+
+
+def clustered_vectors(n_clusters=16, per_cluster=50, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim)) * 5
+    return np.concatenate([center + rng.normal(size=(per_cluster, dim)) for center in centers]).astype(np.float32)
+
+
+def exact_top_k(vectors, query, top_k):
+    return set(np.argsort(-(vectors @ query))[:top_k].tolist())
+
+
+def test_ivf_recall_grows_with_nprobe():
+    vectors = clustered_vectors()
+    index = IVFIndex(nlist=16, nprobe=4, min_train_size=100)
+    index.add([str(i) for i in range(len(vectors))], vectors)
+    assert index.is_trained
+
+    queries = clustered_vectors(seed=1)[::40]
+    recalls = {}
+    for nprobe in (1, 4, 16):
+        hits = [
+            {int(doc_id) for doc_id, _ in index.search(query, top_k=10, nprobe=nprobe)} for query in queries
+        ]
+        recalls[nprobe] = np.mean([len(hit & exact_top_k(vectors, q, 10)) / 10 for hit, q in zip(hits, queries)])
+    assert recalls[4] >= 0.9
+    # Probing every list is an exact search
+    assert recalls[16] == 1.0
+    assert recalls[1] <= recalls[4] <= recalls[16]
+
+
+def test_store_below_threshold_matches_exact_search():
+    vectors = clustered_vectors(per_cluster=10)
+    documents = [
+        Document(id=str(i), content=f"document {i}", meta={"cluster": i // 10}, embedding=vector.tolist())
+        for i, vector in enumerate(vectors)
+    ]
+    document_store = IndexedInMemoryDocumentStore(index="ivf_exact", ann_index="ivf")
+    document_store.write_documents(documents)
+    baseline = InMemoryDocumentStore(index="ivf_exact_baseline")
+    baseline.write_documents(documents)
+    assert not document_store._ann.is_trained
+
+    query = vectors[3].tolist()
+    filters = {"field": "meta.cluster", "operator": "in", "value": [0, 5]}
+    for kwargs in ({}, {"filters": filters}):
+        expected = baseline.embedding_retrieval(query, top_k=5, **kwargs)
+        hits = document_store.embedding_retrieval(query, top_k=5, **kwargs)
+        assert [doc.id for doc in hits] == [doc.id for doc in expected]
+        assert [doc.score for doc in hits] == pytest.approx([doc.score for doc in expected], rel=1e-5)
+
+
+def test_ivf_store_searches_trained_index():
+    vectors = clustered_vectors()
+    documents = [
+        Document(id=str(i), content=f"document {i}", embedding=vector.tolist()) for i, vector in enumerate(vectors)
+    ]
+    document_store = IndexedInMemoryDocumentStore(
+        index="ivf_trained", ann_index="ivf", ann_parameters={"nlist": 16, "nprobe": 16, "exact_search_threshold": 100}
+    )
+    document_store.write_documents(documents)
+    assert document_store._ann.is_trained
+
+    query = clustered_vectors(seed=1)[0]
+    hits = document_store.embedding_retrieval(query.tolist(), top_k=10)
+    assert {int(doc.id) for doc in hits} == exact_top_k(vectors, query, 10)
+
+
+def test_failed_write_keeps_indexes_in_sync():
+    document_store = IndexedInMemoryDocumentStore(index="ivf_duplicates", ann_index="ivf")
+    document_store.write_documents([Document(id="b", content="second", embedding=[0.0, 1.0])])
+    batch = [
+        Document(id="a", content="first", embedding=[1.0, 0.0]),
+        Document(id="b", content="duplicate", embedding=[1.0, 1.0]),
+    ]
+    with pytest.raises(DuplicateDocumentError):
+        document_store.write_documents(batch)
+
+    # "a" was stored before the duplicate was found, so it is searchable like any other document
+    assert len(document_store._ann) == document_store.count_documents() == 2
+    assert [doc.id for doc in document_store.bm25_retrieval("first", top_k=1)] == ["a"]
+    assert [doc.id for doc in document_store.filter_documents({"field": "id", "operator": "==", "value": "a"})] == ["a"]
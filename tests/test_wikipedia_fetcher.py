@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+import pytest
+
+from stand_in_server import StandInServer
+from wikipedia_fetcher import WikipediaFetcher, fetch_wikipedia_documents
+
+PAGES = {f"Band {i}": f"Band {i} is a band." for i in range(8)}
+
+
+@pytest.fixture
+def server():
+    with StandInServer() as server:
+        server.pages = dict(PAGES)
+        yield server
+
+
+def fetch(server, titles, **kwargs):
+    kwargs = {"api_url": server.url("/w/api.php"), "requests_per_second": None, "initial_backoff": 0.01, **kwargs}
+    return {doc.meta["title"]: doc for doc in fetch_wikipedia_documents(titles, **kwargs)}
+
+
+def collect_documents(fetcher, titles):
+    async def collect():
+        return [doc async for doc in fetcher.stream(titles)]
+
+    return asyncio.run(collect())
+
+
+def test_fetches_every_title_with_one_request(server):
+    documents = fetch(server, list(PAGES), cache_dir=None)
+
+    assert {title: doc.content for title, doc in documents.items()} == PAGES
+    assert documents["Band 0"].meta["url"] == "https://en.wikipedia.org/wiki/Band 0"
+    assert server.requests == len(PAGES)
+
+
+def test_skips_missing_and_failing_titles(server):
+    server.failing_titles = {"Band 3": 503, "Band 4": 404}
+    documents = fetch(server, [*PAGES, "Not a band"], cache_dir=None, max_retries=2)
+
+    assert set(documents) == set(PAGES) - {"Band 3", "Band 4"}
+    # Band 3 was tried once and retried twice, the 404 wasn't retried
+    assert server.requests == len(PAGES) + 1 + 2
+
+
+def test_retries_and_caps_retry_after(server):
+    server.failures = [429, 500]
+    server.retry_after = "3600"
+    start = time.perf_counter()
+    documents = fetch(server, ["Band 0"], cache_dir=None, max_retry_after=0.05)
+
+    assert time.perf_counter() - start < 5
+    assert documents["Band 0"].content == PAGES["Band 0"]
+    assert server.requests == 3
+
+
+def test_caps_concurrent_requests(server):
+    server.delay = 0.05
+    fetch(server, list(PAGES), cache_dir=None, max_concurrency=3)
+
+    assert server.max_in_flight == 3
+
+
+def test_cache_serves_fresh_and_revalidates_stale_pages(server, tmp_path):
+    fetch(server, ["Band 0", "Band 1"], cache_dir=tmp_path)
+    assert server.requests == 2
+
+    fetch(server, ["Band 0", "Band 1"], cache_dir=tmp_path)
+    assert server.requests == 2
+
+    fetcher = WikipediaFetcher(
+        api_url=server.url("/w/api.php"), cache_dir=tmp_path, max_age=0, requests_per_second=None
+    )
+    server.pages["Band 1"] = "Band 1 changed its name."
+    documents = {doc.meta["title"]: doc for doc in collect_documents(fetcher, ["Band 0", "Band 1"])}
+    assert documents["Band 1"].content == "Band 1 changed its name."
+    assert fetcher.stats["revalidated"] == 1
+    assert "If-None-Match" in server.request_headers[-1]
+
+    # A stale entry is still served when the API fails
+    server.failing_titles = {"Band 0": 503}
+    documents = fetch(server, ["Band 0"], cache_dir=tmp_path, max_age=0, max_retries=0)
+    assert documents["Band 0"].content == PAGES["Band 0"]
@@ -0,0 +1,170 @@
+'''
+Compressed storage for embedding vectors, used by MultiViewIndex (see vector_index.py).
+A codec turns float32 vectors into compact codes and scores a float32 query against the codes directly,
+without decompressing the whole block:
+- "fp16" halves the vectors, no training needed,
+- "int8" scalar quantization with a per-dimension range learned from the data, 4x smaller,
+- "pq" product quantization: every `dim / pq_subvectors` dimensions become one byte, the index of the nearest of
+  256 centroids. Queries are scored with one lookup table per subvector (asymmetric distance computation).
+Compressed scores are approximate; MultiViewIndex can rescore a shortlist with the original vectors.
+'''
+
+import numpy as np
+
+BLOCK_SIZE = 2048
+
+
+def _blockwise(codes, score):
+    scores = np.empty(len(codes), dtype=np.float32)
+    for start in range(0, len(codes), BLOCK_SIZE):
+        scores[start:start + BLOCK_SIZE] = score(codes[start:start + BLOCK_SIZE])
+    return scores
+
+
+def _kmeans_l2(vectors, n_clusters, iterations=10, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _nearest(vectors, centroids)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        non_empty = counts > 0
+        centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+    return centroids
+
+
+def _nearest(vectors, centroids):
+    # argmin ||x - c||^2 == argmax 2 x.c - ||c||^2
+    return np.argmax(2 * vectors @ centroids.T - np.sum(centroids**2, axis=1), axis=1)
+
+
+class Float16Codec:
+    name = "fp16"
+    is_trained = True
+
+    def train(self, vectors):
+        pass
+
+    def encode(self, vectors):
+        return vectors.astype(np.float16)
+
+    def decode(self, codes):
+        return codes.astype(np.float32)
+
+    def scores(self, codes, query):
+        return _blockwise(codes, lambda block: block.astype(np.float32) @ query)
+
+    def state(self):
+        return {}
+
+    def restore(self, state):
+        pass
+
+
+class Int8Codec:
+    name = "int8"
+
+    def __init__(self):
+        self.low = None
+        self.scale = None
+
+    @property
+    def is_trained(self):
+        return self.low is not None
+
+    def train(self, vectors):
+        self.low = vectors.min(axis=0).astype(np.float32)
+        self.scale = ((vectors.max(axis=0) - self.low) / 255).astype(np.float32)
+        self.scale[self.scale == 0] = 1.0
+
+    def encode(self, vectors):
+        # Values outside the trained range are clipped to it
+        levels = np.clip(np.rint((vectors - self.low) / self.scale), 0, 255)
+        return (levels - 128).astype(np.int8)
+
+    def decode(self, codes):
+        return (codes.astype(np.float32) + 128) * self.scale + self.low
+
+    def scores(self, codes, query):
+        # ((c + 128) * scale + low) . q == c . (scale * q) + (128 * scale + low) . q
+        scaled = self.scale * query
+        offset = float((128 * self.scale + self.low) @ query)
+        return _blockwise(codes, lambda block: block.astype(np.float32) @ scaled + offset)
+
+    def state(self):
+        return {"low": self.low, "scale": self.scale}
+
+    def restore(self, state):
+        self.low = np.asarray(state["low"])
+        self.scale = np.asarray(state["scale"])
+
+
+class ProductQuantizer:
+    name = "pq"
+
+    def __init__(self, subvectors=None, iterations=10, seed=0):
+        self.subvectors = subvectors
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = None
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def _subvectors(self, dim):
+        subvectors = self.subvectors or max(1, dim // 8)
+        if dim % subvectors:
+            raise ValueError(f"The embedding dimension {dim} is not divisible into {subvectors} subvectors.")
+        return subvectors
+
+    def _split(self, vectors):
+        subvectors = len(self.centroids)
+        return vectors.reshape(len(vectors), subvectors, -1)
+
+    def train(self, vectors):
+        subvectors = self._subvectors(vectors.shape[1])
+        parts = vectors.reshape(len(vectors), subvectors, -1)
+        n_clusters = min(256, len(vectors))
+        self.centroids = np.stack([
+            _kmeans_l2(parts[:, part], n_clusters, self.iterations, seed=self.seed + part)
+            for part in range(subvectors)
+        ]).astype(np.float32)
+
+    def encode(self, vectors):
+        parts = self._split(vectors)
+        codes = np.empty(parts.shape[:2], dtype=np.uint8)
+        for part, centroids in enumerate(self.centroids):
+            for start in range(0, len(parts), BLOCK_SIZE):
+                codes[start:start + BLOCK_SIZE, part] = _nearest(parts[start:start + BLOCK_SIZE, part], centroids)
+        return codes
+
+    def decode(self, codes):
+        parts = self.centroids[np.arange(len(self.centroids)), codes]
+        return parts.reshape(len(codes), -1)
+
+    def scores(self, codes, query):
+        # One table of centroid . query-part per subvector, a code's score is the sum of its table entries
+        tables = np.einsum("mkd,md->mk", self.centroids, self._split(query[None, :])[0])
+        columns = np.arange(len(tables))
+        return _blockwise(codes, lambda block: tables[columns, block].sum(axis=1))
+
+    def state(self):
+        return {"centroids": self.centroids}
+
+    def restore(self, state):
+        self.centroids = np.asarray(state["centroids"])
+
+
+COMPRESSIONS = ("fp16", "int8", "pq")
+
+
+def create_codec(compression, pq_subvectors=None):
+    if compression == "fp16":
+        return Float16Codec()
+    if compression == "int8":
+        return Int8Codec()
+    if compression == "pq":
+        return ProductQuantizer(subvectors=pq_subvectors)
+    raise ValueError(f"Vector compression '{compression}' is not supported. Supported: {COMPRESSIONS}.")
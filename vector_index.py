@@ -0,0 +1,410 @@
+'''
+A CPU-only approximate nearest neighbour index for document embeddings, built on numpy.
+IVFIndex clusters the stored vectors with k-means into `nlist` inverted lists and, at query time, only scores
+the vectors of the `nprobe` lists whose centroids are closest to the query.
+Raising nprobe trades latency for recall; nprobe == nlist is an exact search.
+search_batch answers several queries at once, sharing the matrix products between them.
+MultiViewIndex keeps several named embeddings per document in one (documents, views, dim) block and scores
+any subset of views with a single matrix product. With `compression` the block holds compressed codes
+(see vector_compression.py), scored without decompressing them, and a shortlist of `rescore * top_k` candidates
+can be rescored exactly with the original vectors.
+'''
+
+import numpy as np
+
+from vector_compression import create_codec
+
+
+def normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k_indices(scores, top_k):
+    if top_k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def kmeans(vectors, n_clusters, iterations=10, spherical=False, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        non_empty = counts > 0
+        centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+        # Re-seed empty clusters with random points so every list stays usable
+        empty = np.flatnonzero(~non_empty)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), size=len(empty), replace=False)]
+        if spherical:
+            centroids = normalize_rows(centroids)
+    return centroids
+
+
+class IVFIndex:
+    def __init__(
+        self,
+        similarity="dot_product",
+        nlist=None,
+        nprobe=8,
+        min_train_size=10_000,
+        kmeans_iterations=10,
+        max_training_points=100_000,
+        seed=0,
+    ):
+        self.similarity = similarity
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.kmeans_iterations = kmeans_iterations
+        self.max_training_points = max_training_points
+        self.seed = seed
+
+        self.ids = []
+        self.rows = {}
+        self.vectors = None
+        self.assignments = np.empty(0, dtype=np.int64)
+        self.centroids = None
+        self._trained_size = 0
+        self._lists = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def _prepare(self, embeddings):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        if self.similarity == "cosine":
+            vectors = normalize_rows(vectors)
+        return vectors
+
+    def _ensure_capacity(self, n_rows, dim):
+        if self.vectors is None:
+            self.vectors = np.zeros((max(n_rows, 1024), dim), dtype=np.float32)
+            return
+        if self.vectors.shape[1] != dim:
+            raise ValueError(f"Expected embeddings of dimension {self.vectors.shape[1]}, got {dim}.")
+        if n_rows > len(self.vectors):
+            grown = np.zeros((max(n_rows, 2 * len(self.vectors)), dim), dtype=np.float32)
+            grown[: len(self.ids)] = self.vectors[: len(self.ids)]
+            self.vectors = grown
+
+    def add(self, ids, embeddings):
+        if not ids:
+            return
+        self.remove([doc_id for doc_id in ids if doc_id in self.rows])
+        vectors = self._prepare(embeddings)
+        start = len(self.ids)
+        self._ensure_capacity(start + len(ids), vectors.shape[1])
+        self.vectors[start:start + len(ids)] = vectors
+        for offset, doc_id in enumerate(ids):
+            self.rows[doc_id] = start + offset
+        self.ids.extend(ids)
+
+        new_assignments = np.full(len(ids), -1, dtype=np.int64)
+        if self.is_trained:
+            new_assignments = np.argmax(vectors @ self.centroids.T, axis=1)
+        self.assignments = np.concatenate([self.assignments, new_assignments])
+        self._lists = None
+
+        # (Re)train once the index is large enough, and again whenever it has doubled since the last training
+        if len(self) >= self.min_train_size and len(self) >= 2 * self._trained_size:
+            self.train()
+
+    def remove(self, ids):
+        for doc_id in ids:
+            row = self.rows.pop(doc_id, None)
+            if row is None:
+                continue
+            self.ids[row] = None
+            self.assignments[row] = -1
+        self._lists = None
+        if len(self.ids) > 1024 and len(self.rows) < len(self.ids) // 2:
+            self._compact()
+
+    def _compact(self):
+        alive = np.array([doc_id is not None for doc_id in self.ids], dtype=bool)
+        alive_rows = np.flatnonzero(alive)
+        # Fancy indexing copies, so this also works when the vectors are a read-only memory map
+        self.vectors = self.vectors[alive_rows]
+        self.assignments = self.assignments[alive_rows]
+        self.ids = [self.ids[row] for row in alive_rows]
+        self.rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+
+    def restore(self, ids, vectors, centroids=None, assignments=None):
+        # Adopts already prepared vectors (e.g. a memory-mapped snapshot) without copying them
+        self.ids = list(ids)
+        self.rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.vectors = vectors
+        self.centroids = centroids
+        self.assignments = np.full(len(self.ids), -1, dtype=np.int64) if assignments is None else assignments
+        self._trained_size = len(self.ids) if centroids is not None else 0
+        self._lists = None
+
+    def train(self):
+        rows = np.array(sorted(self.rows.values()), dtype=np.int64)
+        nlist = self.nlist or max(1, int(np.sqrt(len(rows))))
+        nlist = min(nlist, len(rows))
+        rng = np.random.default_rng(self.seed)
+        sample = rows if len(rows) <= self.max_training_points else rng.choice(rows, self.max_training_points, False)
+        self.centroids = kmeans(
+            self.vectors[sample],
+            nlist,
+            iterations=self.kmeans_iterations,
+            spherical=self.similarity == "cosine",
+            seed=self.seed,
+        )
+        self.assignments = np.full(len(self.ids), -1, dtype=np.int64)
+        self.assignments[rows] = np.argmax(self.vectors[rows] @ self.centroids.T, axis=1)
+        self._trained_size = len(rows)
+        self._lists = None
+
+    def _inverted_lists(self):
+        if self._lists is None:
+            order = np.argsort(self.assignments, kind="stable")
+            counts = np.bincount(self.assignments[self.assignments >= 0], minlength=len(self.centroids))
+            skip = int(np.sum(self.assignments < 0))
+            self._lists = np.split(order[skip:], np.cumsum(counts)[:-1])
+        return self._lists
+
+    def candidate_rows(self, query, nprobe=None):
+        if not self.is_trained:
+            return np.array(sorted(self.rows.values()), dtype=np.int64)
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        probes = top_k_indices(self.centroids @ query, nprobe)
+        lists = self._inverted_lists()
+        return np.concatenate([lists[probe] for probe in probes])
+
+    def search(self, query_embedding, top_k=10, allowed_ids=None, nprobe=None):
+        if not self.rows:
+            return []
+        query = self._prepare(query_embedding)[0]
+        if query.shape[0] != self.vectors.shape[1]:
+            raise ValueError(f"Expected a query embedding of dimension {self.vectors.shape[1]}, got {query.shape[0]}.")
+
+        rows = self.candidate_rows(query, nprobe)
+        if allowed_ids is not None:
+            rows = np.array([row for row in rows.tolist() if self.ids[row] in allowed_ids], dtype=np.int64)
+        if len(rows) == 0:
+            return []
+
+        scores = self.vectors[rows] @ query
+        best = top_k_indices(scores, top_k)
+        return [(self.ids[rows[i]], float(scores[i])) for i in best]
+
+    def search_batch(self, query_embeddings, top_k=10, allowed_ids=None, nprobe=None):
+        if not self.rows:
+            return [[] for _ in query_embeddings]
+        queries = self._prepare(query_embeddings)
+        if not self.is_trained:
+            rows = np.array(sorted(self.rows.values()), dtype=np.int64)
+            if allowed_ids is not None:
+                rows = np.array([row for row in rows.tolist() if self.ids[row] in allowed_ids], dtype=np.int64)
+            if len(rows) == 0:
+                return [[] for _ in query_embeddings]
+            # Every query against every vector in one matrix product
+            scores = queries @ self.vectors[rows].T
+            return [
+                [(self.ids[rows[i]], float(query_scores[i])) for i in top_k_indices(query_scores, top_k)]
+                for query_scores in scores
+            ]
+
+        # The closest lists of all queries come from one matrix product, each query then scores its own candidates
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        centroid_scores = queries @ self.centroids.T
+        lists = self._inverted_lists()
+        results = []
+        for query, query_centroid_scores in zip(queries, centroid_scores):
+            rows = np.concatenate([lists[probe] for probe in top_k_indices(query_centroid_scores, nprobe)])
+            if allowed_ids is not None:
+                rows = np.array([row for row in rows.tolist() if self.ids[row] in allowed_ids], dtype=np.int64)
+            if len(rows) == 0:
+                results.append([])
+                continue
+            scores = self.vectors[rows] @ query
+            results.append([(self.ids[rows[i]], float(scores[i])) for i in top_k_indices(scores, top_k)])
+        return results
+
+
+class MultiViewIndex:
+    def __init__(self, similarity="dot_product", compression=None, rescore=0, train_size=2048, pq_subvectors=None):
+        self.similarity = similarity
+        self.codec = create_codec(compression, pq_subvectors=pq_subvectors) if compression else None
+        self.rescore = rescore
+        self.train_size = train_size
+        self.view_names = []
+        self.ids = []
+        self.rows = {}
+        # Compressed codes once the codec is trained, float32 vectors before
+        self.matrix = None
+        # The float32 vectors next to the codes, only kept to rescore a shortlist
+        self.originals = None
+        self.alive = np.empty(0, dtype=bool)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def compressed(self):
+        return self.codec is not None and self.codec.is_trained
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.matrix, self.originals) if array is not None)
+
+    def _prepare(self, embeddings):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        return normalize_rows(vectors) if self.similarity == "cosine" else vectors
+
+    def _encode(self, stacked):
+        flat = stacked.reshape(-1, stacked.shape[-1])
+        return self.codec.encode(flat).reshape(stacked.shape[:2] + (-1,))
+
+    @staticmethod
+    def _grown(array, end, start, shape, dtype):
+        if array is None:
+            return np.zeros((max(end, 1024),) + shape, dtype=dtype)
+        if end > len(array):
+            grown = np.zeros((max(end, 2 * len(array)),) + shape, dtype=dtype)
+            grown[:start] = array[:start]
+            return grown
+        return array
+
+    def add(self, ids, views):
+        if not ids:
+            return
+        if not self.view_names:
+            self.view_names = list(views)
+        elif set(views) != set(self.view_names):
+            raise ValueError(f"Expected the embedding views {self.view_names}, got {list(views)}.")
+        # One (documents, views, dim) block, so all views of a document are scored in the same pass
+        stacked = np.stack([self._prepare(views[name]) for name in self.view_names], axis=1)
+        if self.originals is not None and self.originals.shape[1:] != stacked.shape[1:]:
+            raise ValueError(f"Expected view embeddings of shape {self.originals.shape[1:]}, got {stacked.shape[1:]}.")
+
+        self.remove([doc_id for doc_id in ids if doc_id in self.rows])
+        start = len(self.ids)
+        end = start + len(ids)
+        if self.compressed:
+            codes = self._encode(stacked)
+            self.matrix = self._grown(self.matrix, end, start, codes.shape[1:], codes.dtype)
+            self.matrix[start:end] = codes
+            # Codecs without training (fp16) encode from the first vector on, the originals start with them
+            if self.originals is not None or (self.rescore and start == 0):
+                self.originals = self._grown(self.originals, end, start, stacked.shape[1:], np.float32)
+                self.originals[start:end] = stacked
+        else:
+            if self.matrix is not None and self.matrix.shape[1:] != stacked.shape[1:]:
+                raise ValueError(f"Expected view embeddings of shape {self.matrix.shape[1:]}, got {stacked.shape[1:]}.")
+            self.matrix = self._grown(self.matrix, end, start, stacked.shape[1:], np.float32)
+            self.matrix[start:end] = stacked
+
+        for offset, doc_id in enumerate(ids):
+            self.rows[doc_id] = start + offset
+        self.ids.extend(ids)
+        self.alive = np.concatenate([self.alive, np.ones(len(ids), dtype=bool)])
+
+        if self.codec is not None and not self.codec.is_trained and len(self) >= self.train_size:
+            self.train()
+
+    def train(self):
+        # Vectors are kept in float32 until there are enough of them to learn the quantization ranges or codebooks
+        alive_rows = np.flatnonzero(self.alive)
+        vectors = self.matrix[alive_rows]
+        rng = np.random.default_rng(0)
+        sample = vectors.reshape(-1, vectors.shape[-1])
+        if len(sample) > 8 * self.train_size:
+            sample = sample[rng.choice(len(sample), 8 * self.train_size, replace=False)]
+        self.codec.train(sample)
+        self.originals = vectors if self.rescore else None
+        self.matrix = self._encode(vectors)
+        self.ids = [self.ids[row] for row in alive_rows]
+        self.rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.alive = np.ones(len(self.ids), dtype=bool)
+
+    def remove(self, ids):
+        for doc_id in ids:
+            row = self.rows.pop(doc_id, None)
+            if row is not None:
+                self.ids[row] = None
+                self.alive[row] = False
+        if len(self.ids) > 1024 and len(self.rows) < len(self.ids) // 2:
+            self.compact()
+
+    def compact(self):
+        alive_rows = np.flatnonzero(self.alive)
+        self.matrix = self.matrix[alive_rows]
+        if self.originals is not None:
+            self.originals = self.originals[alive_rows]
+        self.ids = [self.ids[row] for row in alive_rows]
+        self.rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.alive = np.ones(len(self.ids), dtype=bool)
+
+    def restore(self, ids, view_names, matrix, originals=None, codec_state=None):
+        self.view_names = list(view_names)
+        self.ids = list(ids)
+        self.rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        if codec_state is not None:
+            self.codec.restore(codec_state)
+        self.matrix = matrix
+        self.originals = originals
+        self.alive = np.ones(len(self.ids), dtype=bool)
+
+    def vector(self, doc_id, view):
+        row, column = self.rows[doc_id], self.view_names.index(view)
+        if not self.compressed:
+            return self.matrix[row, column]
+        if self.originals is not None:
+            return self.originals[row, column]
+        return self.codec.decode(self.matrix[row, column][None, :])[0]
+
+    def _scores(self, codes, query):
+        if not self.compressed:
+            return codes @ query
+        flat = codes.reshape(-1, codes.shape[-1])
+        return self.codec.scores(flat, query).reshape(codes.shape[:2])
+
+    def search(self, query_embedding, views=None, top_k=10, allowed_ids=None, rescore=None):
+        views = views or self.view_names
+        unknown = [view for view in views if view not in self.view_names]
+        if unknown:
+            raise ValueError(f"Unknown embedding views {unknown}. Available views: {self.view_names}.")
+        if not self.rows:
+            return {view: [] for view in views}
+
+        query = self._prepare(np.asarray(query_embedding, dtype=np.float32)[None, :])[0]
+        # (documents, views, dim) @ (dim,) scores every view of every candidate in one matrix product
+        if allowed_ids is None:
+            rows = np.flatnonzero(self.alive[: len(self.ids)])
+            scores = self._scores(self.matrix[: len(self.ids)], query)[rows]
+        else:
+            rows = np.array(sorted(self.rows[doc_id] for doc_id in allowed_ids if doc_id in self.rows), dtype=np.int64)
+            scores = self._scores(self.matrix[rows], query)
+
+        rescore = self.rescore if rescore is None else rescore
+        if not self.compressed or self.originals is None:
+            rescore = 0
+        results = {}
+        for view in views:
+            column = self.view_names.index(view)
+            view_scores = scores[:, column]
+            if rescore:
+                # Compressed scores pick a shortlist, the original vectors decide its order and scores
+                shortlist = top_k_indices(view_scores, top_k * rescore)
+                exact = self.originals[rows[shortlist], column] @ query
+                best = top_k_indices(exact, top_k)
+                results[view] = [(self.ids[rows[shortlist[i]]], float(exact[i])) for i in best]
+            else:
+                results[view] = [(self.ids[rows[i]], float(view_scores[i])) for i in top_k_indices(view_scores, top_k)]
+        return results
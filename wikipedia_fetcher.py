@@ -0,0 +1,248 @@
+'''
+Concurrent, cached fetching of Wikipedia pages as Documents.
+WikipediaFetcher gets the plain text and the URL of a page with a single MediaWiki API request per title
+(wikipedia.page needs one for the content and another one for the URL), runs up to `max_concurrency` requests at a time
+and spaces them to at most `requests_per_second`. Responses are kept in an on-disk cache: entries younger than
+`max_age` seconds are used as they are, older ones are revalidated with their ETag / Last-Modified and only
+downloaded again when the page changed. A stale entry is also used when the API can't be reached.
+A title that still fails after `max_retries` is logged and skipped like a missing page; Retry-After waits are capped
+at `max_retry_after` seconds. Documents are yielded as their pages arrive.
+api_url can point at any MediaWiki API, including a local stand-in (see tests/stand_in_server.py).
+
+    for document in fetch_wikipedia_documents(["The Beatles", "The Cure"]):
+        ...
+'''
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+import aiohttp
+from haystack import Document
+
+from http_retries import RETRYABLE_STATUSES, retry_after
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = "https://en.wikipedia.org/w/api.php"
+DEFAULT_CACHE_DIR = ".wikipedia_cache"
+# Wikimedia asks API clients to identify themselves
+USER_AGENT = "haystack-explore (https://github.com/90barricade93/haystack-explore)"
+
+
+class FetchError(Exception):
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    def __init__(self, requests_per_second=None):
+        self.interval = 1 / requests_per_second if requests_per_second else 0.0
+        self._next = 0.0
+
+    async def wait(self):
+        # Every caller reserves the next free slot before sleeping, so the requests are evenly spaced
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class ResponseCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_age=24 * 3600):
+        self.directory = Path(directory)
+        self.max_age = max_age
+
+    def _path(self, url):
+        return self.directory / f"{hashlib.sha256(url.encode()).hexdigest()}.json"
+
+    def get(self, url):
+        path = self._path(url)
+        if not path.exists():
+            return None
+        try:
+            return json.loads(path.read_text())
+        except json.JSONDecodeError:
+            return None
+
+    def is_fresh(self, entry):
+        return time.time() - entry["fetched_at"] < self.max_age
+
+    def put(self, url, body, etag=None, last_modified=None):
+        entry = {"url": url, "body": body, "etag": etag, "last_modified": last_modified, "fetched_at": time.time()}
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(url)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(entry))
+        os.replace(tmp_path, path)
+        return entry
+
+
+class WikipediaFetcher:
+    def __init__(
+        self,
+        api_url=DEFAULT_API_URL,
+        cache_dir=DEFAULT_CACHE_DIR,
+        max_age=24 * 3600,
+        max_concurrency=8,
+        requests_per_second=10,
+        max_retries=4,
+        initial_backoff=0.5,
+        max_backoff=8.0,
+        max_retry_after=60.0,
+        timeout=30.0,
+        user_agent=USER_AGENT,
+    ):
+        self.api_url = api_url
+        self.cache = ResponseCache(cache_dir, max_age) if cache_dir else None
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.stats = {"requests": 0, "cache_hits": 0, "revalidated": 0, "failed": 0}
+
+    def page_url(self, title):
+        params = {
+            "action": "query",
+            "format": "json",
+            "formatversion": "2",
+            "prop": "extracts|info",
+            "explaintext": "1",
+            "inprop": "url",
+            "redirects": "1",
+            "titles": title,
+        }
+        return f"{self.api_url}?{urlencode(params)}"
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return retry_after
+        return min(self.max_backoff, self.initial_backoff * 2**attempt)
+
+    async def _request(self, session, url, headers):
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    await self._rate_limiter.wait()
+                    self.stats["requests"] += 1
+                    async with session.get(url, headers=headers) as response:
+                        if response.status == 304:
+                            return response.status, None, response.headers
+                        if response.status >= 400:
+                            raise FetchError(
+                                f"Request to {url} failed with status {response.status}",
+                                status=response.status,
+                                retry_after=retry_after(response, self.max_retry_after),
+                            )
+                        return response.status, await response.text(), response.headers
+            except (FetchError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                retryable = not isinstance(e, FetchError) or e.status in RETRYABLE_STATUSES
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt, getattr(e, "retry_after", None))
+                attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _get(self, session, url):
+        entry = self.cache.get(url) if self.cache else None
+        if entry is not None and self.cache.is_fresh(entry):
+            self.stats["cache_hits"] += 1
+            return entry["body"]
+
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            status, body, response_headers = await self._request(session, url, headers)
+        except (FetchError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if entry is None:
+                raise
+            logger.warning("Could not revalidate %s, using the cached response. Error: %s", url, e)
+            return entry["body"]
+
+        etag, last_modified = response_headers.get("ETag"), response_headers.get("Last-Modified")
+        if status == 304:
+            # The cached response is still current, a 304 doesn't have to repeat its validators
+            self.stats["revalidated"] += 1
+            body = entry["body"]
+            etag, last_modified = etag or entry["etag"], last_modified or entry["last_modified"]
+        if self.cache:
+            self.cache.put(url, body, etag, last_modified)
+        return body
+
+    async def fetch(self, session, title):
+        try:
+            body = await self._get(session, self.page_url(title))
+            pages = json.loads(body).get("query", {}).get("pages", [])
+        except (FetchError, aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError) as e:
+            # One page that can't be fetched doesn't abort the others
+            self.stats["failed"] += 1
+            logger.warning("Could not fetch Wikipedia page '%s', skipping it. Error: %s", title, e)
+            return None
+        page = pages[0] if pages else {}
+        if not page or page.get("missing") or page.get("invalid"):
+            logger.warning("Wikipedia page '%s' does not exist, skipping it.", title)
+            return None
+        return Document(content=page.get("extract", ""), meta={"title": title, "url": page["fullurl"]})
+
+    async def stream(self, titles):
+        # Created here, because an aiohttp session, semaphore and timer belong to the running event loop
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._rate_limiter = RateLimiter(self.requests_per_second)
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"User-Agent": self.user_agent},
+        )
+        pending = set()
+        try:
+            for title in titles:
+                pending.add(asyncio.ensure_future(self.fetch(session, title)))
+                # A few thousand titles don't all become tasks at once, a couple per connection are enough
+                if len(pending) >= 2 * self.max_concurrency:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for document in (task.result() for task in done):
+                        if document is not None:
+                            yield document
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for document in (task.result() for task in done):
+                    if document is not None:
+                        yield document
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            await session.close()
+
+
+def fetch_wikipedia_documents(titles, **kwargs):
+    # A synchronous stream over WikipediaFetcher.stream, e.g. for run_streaming_indexing
+    loop = asyncio.new_event_loop()
+    stream = WikipediaFetcher(**kwargs).stream(titles)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(stream.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(stream.aclose())
+        loop.close()